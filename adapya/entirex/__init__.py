@@ -1,5 +1,7 @@
 # -*- coding: latin1 -*-
-__all__ = ['acierror','broker','cmdinfo','etbcinf','etbcinf8']
+__all__ = ['acierror','aiobroker','batch','broker','cmdinfo','emulator',
+           'etbcinf','etbcinf8','executor','filetransfer','pipeline','pool',
+           'pubsub','schema','scm','server','stream','transport','uow']
 
 __version__ = '1.3.0'
 if __version__ == '1.3.0':
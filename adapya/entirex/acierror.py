@@ -10,6 +10,14 @@ It defines:
 - geterror(), a function to obtain the error text from the EntireX error
   code
 
+- lookup(), a function returning the AciError registry entry of an
+  error code with integer error class/number, message and the
+  flags TRANSIENT, RETRYABLE and FATAL for retry decisions::
+
+    >>> err = lookup('02150148')
+    >>> err.errclass, err.number, err.retryable
+    (215, 148, True)
+
 """
 
 errdict = {
@@ -608,19 +616,110 @@ errdict = {
   '02501003': 'LocTrans: XDS.ini file not found'
 }
 
+# --- error flags ----------------------------------------------------
+
+TRANSIENT = 1   # condition may clear by itself e.g. timeout, shortage
+RETRYABLE = 2   # request may be repeated (after backoff or new logon)
+FATAL     = 4   # repeating will not help: configuration, security, API use
+
+classflags = {
+    2:   RETRYABLE,             # user does not exist: logon again
+    7:   TRANSIENT|RETRYABLE,   # service not registered (yet)
+    8:   FATAL,                 # security or encryption
+    14:  FATAL,                 # broker stub version
+    20:  FATAL,                 # user error in the API call
+    21:  FATAL,                 # configuration error in attribute file
+    22:  FATAL,                 # error in a user exit
+    37:  TRANSIENT|RETRYABLE,   # broker resource shortage
+    196: RETRYABLE,             # disconnected due to new connection
+    215: TRANSIENT|RETRYABLE,   # connection / transport
+    216: FATAL,                 # SSL
+    }
+
+codeflags = {
+    '00200094': RETRYABLE,      # message truncated: receive with LAST
+    '00740009': TRANSIENT|RETRYABLE,    # conversation found, no message
+    '00740074': TRANSIENT|RETRYABLE,    # wait timeout
+    '00740300': TRANSIENT|RETRYABLE,    # conversation found no UOW
+    '00740345': TRANSIENT|RETRYABLE,    # service MAX-UOWS reached
+    }
+
+
+class AciError(object):
+    """Registry entry of an EntireX ACI error code
+
+    :ivar code: error code string of 8 digits
+    :ivar errclass: error class as integer
+    :ivar number: error number within the class as integer
+    :ivar text: explanation or '' if none is available
+    :ivar flags: combination of TRANSIENT, RETRYABLE and FATAL
+
+    The message as returned by geterror() is built on first use.
+    """
+    __slots__ = ('code', 'errclass', 'number', 'text', 'flags', '_message')
+
+    def __init__(self, code, text=''):
+        self.code = code
+        try:
+            self.errclass, self.number = int(code[0:4]), int(code[4:8])
+        except ValueError:
+            self.errclass, self.number = -1, -1
+        self.text = text
+        self.flags = codeflags.get(code, classflags.get(self.errclass, 0))
+        self._message = None
+
+    @property
+    def message(self):
+        if self._message is None:
+            if self.text:
+                self._message = '%s: %s' % (self.code, self.text)
+            else:
+                # no error text found, return more general info.
+                # Return first byte = blank as indicator for exception class
+                #  to add error text returned from broker
+                classtext = errdict.get(self.code[0:4]) \
+                    if len(self.code) > 4 else None
+                if classtext:
+                    self._message = ' %s: error class: %s' % (self.code, classtext)
+                else:
+                    self._message = ' %s : no explanation available' % self.code
+        return self._message
+
+    @property
+    def explained(self):
+        return bool(self.text)
+
+    @property
+    def transient(self):
+        return bool(self.flags & TRANSIENT)
+
+    @property
+    def retryable(self):
+        return bool(self.flags & RETRYABLE)
+
+    @property
+    def fatal(self):
+        return bool(self.flags & FATAL)
+
+    def __repr__(self):
+        return 'AciError(%r)' % self.code
+
+
+registry = dict((code, AciError(code, text))
+                for code, text in errdict.items() if len(code) == 8)
+
+
+def lookup(errorcode):
+    """Return the AciError entry of an error code,
+    a new AciError not kept in the registry for unknown codes"""
+    try:
+        return registry[errorcode]
+    except KeyError:
+        return AciError(errorcode, errdict.get(errorcode, ''))
+
 
 def geterror(errorcode):
-    if errorcode in errdict:
-        return '%s: %s' % (errorcode, errdict[errorcode])
-    else:
-        # no error text found, return more general info.
-        # Return first byte = blank as indicator for exception class
-        #  to add error text returned from broker
-        if len(errorcode) > 4:
-            errorclass = errorcode[0:4]
-            if errorclass in errdict:  # key exists?
-                return ' %s: error class: %s' % (errorcode, errdict[errorclass])
-        return ' %s : no explanation available' % errorcode
+    return lookup(errorcode).message
 
 
 __version__ = '1.3.0'
@@ -0,0 +1,263 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""aiobroker.py provides an asyncio front end to the EntireX Broker ACI
+
+The Broker call blocks in the stub until the Broker replies. AsyncBroker
+runs the calls in executor threads so that the event loop stays
+responsive while requests are in flight::
+
+    >>> import asyncio
+    >>> from adapya.entirex.aiobroker import AsyncBroker
+    >>> async def main():
+    ...     async with AsyncBroker('localhost:1971', 'WEBUSER', handles=8) as ab:
+    ...         replies = await asyncio.gather(*[
+    ...             ab.request(('ACLASS', 'ASERVER', 'ASERVICE'), b'request %d' % i)
+    ...             for i in range(1000)])
+    >>> asyncio.run(main())
+
+AsyncBroker holds Broker instances (handles). Each has its own executor
+thread which performs all calls of this control block, so that one
+control block is never used by two threads at the same time and the
+number of threads is bounded.
+
+request() uses any free request handle for a request/reply on a
+conv_id NONE conversation. send(), receive(), receiveNew(),
+endConversation(), register(), deregister() and messages() use handle
+0 that owns the conversations and keeps the service of send(). It is
+not used by request() and is logged on with its first call.
+
+Python 3.6 or later is required.
+"""
+from __future__ import print_function          # PY3
+
+import asyncio
+import collections
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from adapya.entirex.broker import Broker, BrokerConversationError, \
+    BrokerTimeOut, InterfaceError, TIMEDOUT, OPT_ANY
+
+Message = collections.namedtuple('Message', 'conv_id conv_stat data')
+Message.__doc__ = """Message received, data is None if not waited for a reply"""
+
+
+def _service(bb, service):
+    if service is not None:
+        bb.server_class, bb.server_name, bb.service = service
+
+
+def _received(bb, rc):
+    if rc is TIMEDOUT:
+        return TIMEDOUT
+    return Message(bb.conv_id, bb.conv_stat,
+                   bytes(bb.receive_buffer[0:bb.return_length]))
+
+
+def _send(bb, payload, conv_id, service, wait, option):
+    _service(bb, service)
+    bb.conv_id = conv_id
+    bb.option = option
+    bb.wait = wait
+    waiting = wait != 'NO'
+    bb.receive_length = len(bb.receive_buffer) if waiting else 0
+    rc = bb.send(payload=payload)
+    if waiting:
+        return _received(bb, rc)
+    return Message(bb.conv_id, bb.conv_stat, None)
+
+
+def _receive(bb, conv_id, wait, option, timeout):
+    bb.conv_id = conv_id
+    bb.option = option
+    bb.wait = wait
+    bb.receive_length = len(bb.receive_buffer)
+    try:
+        return _received(bb, bb.receive())
+    except BrokerTimeOut:
+        if timeout:
+            return TIMEDOUT
+        raise
+
+
+def _end(bb, conv_id, option):
+    bb.conv_id = conv_id
+    bb.endConversation(option=option)
+
+
+def _register(bb, service, register):
+    _service(bb, service)
+    if register:
+        bb.register()
+    else:
+        bb.deregister()
+
+
+class AsyncBroker(object):
+    """asyncio front end for Broker instances with the same
+    broker_id, user_id and token
+
+    :param handles: number of Broker instances for request(), each with
+        its own executor thread. One further instance (handle 0) is
+        used for the conversation functions.
+    :param password: password for logon
+    :param kw: further Broker parameters e.g. receive_length, transport,
+        adaptive, raise_timeout
+
+    Service names are given as tuple (server_class, server_name, service).
+    Broker errors are raised as BrokerException in the awaiting task.
+    """
+    def __init__(self, broker_id='localhost', user_id='monty', token=None,
+                 handles=1, password=None, **kw):
+        self.password = password
+        self.handles = [Broker(broker_id=broker_id, user_id=user_id,
+                               token=token, **kw) for i in range(handles+1)]
+        self.executors = [ThreadPoolExecutor(1, 'AsyncBroker-%d' % i)
+                          for i in range(handles+1)]
+        self.free = None    # asyncio.Queue of free request handle numbers
+        self.conv_lock = None
+        self.conv_logon = False     # handle 0 logged on
+
+    def run(self, func, *args, handle=0):
+        """Return awaitable of func(broker, *args) called in the
+        executor thread of the handle"""
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.executors[handle],
+            functools.partial(func, self.handles[handle], *args))
+
+    async def open(self):
+        """Logon the request handles"""
+        await asyncio.gather(*[self.run(Broker.logon, self.password, handle=i)
+                               for i in range(1, len(self.handles))])
+        self.conv_lock = asyncio.Lock()
+        self.free = asyncio.Queue()
+        for i in range(1, len(self.handles)):
+            self.free.put_nowait(i)
+
+    async def conversation(self, func, *args):
+        """Return result of func(broker, *args) called with handle 0,
+        which is logged on with the first call"""
+        if self.free is None:
+            raise InterfaceError('AsyncBroker is not open', None)
+        if not self.conv_logon:
+            async with self.conv_lock:
+                if not self.conv_logon:
+                    await self.run(Broker.logon, self.password)
+                    self.conv_logon = True
+        return await self.run(func, *args)
+
+    async def close(self):
+        """Logoff all handles and end the executor threads"""
+        self.free = None
+        handles = range(0 if self.conv_logon else 1, len(self.handles))
+        self.conv_logon = False
+        try:
+            await asyncio.gather(*[self.run(Broker.logoff, handle=i)
+                                   for i in handles])
+        finally:
+            for ex in self.executors:
+                ex.shutdown(wait=False)
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def request(self, service, payload, wait='30S'):
+        """Send request on a conv_id NONE conversation with any free
+        handle and return the reply
+
+        Requests wait for a free handle without blocking the event loop.
+
+        :param service: tuple (server_class, server_name, service)
+        :param payload: request message, bytes or buffer object
+        :param wait: wait time for the reply
+        :returns: reply message as bytes or TIMEDOUT on timeout if
+            raise_timeout of the Broker instances is False
+        """
+        if self.free is None:
+            raise InterfaceError('AsyncBroker is not open', None)
+        i = await self.free.get()
+        try:
+            m = await self.run(_send, payload, 'NONE', service, wait, 0,
+                               handle=i)
+        finally:
+            self.free.put_nowait(i)
+        return m if m is TIMEDOUT else m.data
+
+    async def send(self, payload, conv_id='NEW', service=None, wait='NO',
+                   option=0):
+        """Send message on a conversation
+
+        :param service: tuple (server_class, server_name, service),
+            None keeps the previous service
+        :param wait: wait time for a reply, 'NO' does not wait
+        :returns: Message with the conv_id and the reply data if waited
+            or TIMEDOUT on timeout if raise_timeout is False
+        """
+        return await self.conversation(_send, payload, conv_id, service,
+                                       wait, option)
+
+    async def receive(self, conv_id='OLD', wait='YES', option=0):
+        """Receive message
+
+        :returns: Message or TIMEDOUT on timeout if raise_timeout
+            of the Broker instances is False
+        """
+        return await self.conversation(_receive, conv_id, wait, option, False)
+
+    async def receiveNew(self, wait='YES'):
+        """Receive message of a new conversation (server)"""
+        return await self.conversation(_receive, 'NEW', wait, OPT_ANY, False)
+
+    async def endConversation(self, conv_id, option=0):
+        """End conversation, option OPT_CANCEL aborts it"""
+        await self.conversation(_end, conv_id, option)
+
+    async def register(self, service):
+        """Register service (server)"""
+        await self.conversation(_register, service, True)
+
+    async def deregister(self, service):
+        """Deregister service with QUIESCE (server)"""
+        await self.conversation(_register, service, False)
+
+    async def messages(self, conv_id='ANY', wait='1S'):
+        """Asynchronous iterator over received messages
+
+        Receives are repeated after wait timeouts, so that the iteration
+        can be ended after at most wait seconds. The iteration of a
+        specific conv_id ends when the conversation is ended.
+
+        >>> async for m in ab.messages():     # server
+        ...     await ab.send(m.data.upper(), conv_id=m.conv_id)
+        """
+        while True:
+            try:
+                m = await self.conversation(_receive, conv_id, wait, 0, True)
+            except BrokerConversationError:
+                if conv_id in ('ANY', 'NEW', 'OLD'):
+                    continue
+                return
+            if m is not TIMEDOUT:
+                yield m
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
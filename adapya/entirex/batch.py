@@ -0,0 +1,286 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""batch.py packs many small logical messages into one Broker message
+
+Each Broker call costs a round trip to the kernel. Sending thousands of
+small records one by one is dominated by this cost. An envelope holds
+several messages, each prefixed with its length::
+
+    +------+-------+--------+--------+--------+--------+---
+    | 'BE' | count | len 1  | data 1 | len 2  | data 2 | ...
+    +------+-------+--------+--------+--------+--------+---
+      2      4       4                4
+
+Counts and lengths are unsigned 4-byte integers in network byte order.
+A length of X'FFFFFFFF' stands for None, e.g. a request without reply.
+
+    >>> from adapya.entirex.batch import pack, unpack
+    >>> env = pack([b'abc', b'', None])
+    >>> unpack(env)
+    [b'abc', b'', None]
+
+BatchingSender collects messages into envelopes sent when they reach
+a number of messages, a size limit given by the MAX-MSG of the kernel
+or a linger time::
+
+    >>> from adapya.entirex.batch import BatchingSender
+    >>> with BatchingSender(bb, ('ACLASS', 'ASERVER', 'RECORDS'),
+    ...                     max_messages=500, wait='30S') as sender:
+    ...     for record in records:
+    ...         sender.send(record)
+
+On the server batch_handler() turns a handler of single messages into a
+BrokerServer handler which returns the replies in one envelope::
+
+    >>> from adapya.entirex.batch import batch_handler
+    >>> from adapya.entirex.server import BrokerServer
+    >>> srv = BrokerServer(batch_handler(lambda msg, context: msg.upper()),
+    ...     server_class='ACLASS', server_name='ASERVER', service='RECORDS')
+"""
+from __future__ import print_function          # PY3
+
+import struct
+import time
+
+from adapya.entirex.broker import BrokerConversationError, BrokerException, \
+    TIMEDOUT
+
+MAGIC = b'BE'
+_HEADER = struct.Struct('>2sI')     # magic, count
+_LENGTH = struct.Struct('>I')
+HEADER_SIZE = _HEADER.size
+PREFIX_SIZE = _LENGTH.size          # per message
+NONE = 0xffffffff                   # length of None message
+_NONE = _LENGTH.pack(NONE)
+
+CHUNK_SIZE = 32768      # default envelope size if MAX-MSG is not known
+
+
+def _size(payload):
+    """Return size of payload in bytes"""
+    return len(payload) if isinstance(payload, bytes) \
+        else memoryview(payload).nbytes
+
+
+def pack(messages):
+    """Return envelope of messages as bytes
+
+    :param messages: sequence of bytes-like objects or None
+    """
+    parts = [_HEADER.pack(MAGIC, len(messages))]
+    for m in messages:
+        if m is None:
+            parts.append(_NONE)
+        else:
+            parts.append(_LENGTH.pack(_size(m)))
+            parts.append(m)
+    return b''.join(parts)
+
+
+def is_envelope(data):
+    """Return True if data starts with the envelope header"""
+    return bytes(data[0:2]) == MAGIC and len(data) >= HEADER_SIZE
+
+
+def iter_unpack(envelope):
+    """Generator of the messages of envelope as memoryview slices
+    without copying, None for None messages
+
+    :raises ValueError: envelope is invalid or truncated
+    """
+    m = memoryview(envelope)
+    if m.ndim != 1 or m.format != 'B':
+        m = m.cast('B')
+    if not is_envelope(m):
+        raise ValueError('Message is not a batch envelope')
+    magic, count = _HEADER.unpack_from(m)
+    pos = HEADER_SIZE
+    for i in range(count):
+        if pos + PREFIX_SIZE > len(m):
+            raise ValueError('Batch envelope truncated in message %d' % (i+1))
+        n, = _LENGTH.unpack_from(m, pos)
+        pos += PREFIX_SIZE
+        if n == NONE:
+            yield None
+            continue
+        if pos + n > len(m):
+            raise ValueError('Batch envelope truncated in message %d' % (i+1))
+        yield m[pos:pos+n]
+        pos += n
+
+
+def unpack(envelope):
+    """Return list of the messages of envelope as bytes or None"""
+    return [bytes(m) if m is not None else None for m in iter_unpack(envelope)]
+
+
+def batch_handler(handler, replies=True):
+    """Return BrokerServer handler calling handler for each message
+    of a request envelope
+
+    :param handler: function(message, context) with message as bytes,
+        returning reply bytes or None
+    :param replies: if True reply with the envelope of the handler
+        replies in the order of the messages, else send no reply
+
+    An exception of handler fails the whole envelope: the server
+    cancels the conversation.
+    """
+    def handle(request, context):
+        results = [handler(bytes(m) if m is not None else None, context)
+                   for m in iter_unpack(request)]
+        return pack(results) if replies else None
+    return handle
+
+
+class BatchingSender(object):
+    """Client sending messages in envelopes on one conversation
+
+    The envelope is sent when it reaches max_messages or the next message
+    would exceed max_bytes. The linger time is checked with each send()
+    and with poll(), which should be called periodically if messages
+    arrive irregularly.
+
+    :param broker: logged on Broker instance used only by the sender
+    :param service: tuple (server_class, server_name, service)
+    :param max_messages: maximum number of messages in an envelope
+    :param max_bytes: maximum envelope size, default MAX-MSG of the
+        kernel if known by Broker.kernelVersion() else CHUNK_SIZE.
+        A single larger message is sent in its own envelope.
+    :param linger: seconds after the first message of an envelope after
+        which it is sent, None for no time limit
+    :param wait: 'NO' sends without waiting for a reply, the server
+        should then send none (batch_handler with replies=False), else
+        the wait time for the reply envelope of the server
+    :param onreply: function(messages, replies) called with the list
+        of messages sent and the list of replies if wait is not 'NO'
+
+    :ivar batches: number of envelopes sent
+    :ivar messages: number of messages sent
+    """
+    def __init__(self, broker, service, max_messages=100, max_bytes=None,
+                 linger=0.1, wait='NO', onreply=None):
+        self.broker = broker
+        self.service = service
+        self.max_messages = max_messages
+        if max_bytes is None:
+            max_bytes = getattr(broker, 'maxmsg', 0) or CHUNK_SIZE
+        self.max_bytes = max_bytes
+        self.linger = linger
+        self.wait = wait
+        self.onreply = onreply
+        self.conv_id = 'NEW'
+        self.pending = []
+        self.bytes = HEADER_SIZE    # size of current envelope
+        self.started = 0.
+        self.batches = 0
+        self.messages = 0
+
+    def send(self, payload):
+        """Add message to the current envelope and send the envelope
+        if a threshold is reached
+
+        :param payload: message, bytes-like object
+        """
+        size = PREFIX_SIZE + _size(payload)
+        if self.pending and self.bytes + size > self.max_bytes:
+            self.flush()        # message does not fit into current envelope
+        if not self.pending:
+            self.started = time.time()
+        self.pending.append(payload)
+        self.bytes += size
+        if len(self.pending) >= self.max_messages or \
+                self.bytes >= self.max_bytes:
+            self.flush()
+        else:
+            self.poll()
+
+    def flush(self):
+        """Send the current envelope
+
+        If the conversation was ended e.g. by a timeout of the Broker
+        a new one is started.
+
+        :returns: list of replies if wait is not 'NO' else None,
+            TIMEDOUT on timeout if raise_timeout of the Broker is False
+        """
+        if not self.pending:
+            return None
+        messages, self.pending = self.pending, []
+        self.bytes = HEADER_SIZE
+        bb = self.broker
+        bb.server_class, bb.server_name, bb.service = self.service
+        envelope = pack(messages)
+        for conv_id in (self.conv_id, 'NEW'):
+            bb.option = 0
+            bb.wait = self.wait
+            bb.receive_length = 0 if self.wait == 'NO' else len(bb.receive_buffer)
+            try:
+                rc = bb.send(conv_id=conv_id, payload=envelope)
+                break
+            except BrokerConversationError:
+                if conv_id == 'NEW':
+                    raise
+        self.conv_id = bb.conv_id
+        self.batches += 1
+        self.messages += len(messages)
+        if self.wait == 'NO':
+            return None
+        if rc is TIMEDOUT:
+            return TIMEDOUT
+        replies = unpack(bb.receive_buffer[0:bb.return_length])
+        if self.onreply:
+            self.onreply(messages, replies)
+        return replies
+
+    def poll(self):
+        """Send the current envelope if its linger time has passed"""
+        if self.pending and self.linger is not None and \
+                time.time() - self.started >= self.linger:
+            self.flush()
+
+    def close(self):
+        """Send the current envelope and end the conversation"""
+        try:
+            self.flush()
+        finally:
+            if self.conv_id != 'NEW':
+                bb = self.broker
+                bb.conv_id = self.conv_id
+                self.conv_id = 'NEW'
+                try:
+                    bb.endConversation()
+                except BrokerException:
+                    pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    def stats(self):
+        """Return dict with numbers of envelopes and messages sent and
+        the average number of messages per envelope"""
+        return dict(batches=self.batches, messages=self.messages,
+                    pending=len(self.pending),
+                    avg_batch=self.messages / float(self.batches)
+                    if self.batches else 0.)
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
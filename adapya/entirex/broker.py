@@ -3,11 +3,14 @@
 
 """broker.py is a Python interface to Webmethods EntireX Broker
 
-The module loads the EntireX Broker stub:
+The EntireX Broker stub is loaded with the first Broker call:
 
 * broker.dll for 64-bit Python otherwise broker32.dll (on Windows)
 * libbroker.so shared library (on Unix)
 
+The stub library path can be given with set_stub() or the environment
+variable ETB_STUB.
+
 broker.py defines the Broker class using the Advanced Communication
 interface (ACI) for communicating with the EntireX broker.
 """
@@ -18,8 +21,10 @@ from . import acierror
 # from exceptions import Exception             # PY3
 from datetime import datetime
 # import string PY3
+import os
 import struct
 import sys
+import time
 import types
 
 import ctypes
@@ -27,8 +32,11 @@ from ctypes import c_char_p
 
 from adapya.base.defs import Abuf
 from adapya.base.dump import dump
+from adapya.base import datamap
 from adapya.base.datamap import Datamap, String, Bytes, Filler, Uint1, Uint4, \
-    T_IN, T_OUT, T_INOUT, str_str
+    T_IN, T_OUT, T_INOUT, T_STRING, T_BYTE, T_UINT1, T_UINT4, str_str
+
+_text = type(u'')
 
 
 class BrokerException(Exception):
@@ -48,13 +56,42 @@ class BrokerException(Exception):
             adalog.warning('BrokerException', e.value, e.__class__)
             dump(e.etb.error_buffer,log=adalog.warning)
 
+    The value may also be given as acierror.AciError registry entry,
+    then the value text is built when it is first used and self.error
+    is the AciError entry with error class and retry flags::
+
+        except BrokerError as e:
+            if e.error and e.error.retryable:
+                ...
+
     """
+    error = None    # acierror.AciError entry if given
 
     def __init__(self, value, etb):
-        if not value or value.startswith(' '):   # indicator no explanation in acierror.py
-            value+='\nError-Text: %s' %(etb.errtext_buffer.value)
-        self.value = value
+        if isinstance(value, acierror.AciError):
+            self.error = value
+            self._value = None
+            # keep error text returned from Broker if no explanation
+            self._errtext = None if value.explained else etb.errtext_buffer.value
+        else:
+            if not value or value.startswith(' '):   # indicator no explanation in acierror.py
+                value+='\nError-Text: %s' %(etb.errtext_buffer.value)
+            self._value = value
         self.etb = etb
+
+    @property
+    def value(self):
+        if self._value is None:
+            value = self.error.message
+            if self._errtext is not None:
+                value += '\nError-Text: %s' % self._errtext
+            self._value = value
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
     def __str__(self):
         return repr(self.value)
 
@@ -67,37 +104,105 @@ class BrokerTimeOut(BrokerException):
 class InterfaceError(BrokerException):
     "Subclass of BrokerException for Broker Interface Errors"
     pass
+class BrokerConversationError(BrokerError):
+    "Subclass of BrokerError for conversation errors (class 0003)"
+    pass
+class BrokerServiceError(BrokerError):
+    "Subclass of BrokerError for services not registered (class 0007)"
+    pass
+class BrokerSecurityError(BrokerError):
+    "Subclass of BrokerError for security and SSL errors (class 0008, 0216)"
+    pass
+class BrokerResourceError(BrokerError):
+    "Subclass of BrokerError for Broker resource shortages (class 0037)"
+    pass
+class BrokerConnectionError(BrokerError):
+    "Subclass of BrokerError for connection errors (class 0215)"
+    pass
 
+# exception class by error class
+errorclasses = {
+    3:   BrokerConversationError,
+    7:   BrokerServiceError,
+    8:   BrokerSecurityError,
+    37:  BrokerResourceError,
+    215: BrokerConnectionError,
+    216: BrokerSecurityError,
+    }
+
+
+etblnk = None       # Broker stub, resolved by load_stub() on first call
+stub_path = None    # Broker stub library path, see set_stub()
+_stub_error = None  # cached failure of loading the stub library
 
-if sys.platform == 'zos': # or != ?
-    # MVS load lib search order: STEPLIB, JOBLIB, LPA and Link List
-    etblnk=ctypes.cdll.LoadLibrary('//BROKER2')
-else:
-    if sys.platform in ('win32','cli'): # CPython or IronPython
-        import ctypes.util
-        etbname = ctypes.util.find_library('broker') # get full path of broker.dll
-        print('broker=%r' % etbname)
-    else:
-        etbname = 'libbroker.so'
 
+def load_library(name):
+    """Load the Broker stub library and set up its broker() function
+
+    :param name: path or name of the stub library
+    :returns: ctypes library handle
+    """
+    lib = ctypes.cdll.LoadLibrary(name)
+    lib.broker.argtypes = [c_char_p,c_char_p,c_char_p,c_char_p]
+    return lib
+
+
+def set_stub(path=None):
+    """Set the Broker stub library to be loaded on the next Broker call
+
+    :param path: path of the stub library, default None selects
+        the library from environment variable ETB_STUB or the
+        platform default (broker.dll/broker32.dll, libbroker.so or
+        //BROKER2 on z/OS)
+    """
+    global etblnk, stub_path, _stub_error
+    stub_path = path
+    etblnk = None
+    _stub_error = None
+
+
+def load_stub():
+    """Return the Broker stub, resolving it on first use
+
+    With environment variable ETB_EMULATOR set the in-process
+    BrokerEmulator is used instead of a stub library.
+    The result is kept in the module variable etblnk;
+    a failure to load is kept as well and raised again
+    on subsequent calls until set_stub() is called.
+    """
+    global etblnk, _stub_error
+    if etblnk is not None:
+        return etblnk
+    if _stub_error is not None:
+        raise _stub_error
+
+    if os.environ.get('ETB_EMULATOR'):
+        from .emulator import BrokerEmulator
+        etblnk = BrokerEmulator()
+        return etblnk
+
+    etbname = stub_path or os.environ.get('ETB_STUB')
+    if not etbname:
+        if sys.platform == 'zos':
+            # MVS load lib search order: STEPLIB, JOBLIB, LPA and Link List
+            etbname = '//BROKER2'
+        elif sys.platform in ('win32','cli'): # CPython or IronPython
+            from ctypes.util import find_library
+            etbname = find_library(                     # full path of DLL
+                'broker' if ctypes.sizeof(c_char_p) == 8 else 'broker32') \
+                or 'broker'
+        else:
+            etbname = 'libbroker.so'
     try:
-        etblnk=ctypes.cdll.LoadLibrary(etbname)
+        etblnk = load_library(etbname)
     except OSError as e:
-        print('Running Python Version %s\n\ton platform %s, %d bit, byteorder=%s' % (
-             sys.version, sys.platform, sizeof(c_char_p)*8, sys.byteorder ))
-        print('"%s" could not be loaded: check that EntireX bin directory' %(etbname,))
-        print("Exception '%r' occured" % e.value)
-        raise
-if 0:
-    if sys.platform.startswith('win'):
-        if ctypes.sizeof(c_char_p) == 8:
-            etblnk=ctypes.cdll.broker     # 64 bit broker DLL
-        else:
-            etblnk=ctypes.cdll.broker32   # 32 bit broker DLL
-    else:
-        etblnk=ctypes.cdll.LoadLibrary('libbroker.so')
-
-etblnk.broker.argtypes = [c_char_p,c_char_p,c_char_p,c_char_p]
+        _stub_error = OSError(
+            '"%s" could not be loaded: check that EntireX bin directory '
+            'is in the library search path\n\t(Python %s on platform %s, '
+            '%d bit, byteorder=%s): %s' % (etbname, sys.version.split()[0],
+             sys.platform, ctypes.sizeof(c_char_p)*8, sys.byteorder, e))
+        raise _stub_error
+    return etblnk
 
 
 # --- EntireX Broker API Type Constants (api_type) -----------------
@@ -415,6 +520,124 @@ LETBCB9 =  872
 LETBCB10 = 880
 
 
+class EtbcbCodec(object):
+    """Precompiled access to the fields of a Broker control block buffer
+
+    Generated once from the field list with the offsets of all fields,
+    struct.Struct objects for the numeric fields and a cache of the
+    encoded values of string fields (preset with the conv_id and wait
+    constants). Etbcb instances with the default Latin-1 encoding and
+    native byte order use it for their attribute access.
+
+    :param fields: field list, default etbcbfields
+    :param encoding: encoding of the string fields
+
+    :ivar fields:  dict of field name: (start, size)
+    :ivar getters: dict of field name: function(buffer) returning the value
+    :ivar setters: dict of input field name: function(buffer, value),
+                   raises TypeError or struct.error for values that
+                   cannot be set directly
+    """
+    constants = ('', 'NEW', 'OLD', 'NONE', 'ANY', 'YES', 'NO')
+    maxcache = 256  # maximum number of cached string values per field
+
+    def __init__(self, fields=etbcbfields, encoding='latin_1'):
+        self.encoding = encoding
+        self.fields = {}
+        self.getters = {}
+        self.setters = {}
+        dm = Datamap('Etbcb', *fields)
+        for key in dm.keylist:
+            ftype, start, size, inout, fdic = dm.keydict[key]
+            self.fields[key] = (start, size)
+            if ftype == T_STRING:
+                get, put = self._string(start, size)
+            elif ftype in (T_UINT1, T_UINT4):
+                get, put = self._uint(start, '=B' if size == 1 else '=I')
+            elif ftype == T_BYTE:
+                get, put = self._bytes(start, size), None
+            else:
+                continue
+            self.getters[key] = get
+            if put and inout & T_IN:
+                self.setters[key] = put
+
+    def _string(self, start, size):
+        stop = start + size
+        encoding = self.encoding
+        maxcache = self.maxcache
+        cache = {}
+
+        def encode(value):
+            if isinstance(value, _text):
+                value = value.encode(encoding)
+            elif not isinstance(value, bytes):
+                raise TypeError(value)
+            return value[:size].ljust(size, b' ')
+
+        for value in self.constants:
+            cache[value] = encode(value)
+
+        if sys.hexversion >= 0x3010100: # PY3
+            def get(buf):
+                return buf[start:stop].decode(encoding, 'replace').rstrip(' ')
+        else:
+            def get(buf):
+                return buf[start:stop].rstrip(' ')
+
+        def put(buf, value):
+            try:
+                buf[start:stop] = cache[value]
+            except (KeyError, TypeError):   # not cached or unhashable
+                encoded = encode(value)
+                if len(cache) < maxcache and isinstance(value, (str, bytes)):
+                    cache[value] = encoded
+                buf[start:stop] = encoded
+        return get, put
+
+    def _uint(self, start, fmt):
+        s = struct.Struct(fmt)
+        unpack_from, pack_into = s.unpack_from, s.pack_into
+
+        def get(buf):
+            return unpack_from(buf, start)[0]
+
+        def put(buf, value):
+            pack_into(buf, start, value)    # struct.error if out of range
+        return get, put
+
+    def _bytes(self, start, size):
+        stop = start + size
+
+        def get(buf):
+            return buf[start:stop]
+        return get
+
+
+etbcb_codec = EtbcbCodec()
+
+
+class _EtbcbField(object):
+    """Read access to an Etbcb field through etbcb_codec
+
+    Falls back to the Datamap attribute access if the Etbcb instance
+    does not use the codec or has no buffer yet.
+    """
+    __slots__ = ('key', 'get')
+
+    def __init__(self, key, get):
+        self.key = key
+        self.get = get
+
+    def __get__(self, etb, cls=None):
+        if etb is None:
+            return self
+        d = etb.__dict__
+        if d['codec'] is not None and d['buffer'] is not None:
+            return self.get(d['buffer'])
+        return Datamap.__getattr__(etb, self.key)
+
+
 def pptime(timestring):
     if timestring.strip() and timestring.strip('\x00') : # string not blank or zero
         return "%04s-%02s-%02s %02s:%02s:%02s.%03s UTC+0" % (timestring[0:4], timestring[4:6], timestring[6:8],
@@ -422,19 +645,30 @@ def pptime(timestring):
     else:
         return ''
 
+TIMEDOUT = 'TIMEDOUT'  # returned on timeout by calls with raise_timeout False
+
+
 class Etbcb(Datamap):
     "Defines Broker control block with its attributes and Broker call()"
     def __init__(self, send_length=0, receive_length=0,
-                 use_api_version=API_VERS7,**kw):
+                 use_api_version=API_VERS7, transport=None, **kw):
 
         self.__dict__['errtext_buffer'] = Abuf(80)
         self.__dict__['send_buffer'] = None
         self.__dict__['receive_buffer'] = None
-        self.__dict__['trace'] = None
+        self.__dict__['trace'] = 0
         self.__dict__['use_api_version'] = use_api_version
+        self.__dict__['transport'] = transport  # None: use module etblnk
+        self.__dict__['raise_timeout'] = True   # False: call() returns TIMEDOUT
 
         Datamap.__init__(self, 'Etbcb', *etbcbfields, **kw)
 
+        # precompiled field access if the defaults of etbcb_codec apply
+        self.__dict__['codec'] = etbcb_codec if (
+            self.encoding == etbcb_codec.encoding and not self.ebcdic
+            and not datamap.dataIsEbcdic and not self.offset
+            and (self.byteOrder or datamap.byteOrder) == '=') else None
+
         self.buffer=Abuf(self.dmlen)
         self.errtext_length=80
         self.api_type=API_TYPE1
@@ -447,6 +681,41 @@ class Etbcb(Datamap):
             self.send_buffer=Abuf(send_length)
             self.send_length=send_length
 
+    def __setattr__(self, key, data):
+        codec = self.__dict__.get('codec')
+        if codec is not None:
+            put = codec.setters.get(key)
+            if put is not None:
+                try:
+                    put(self.__dict__['buffer'], data)
+                    return
+                except (TypeError, struct.error):
+                    pass    # let Datamap convert or report the value
+        Datamap.__setattr__(self, key, data)
+
+    def snapshot(self):
+        """Return image of the control block as bytes for restore()"""
+        return self.buffer[:]
+
+    def restore(self, image):
+        """Set the control block from an image taken with snapshot()
+        or Broker.template() with a single buffer copy.
+        Note: all fields including conv_id are set from the image
+        """
+        if len(image) != len(self.buffer):
+            raise BrokerException('restore(): image size %d differs from '
+                'control block size %d' % (len(image), len(self.buffer)), self)
+        ctypes.memmove(self.buffer, image, len(image))
+
+    def apply(self, patch):
+        """Set the fields of an EtbcbPatch in the control block"""
+        if self.codec is etbcb_codec:
+            buf = self.buffer
+            for start, stop, data in patch.slices:
+                buf[start:stop] = data
+        else:
+            self.update(**patch.fields)
+
     def call(self):
         if self.trace&1:
             print('Before Broker call')
@@ -472,7 +741,7 @@ class Etbcb(Datamap):
                 dump(self.send_buffer[0:self.send_length],
                     header='    send_buffer',prefix='   ')
 
-        i = etblnk.broker(self.buffer, self.send_buffer, self.receive_buffer,
+        i = (self.transport or etblnk or load_stub()).broker(self.buffer, self.send_buffer, self.receive_buffer,
               self.errtext_buffer )
 
         if self.trace&2:
@@ -495,55 +764,237 @@ class Etbcb(Datamap):
                 uowStatus_str(self.uowStatus),
                 pptime(self.commitTime)))
 
-        if self.error_code > '00000000':
-            if self.error_code in (
+        error_code = self.error_code
+        if error_code > '00000000':
+            if error_code in (
                     '00740074',   # Wait timeout
                     '02150373'):  # Transport timeout (new with single conv?)
-                raise BrokerTimeOut( acierror.geterror(self.error_code), self)
-            raise BrokerError(acierror.geterror(self.error_code),self)
+                if not self.raise_timeout:
+                    return TIMEDOUT
+                raise BrokerTimeOut(acierror.lookup(error_code), self)
+            err = acierror.lookup(error_code)
+            raise errorclasses.get(err.errclass, BrokerError)(err, self)
 
         if i != 0:
             raise InterfaceError(acierror.geterror('0020%04d' %i), self)
 
 
+class EtbcbPatch(object):
+    """Pre-encoded values of Etbcb fields to be set with Etbcb.apply()
+
+    :param fields: field=value items, encoded once with etbcb_codec
+    """
+    def __init__(self, **fields):
+        self.fields = fields
+        self.slices = []    # (start, stop, encoded value)
+        scratch = bytearray(LETBCB10)
+        for key, value in fields.items():
+            start, size = etbcb_codec.fields[key]
+            etbcb_codec.setters[key](scratch, value)
+            self.slices.append((start, start+size, bytes(scratch[start:start+size])))
+        self.slices.sort()
+
+
+UOW_RESET = EtbcbPatch(uowID='', uowStatus=RECV_NONE)             # after commit
+EOC_RESET = EtbcbPatch(conv_id='', uowID='', uowStatus=RECV_NONE) # after EOC
+
+
+for _key, _get in etbcb_codec.getters.items():
+    setattr(Etbcb, _key, _EtbcbField(_key, _get))
+del _key, _get
+
+
+class _Pybuffer(ctypes.Structure):
+    """Py_buffer of the C API, filled by PyObject_GetBuffer()"""
+    _fields_ = [('buf', ctypes.c_void_p), ('obj', ctypes.c_void_p),
+                ('len', ctypes.c_ssize_t), ('itemsize', ctypes.c_ssize_t),
+                ('readonly', ctypes.c_int), ('ndim', ctypes.c_int),
+                ('format', ctypes.c_char_p), ('shape', ctypes.c_void_p),
+                ('strides', ctypes.c_void_p), ('suboffsets', ctypes.c_void_p),
+                ('internal', ctypes.c_void_p)]
+
+
+def _address(m):
+    """Return address of the data of contiguous memoryview m, also of a
+    read-only one, or None if the C API is not available"""
+    try:
+        getbuffer = ctypes.pythonapi.PyObject_GetBuffer
+        release = ctypes.pythonapi.PyBuffer_Release
+    except AttributeError:
+        return None
+    pb = _Pybuffer()
+    if getbuffer(ctypes.py_object(m), ctypes.byref(pb), 0) != 0:  # SIMPLE
+        return None
+    try:
+        return pb.buf
+    finally:
+        release(ctypes.byref(pb))
+
+
+def _sendbuf(payload):
+    """Return (buffer, length) to pass a payload as send buffer
+
+    Read-only buffers other than bytes e.g. memoryview slices of bytes
+    or mmap objects with ACCESS_READ are passed by address, the buffer
+    keeps a reference to the view. They are copied only if the C API
+    is not available.
+    """
+    if isinstance(payload, bytes):
+        return payload, len(payload)
+    if isinstance(payload, ctypes.Array):       # e.g. Abuf
+        return payload, ctypes.sizeof(payload)
+    m = memoryview(payload)
+    if m.ndim != 1 or m.format != 'B':
+        m = m.cast('B')     # raises TypeError if not contiguous
+    if not m.readonly:
+        return (ctypes.c_char * len(m)).from_buffer(m), len(m)
+    address = _address(m) if len(m) else None
+    if address is None:
+        data = m.tobytes()
+        return data, len(data)
+    buf = (ctypes.c_char * len(m)).from_address(address)
+    buf.view = m            # keep the data alive while buf is used
+    return buf, len(m)
+
+
 class Broker(Etbcb):
     """Defines the essential Broker ACI functions using the Etbcb.
        For reference see EntireX Broker ACI Programming.
+
+       :param transport: object with broker() method performing the
+           Broker calls (see adapya.entirex.transport), default None
+           uses the module stub etblnk
+       :param adaptive: if True the receive buffer starts with
+           receive_length and grows when a received message is
+           truncated (error 00200094). The message is then received
+           again with option LAST. Growth is limited by maxmsg, the
+           kernel MAX-MSG set by kernelVersion().
+           Messages of conv_id NONE conversations cannot be received
+           again: the error is raised but later messages use the
+           grown buffer. Only the receive buffer of the instance is
+           adapted, not a buffer of receive_into() or one assigned
+           to receive_buffer.
+       :param shrink_after: seconds without a message larger than
+           receive_length after which the grown receive buffer is
+           reduced to receive_length again
+       :param raise_timeout: if False the receive functions return
+           TIMEDOUT on a wait or transport timeout instead of
+           raising BrokerTimeOut, for polling loops
     """
 
     def __init__(self, broker_id='localhost', user_id='monty', token=None,
-                 receive_length=2048, send_length=2048):
-        Etbcb.__init__(self, receive_length=receive_length, send_length=send_length)
+                 receive_length=2048, send_length=2048, transport=None,
+                 adaptive=False, shrink_after=60., raise_timeout=True):
+        Etbcb.__init__(self, receive_length=receive_length,
+                       send_length=send_length, transport=transport)
+        self.raise_timeout = raise_timeout
+
+        self.__dict__['adaptive'] = adaptive
+        self.__dict__['shrink_after'] = shrink_after
+        self.__dict__['initial_length'] = receive_length
+        self.__dict__['grown_time'] = time.time()   # last message > initial_length
+        self.__dict__['maxmsg'] = 0         # kernel MAX-MSG if known
+        # receive buffer managed by adaptive calls, other buffers
+        # e.g. of receive_into() are left as they are
+        self.__dict__['own_buffer'] = self.receive_buffer
 
         self.broker_id=broker_id
         self.user_id=user_id
         if token != None:
             self.token=token
 
+    def call(self):
+        rbuf = self.receive_buffer
+        if not self.adaptive or rbuf is None or rbuf is not self.own_buffer:
+            return Etbcb.call(self)
+
+        if len(rbuf) > self.initial_length and \
+                time.time() - self.grown_time > self.shrink_after:
+            self.receive_buffer = self.own_buffer = rbuf = \
+                Abuf(self.initial_length)
+            self.receive_length = self.initial_length
+        try:
+            i = Etbcb.call(self)
+        except BrokerError:
+            if self.error_code != '00200094':
+                raise
+            size = self.return_length   # total length of truncated message
+            if self.maxmsg and size > self.maxmsg:
+                raise
+            size = max(size, 2*len(rbuf))
+            if self.maxmsg:
+                size = min(size, self.maxmsg)
+            self.receive_buffer = self.own_buffer = Abuf(size)
+            self.receive_length = size
+            self.grown_time = time.time()
+
+            conv_id = self.conv_id.strip('\x00 ')
+            if not conv_id or conv_id == 'NONE':
+                raise
+            function, option = self.function, self.option
+            self.function = FCT_RECEIVE
+            self.option = OPT_LAST
+            self.conv_id = conv_id
+            try:
+                i = Etbcb.call(self)
+            finally:
+                self.function, self.option = function, option
+        else:
+            if self.return_length > self.initial_length:
+                self.grown_time = time.time()
+        return i
+
+    def template(self, **fields):
+        """Return a prepared control block image for restore()
+
+        The image contains the current control block with the given
+        fields set, e.g. the service names, conv_id and wait time of
+        repeated requests. The control block itself is not changed.
+
+        >>> req = bb.template(server_class='ACLASS', server_name='ASERVER',
+        ...                   service='ASERVICE', conv_id='NONE', wait='30S')
+        >>> bb.restore(req); bb.send_length=n; bb.send()
+        """
+        saved = self.snapshot()
+        try:
+            self.update(**fields)
+            return self.snapshot()
+        finally:
+            self.restore(saved)
+
     def backout(self):
         "Backout UOW but continue conversation"
         self.function=FCT_SYNCPOINT
         self.option=OPT_BACKOUT
         self.call()
-        self.uowID=''   # reset some fields after commit
-        self.uowStatus=RECV_NONE
+        self.apply(UOW_RESET)   # reset some fields after commit
 
     def commit(self):
         "Commit UOW but continue conversation"
         self.function=FCT_SYNCPOINT
         self.option=OPT_COMMIT
         self.call()
-        self.uowID=''   # reset some fields after commit
-        self.uowStatus=RECV_NONE
+        self.apply(UOW_RESET)   # reset some fields after commit
 
     def commitEndConversation(self):
         "Commit UOW and end conversation"
         self.function=FCT_SYNCPOINT
         self.option=OPT_EOC
         self.call()
-        self.conv_id=''           # reset some fields after commit
-        self.uowID=''
-        self.uowStatus=RECV_NONE
+        self.apply(EOC_RESET)   # reset some fields after commit
+
+    def controlPublication(self, option=OPT_COMMIT, publicationID='', topic=''):
+        """Commit or backout a publication. A publisher commits the
+        messages sent in publicationID, a subscriber acknowledges the
+        publication received on topic (option COMMIT) or has it
+        delivered again (option BACKOUT)
+        """
+        self.function=FCT_CNTLPUBLICATION
+        if topic!='':
+            self.topic=topic
+        self.option=option
+        self.publicationID=publicationID
+        self.call()
 
     def kernelVersion(self):
         "Determine Broker kernel version"
@@ -551,8 +1002,8 @@ class Broker(Etbcb):
         self.option = OPT_EXTENDED
         self.call()
 
-        print('\nMAX-MSG is %d' % self.return_length)
-        # maxmsg is returned with the OPT_EXTENDED option
+        self.maxmsg = self.return_length
+        # MAX-MSG of the kernel is returned with the OPT_EXTENDED option
         # obviously works with use_api_version V4
         # unrelated to single conversation mode
 
@@ -593,6 +1044,8 @@ class Broker(Etbcb):
     def receive(self, conv_id='', option=0, wait=''):
         """Used by clients to receive incoming messages and by servers
            to receive incoming requests
+
+        :returns: TIMEDOUT on timeout if raise_timeout is False
         """
         self.function=FCT_RECEIVE
         if conv_id!='':
@@ -601,16 +1054,98 @@ class Broker(Etbcb):
             self.option=option
         if wait!='':
             self.wait=wait
-        self.call()
+        return self.call()
+
+    def receive_into(self, buf, conv_id='', option=0, wait=''):
+        """Receive a message directly into a caller supplied buffer
+
+        :param buf: writable contiguous buffer object e.g. bytearray,
+            mmap, array or ctypes array, used instead of receive_buffer
+            for this call
+        :returns: memoryview of buf with the return_length bytes received
+            or TIMEDOUT on timeout if raise_timeout is False
+
+        >>> buf = bytearray(32768)
+        >>> msg = bb.receive_into(buf, conv_id='NEW', wait='30S')
+        """
+        m = memoryview(buf)
+        if m.ndim != 1 or m.format != 'B':
+            m = m.cast('B')     # raises TypeError if not contiguous
+        if m.readonly:
+            raise TypeError('receive_into() requires a writable buffer')
+        rbuf, rlen = self.receive_buffer, self.receive_length
+        self.__dict__['receive_buffer'] = (ctypes.c_char * len(m)).from_buffer(m)
+        self.receive_length = len(m)
+        try:
+            if self.receive(conv_id=conv_id, option=option, wait=wait) \
+                    is TIMEDOUT:
+                return TIMEDOUT
+        finally:
+            self.__dict__['receive_buffer'] = rbuf
+            self.receive_length = rlen
+        return m[:self.return_length]
 
     def receiveNew(self, wait=''):
-        """Receive any message from new conversation"""
+        """Receive any message from new conversation
+
+        :returns: TIMEDOUT on timeout if raise_timeout is False
+        """
         self.function=FCT_RECEIVE
         self.conv_id='NEW'
         self.option=OPT_ANY
         if wait!='':
             self.wait=wait
-        self.call()
+        return self.call()
+
+    def receivePublication(self, topic='', publicationID='NEW', wait=''):
+        """Receive first message of a new publication of a subscribed
+        topic (publicationID NEW) or the next message of publicationID
+
+        :returns: TIMEDOUT on timeout if raise_timeout is False
+        """
+        self.function=FCT_RECVPUBLICATION
+        if topic!='':
+            self.topic=topic
+        self.publicationID=publicationID
+        self.option=0
+        if wait!='':
+            self.wait=wait
+        return self.call()
+
+    def receiveUow(self, conv_id='', wait=''):
+        """Receive all messages of the next unit of work
+
+        The first message is received with conv_id, the following ones
+        on its conversation until uowStatus is RECV_LAST or RECV_ONLY.
+        A message not sent in a UOW is returned as only message.
+
+        :returns: list of messages as bytes or TIMEDOUT if the first
+            receive timed out and raise_timeout is False
+        :raises BrokerTimeOut: timeout within the unit of work, which
+            is backed out to be delivered again
+        """
+        messages = []
+        try:
+            while True:
+                self.receive_length = len(self.receive_buffer)
+                if self.receive(conv_id=conv_id, wait=wait) is TIMEDOUT:
+                    if not messages:
+                        return TIMEDOUT
+                    raise BrokerTimeOut('Wait timeout within unit of work %s'
+                                        % uowid, self)
+                messages.append(bytes(self.receive_buffer[0:self.return_length]))
+                if self.uowStatus not in (RECV_FIRST, RECV_MIDDLE):
+                    return messages
+                conv_id, uowid = self.conv_id, self.uowID
+                self.option = 0
+        except BrokerTimeOut:
+            if messages:
+                self.conv_id, self.uowID = conv_id, uowid
+                try:
+                    self.backout()
+                except BrokerException:
+                    pass
+            raise
 
     def register(self, option=0):
         """Used by servers to inform EntireX Broker that a
@@ -620,22 +1155,73 @@ class Broker(Etbcb):
         self.option = option    # only valid option: ATTACH
         self.call()
 
-    def send(self, conv_id='', option=0):
-        """Used by clients to send requests and servers to send replies"""
+    def send(self, conv_id='', option=0, payload=None):
+        """Used by clients to send requests and servers to send replies
+
+        :param payload: message to send instead of the contents of
+            send_buffer, any contiguous buffer object e.g. bytes, bytearray,
+            memoryview or ctypes array. It is passed to the Broker
+            without copying (see _sendbuf()). send_length is set to
+            its size.
+            With payloads only the Broker may be created with send_length=0.
+        :returns: TIMEDOUT if the reply of a send with wait timed out
+            and raise_timeout is False
+        """
         self.function=FCT_SEND
         if conv_id!='':
             self.conv_id=conv_id
         if option!=0:
             self.option=option
-        self.call()
+        if payload is None:
+            i = self.call()
+        else:
+            sbuf = self.send_buffer
+            self.__dict__['send_buffer'], self.send_length = _sendbuf(payload)
+            try:
+                i = self.call()
+            finally:
+                self.__dict__['send_buffer'] = sbuf
+        if i is TIMEDOUT:
+            return i
         if self.option == OPT_COMMIT:
-            # self.conv_id=''          # keep conv_id
-            self.uowID=''              # reset uow fields
-            self.uowStatus=RECV_NONE
+            self.apply(UOW_RESET)      # reset uow fields, keep conv_id
         elif self.option == OPT_EOC:
-            self.conv_id=''            # reset conv/uow fields
-            self.uowID=''
-            self.uowStatus=RECV_NONE
+            self.apply(EOC_RESET)      # reset conv/uow fields
+        return i
+
+    def sendPublication(self, topic='', option=0, payload=None,
+                        publicationID='NEW'):
+        """Send message of a publication on topic. The publication is
+        published when committed with option COMMIT or
+        controlPublication(). publicationID NEW starts a new publication.
+
+        :param payload: message to send instead of the contents of
+            send_buffer (see send())
+        """
+        self.function=FCT_SENDPUBLICATION
+        if topic!='':
+            self.topic=topic
+        self.publicationID=publicationID
+        self.option=option
+        if payload is None:
+            self.call()
+        else:
+            sbuf = self.send_buffer
+            self.__dict__['send_buffer'], self.send_length = _sendbuf(payload)
+            try:
+                self.call()
+            finally:
+                self.__dict__['send_buffer'] = sbuf
+
+    def subscribe(self, topic='', option=0):
+        """Subscribe to topic, option DURABLE keeps the subscription
+        and its publications after logoff
+        """
+        self.function=FCT_SUBSCRIBE
+        if topic!='':
+            self.topic=topic
+        self.option=option
+        self.call()
 
     def syncpoint(self,option=0):
         """ Function allows to manage Units of Work (UOWs)"""
@@ -643,16 +1229,22 @@ class Broker(Etbcb):
         if option!=0:
             self.option=option
         self.call()
-        if self.option == OPT_COMMIT:  # reset conv/uow fields
-            # self.conv_id=''          # leave conversation open
-            self.uowID=''
-            self.uowStatus=RECV_NONE
+        if self.option == OPT_COMMIT:  # reset uow fields
+            self.apply(UOW_RESET)      # leave conversation open
 
     def undo(self):
         """Remove messages that have been sent out but not received"""
         self.function=FCT_UNDO
         self.call()
 
+    def unsubscribe(self, topic=''):
+        "Cancel subscription to topic"
+        self.function=FCT_UNSUBSCRIBE
+        if topic!='':
+            self.topic=topic
+        self.option=0
+        self.call()
+
     def version(self):
         """return the version of the EntireX Broker Stub"""
         self.function=FCT_VERSION
@@ -676,7 +1268,6 @@ class ParmsBrokerService:
         self.server_name=server_name
         self.service=service
 
-
 __version__ = '1.3.0'
 if __version__ == '1.3.0':
     _svndate='$Date: 2023-01-04 10:56:59 +0100 (Wed, 04 Jan 2023) $'
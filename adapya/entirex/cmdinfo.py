@@ -412,7 +412,8 @@ class Infreq(Datamap):
 
 
 class Cis(object):
-    def __init__(self, cis='INFO', broker='', user='', trace=0, rcvsize=32768):
+    def __init__(self, cis='INFO', broker='', user='', trace=0, rcvsize=32768,
+                 transport=None):
         """ Command and Information service object
 
             cis = default 'INFO' - full information on all clients/servers/conversations
@@ -421,10 +422,13 @@ class Cis(object):
                   'PARTICIPANT-SHUTDOWN'
                   'SECURITY-CMD'
 
+            transport = Broker call transport (see adapya.entirex.transport)
+                        default None uses the module stub
+
         """
         global cis_version
         self.rcvsize=rcvsize
-        self.bb = Broker()
+        self.bb = Broker(transport=transport)
         self.bb.trace = trace & 7
         #bb.trace=1 # dump buffers before Broker calls
         #bb.trace=2 # dump buffers after Broker calls
@@ -477,8 +481,8 @@ class Cis(object):
 
         kernel_version = self.bb.kernelVersion()
 
-        print('\nKernel %s \n    with kernelsecurity=%s' % (
-            kernel_version, self.bb.kernelsecurity))
+        print('\nKernel %s \n    with kernelsecurity=%s, MAX-MSG=%d' % (
+            kernel_version, self.bb.kernelsecurity, self.bb.maxmsg))
 
         # extract major version number: "Version 9.12.0.1"
         _, v2 = kernel_version.split(' ',1)  # maxsplit=1 in PY3
@@ -634,6 +638,20 @@ class Cis(object):
 
 
 
+    def iservice(self, server_class, server, service):
+        """ return Info_service object of one service or None if the
+        service is not found, e.g. to read its conv_nonact or maxuowmsg
+        Example:
+        >> info = Cis(broker='da3f:3800',user='MM').iservice('ACLASS','ASERVER','ASERVICE')
+        >> print(info.conv_nonact)
+        >>
+
+        """
+        for info in self.iread(CIO_SERVICE, server_class=server_class,
+                               server=server, service=service):
+            return info
+        return None
+
     def iread(self, itype, uid='', puid='', token='',
             server_class='', server='',service='',
             conv_id='',uowid='',uowstatus=0,userstatus='',
@@ -657,7 +675,8 @@ class Cis(object):
             from adapya.entirex.etbcinf8 import Info_conversation, \
                 Info_client, Info_server, Info_psf, Info_service, Info_UOW_statistics
 
-        ii = Broker()   # establish unique conversation for read sequence
+        # establish unique conversation for read sequence
+        ii = Broker(transport=self.bb.transport)
         # copy properties from own Cis object
         ii.trace        = self.bb.trace
         ii.broker_id    = self.bb.broker_id
@@ -0,0 +1,1038 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""emulator.py is an in-process emulation of the EntireX Broker
+
+The BrokerEmulator class provides the entry point of the EntireX Broker
+stub with the same parameters::
+
+    broker(etbcb, send_buffer, receive_buffer, errtext_buffer)
+
+so that Etbcb.call() runs against it unchanged.
+
+Emulated are services, conversations (NEW/OLD/NONE), units of work (UOW)
+with commit and backout, RECEIVE wait timeouts (00740074), publish and
+subscribe with durable subscriptions and the Command and Information
+Services SAG/ETBCIS/INFO and SAG/ETBCIS/CMD.
+All state is kept in memory of the current process. This allows to
+exercise and measure Broker applications without an EntireX
+installation.
+
+The emulator replaces the Broker stub library if the environment variable
+ETB_EMULATOR is set when the Broker stub is resolved with the first
+Broker call. Otherwise it may be set explicitly::
+
+    >>> from adapya.entirex import broker, emulator
+    >>> broker.etblnk = emulator.BrokerEmulator()
+
+Participants are identified by their Broker control block: each
+Broker instance is a participant of its own.
+"""
+from __future__ import print_function          # PY3
+
+import ctypes
+import itertools
+import struct
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+
+from adapya.base.defs import Abuf
+from adapya.entirex import acierror
+from adapya.entirex.broker import etbcb_codec, \
+    API_VERS_HIGHEST, CONVSTAT_NEW, CONVSTAT_OLD, CONVSTAT_NONE, \
+    FCT_SEND, FCT_RECEIVE, FCT_UNDO, FCT_EOC, FCT_REGISTER, FCT_DEREGISTER, \
+    FCT_VERSION, FCT_LOGON, FCT_LOGOFF, FCT_SYNCPOINT, FCT_KERNELVERS, \
+    FCT_SENDPUBLICATION, FCT_RECVPUBLICATION, FCT_SUBSCRIBE, \
+    FCT_UNSUBSCRIBE, FCT_CNTLPUBLICATION, \
+    OPT_CANCEL, OPT_LAST, OPT_PREVIEW, OPT_COMMIT, OPT_BACKOUT, OPT_SYNC, \
+    OPT_EOC, OPT_ANY, OPT_EXTENDED, OPT_DURABLE, \
+    RECV_NONE, RECEIVED, ACCEPTED, BACKEDOUT, PROCESSED, \
+    RECV_FIRST, RECV_MIDDLE, RECV_LAST, RECV_ONLY
+
+EMULATOR_VERSION = '10.7.0.0'
+CIS_CLASS, CIS_SERVER = 'SAG', 'ETBCIS'
+
+_u1 = struct.Struct('=B')
+_u4 = struct.Struct('=I')
+
+
+class AciFault(Exception):
+    """ACI error raised within the emulator and returned in error_code"""
+    def __init__(self, code):
+        self.code = code
+    def __str__(self):
+        return acierror.geterror(self.code)
+
+
+def waitsecs(wait):
+    """Convert the ACI wait value to seconds
+
+    :returns: 0 for no wait ('', 'NO'), None for unlimited wait ('YES')
+              otherwise number of seconds for 'n', 'nS', 'nM' or 'nH'
+    """
+    w = wait.strip('\x00 ').upper()
+    if w in ('', 'NO'):
+        return 0
+    if w == 'YES':
+        return None
+    unit = 1
+    if w[-1] in 'SMH':
+        unit = {'S': 1, 'M': 60, 'H': 3600}[w[-1]]
+        w = w[:-1]
+    try:
+        return int(w) * unit
+    except ValueError:
+        raise AciFault('00200031')  # Invalid value for wait
+
+
+def match(value, selector):
+    """Match CIS selector allowing blank, '*' and trailing '*' as wildcard"""
+    selector = selector.strip('\x00 ')
+    if not selector or selector == '*':
+        return True
+    if selector.endswith('*'):
+        return value.startswith(selector[:-1])
+    return value == selector
+
+
+class _Participant(object):
+    def __init__(self, seqno, user_id, token):
+        self.seqno = seqno
+        self.user_id = user_id
+        self.token = token
+        self.services = []          # registered service keys (servers)
+        self.convs = {}             # conv_id: conversation (ordered)
+        self.created = self.last_active = time.time()
+        self.waitconv = ''          # conv_id waiting for in RECEIVE
+        self.publishing = {}        # publicationID: uncommitted publication
+
+    @property
+    def puid(self):
+        return ('EMU%08d%017d' % (self.seqno, id(self)))[:28]
+
+
+class _Service(object):
+    def __init__(self, key, maxmsg):
+        self.key = key
+        self.servers = []           # participants registered
+        self.pending = deque()      # conversations not yet accepted
+        self.conv_nonact = 300      # conversation timeout in seconds
+        self.maxuows = 0
+        self.maxuowmsg = 0          # 0: unlimited
+        self.uwtime = 86400
+        self.maxmsgsize = maxmsg
+        self.scm = 0
+        self.prefetch = 0
+        self.total_requests = 0
+
+
+class _Uow(object):
+    def __init__(self, uowid, sender):
+        self.uowid = uowid
+        self.sender = sender
+        self.messages = []
+        self.status = RECV_NONE
+        self.pos = 0                # next message to be received
+        self.adcount = 0            # attempted delivery count
+        self.created = time.time()
+        self.commit_time = ''
+
+
+class _Publication(object):
+    def __init__(self, pubid, topic):
+        self.pubid = pubid
+        self.topic = topic
+        self.messages = []
+
+
+class _Subscription(object):
+    def __init__(self, durable):
+        self.durable = durable
+        self.queue = deque()        # committed publications not received
+        self.inflight = {}          # publicationID: [publication, pos]
+
+
+class _Conversation(object):
+    def __init__(self, conv_id, service, client, nonconv=False):
+        self.conv_id = conv_id
+        self.service = service
+        self.client = client
+        self.server = None          # set when server receives the conversation
+        self.nonconv = nonconv      # non-conversational: CONV-ID=NONE
+        self.toserver = deque()     # plain messages (bytes) or committed _Uow
+        self.toclient = deque()
+        self.endedby = None         # participant that ended the conversation
+        self.eocreason = ''         # error code for partner
+        self.last = {}              # participant: last message received
+        self.inflight = {}          # participant: _Uow received, not committed
+        self.sending = {}           # participant: _Uow sent, not committed
+        self.last_active = time.time()
+
+    def inqueue(self, p):
+        return self.toclient if p is self.client else self.toserver
+
+    def outqueue(self, p):
+        return self.toserver if p is self.client else self.toclient
+
+    def partner(self, p):
+        return self.server if p is self.client else self.client
+
+    def pending(self, p):
+        """:returns: True if RECEIVE by participant p would not have to wait"""
+        uow = self.inflight.get(p)
+        if uow is not None:
+            return uow.pos < len(uow.messages)
+        return bool(self.inqueue(p)) or \
+            (self.endedby is not None and self.endedby is not p)
+
+    def uows(self):
+        for q in (self.toserver, self.toclient):
+            for item in q:
+                if isinstance(item, _Uow):
+                    yield item
+        for uow in self.inflight.values():
+            yield uow
+
+
+class BrokerEmulator(object):
+    """In-process emulation of the EntireX Broker and its stub
+
+    :param broker_id: name of the emulated broker shown in CIS info
+    :param maxmsg: maximum message size (MAX-MSG) of the kernel
+    """
+
+    def __init__(self, broker_id='EMULATOR', maxmsg=1048576):
+        self.broker_id = broker_id
+        self.maxmsg = maxmsg
+        self.started = time.time()
+
+        self.cond = threading.Condition(threading.RLock())
+        self.participants = {}      # address of etbcb: participant
+        self.cbrefs = {}            # address of etbcb: weak reference
+        self.services = {}          # (class, server, service): service
+        self.convs = {}             # conv_id: conversation
+        self.topics = {}            # topic: {(user_id, token): subscription}
+        self._convno = itertools.count(1000000000000001)
+        self._pubno = itertools.count(1)
+        self._uowno = itertools.count(1)
+        self._seqno = itertools.count(1)
+        self.kernel = _Participant(0, self.broker_id, '')  # ends conversations
+
+        self.fields = etbcb_codec.fields    # field name: (start, size)
+
+        self.functions = {
+            FCT_SEND: self.send, FCT_RECEIVE: self.receive,
+            FCT_UNDO: self.undo, FCT_EOC: self.eoc,
+            FCT_REGISTER: self.register, FCT_DEREGISTER: self.deregister,
+            FCT_VERSION: self.version, FCT_LOGON: self.logon,
+            FCT_LOGOFF: self.logoff, FCT_SYNCPOINT: self.syncpoint,
+            FCT_KERNELVERS: self.kernelversion,
+            FCT_SENDPUBLICATION: self.sendpublication,
+            FCT_RECVPUBLICATION: self.recvpublication,
+            FCT_SUBSCRIBE: self.subscribe, FCT_UNSUBSCRIBE: self.unsubscribe,
+            FCT_CNTLPUBLICATION: self.cntlpublication,
+            }
+
+    # --- access to the Broker control block ----------------------------
+
+    def gets(self, cb, key):
+        start, size = self.fields[key]
+        return cb[start:start+size].decode('latin_1').rstrip(' \x00')
+
+    def puts(self, cb, key, value):
+        start, size = self.fields[key]
+        cb[start:start+size] = value.encode('latin_1')[:size].ljust(size, b' ')
+
+    def geti(self, cb, key):
+        start, size = self.fields[key]
+        return (_u1 if size == 1 else _u4).unpack_from(cb, start)[0]
+
+    def puti(self, cb, key, value):
+        start, size = self.fields[key]
+        (_u1 if size == 1 else _u4).pack_into(cb, start, value)
+
+    def svckey(self, cb):
+        return (self.gets(cb, 'server_class'), self.gets(cb, 'server_name'),
+                self.gets(cb, 'service'))
+
+    # --- the Broker stub entry point -----------------------------------
+
+    def broker(self, etbcb, send, receive, errtext):
+        """Entry point with the parameters of the EntireX Broker stub"""
+        with self.cond:
+            try:
+                fct = self.functions.get(self.geti(etbcb, 'function'))
+                if fct is None:
+                    raise AciFault('00200182')  # Invalid function
+                self.puti(etbcb, 'return_length', 0)
+                fct(etbcb, send, receive, errtext)
+                self.puts(etbcb, 'error_code', '00000000')
+            except AciFault as e:
+                self.puts(etbcb, 'error_code', e.code)
+                self.puterr(errtext, acierror.errdict.get(e.code, ''))
+        return 0
+
+    def puterr(self, errtext, text):
+        """Set error text buffer to text terminated by binary zeros"""
+        if errtext is not None:
+            text = text.encode('latin_1')[:len(errtext)-1]
+            ctypes.memset(errtext, 0, len(errtext))
+            ctypes.memmove(errtext, text, len(text))
+
+    # --- participants --------------------------------------------------
+
+    def participant(self, cb, logon=True):
+        """:returns: participant of control block, auto logon if needed
+
+        A participant whose control block was freed without logoff is
+        dropped, a new control block at its address starts a new one.
+        """
+        a = ctypes.addressof(cb)
+        p = self.participants.get(a)
+        if p is not None and self.cbrefs[a]() is not cb:
+            self.drop(a)
+            p = None
+        if p is None:
+            if not logon:
+                raise AciFault('00200134')      # LOGON required
+            user_id = self.gets(cb, 'user_id')
+            if not user_id:
+                raise AciFault('00200181')      # Invalid user id
+            for b, ref in list(self.cbrefs.items()):
+                if ref() is None:
+                    self.drop(b)                # freed without logoff
+            p = _Participant(next(self._seqno), user_id, self.gets(cb, 'token'))
+            self.participants[a] = p
+            self.cbrefs[a] = weakref.ref(cb)
+        p.last_active = time.time()
+        return p
+
+    def logon(self, cb, send, receive, errtext):
+        self.participant(cb)
+
+    def logoff(self, cb, send, receive, errtext):
+        a = ctypes.addressof(cb)
+        if a in self.participants:
+            self.drop(a)
+
+    def drop(self, a):
+        """Remove participant of control block address a ending its
+        conversations, registrations and subscriptions"""
+        p = self.participants.pop(a)
+        del self.cbrefs[a]
+        for conv in list(p.convs.values()):
+            self.endconv(conv, p, '00030012')   # EOC due to LOGOFF
+        for key in list(p.services):
+            self.unregister(p, key)
+        self.unsubscribeall(p)
+
+    def version(self, cb, send, receive, errtext):
+        text = ('EntireX Broker Emulator Version %s' % EMULATOR_VERSION
+                ).encode('latin_1') + b'\x00'
+        self.deliver(cb, receive, text)
+
+    def kernelversion(self, cb, send, receive, errtext):
+        self.puterr(errtext, 'Version %s' % EMULATOR_VERSION)
+        if self.geti(cb, 'option') == OPT_EXTENDED:
+            self.puti(cb, 'return_length', self.maxmsg)
+        self.puti(cb, 'api_version', API_VERS_HIGHEST)
+        self.puts(cb, 'kernelsecurity', 'N')
+
+    # --- services ------------------------------------------------------
+
+    def register(self, cb, send, receive, errtext):
+        p = self.participant(cb)
+        key = self.svckey(cb)
+        if not all(key):
+            raise AciFault('00200183')          # Invalid class/server/service
+        svc = self.services.get(key)
+        if svc is None:
+            svc = self.services[key] = _Service(key, self.maxmsg)
+        if p not in svc.servers:
+            svc.servers.append(p)
+            p.services.append(key)
+
+    def deregister(self, cb, send, receive, errtext):
+        p = self.participant(cb)
+        if not p.services:
+            raise AciFault('00200195')          # deregister not from clients
+        key = self.svckey(cb)
+        for k in list(p.services):
+            if not any(key) or k == key:
+                self.unregister(p, k)
+
+    def unregister(self, p, key):
+        p.services.remove(key)
+        svc = self.services[key]
+        svc.servers.remove(p)
+        if not svc.servers:
+            for conv in list(svc.pending):
+                self.endconv(conv, None, '00030010')    # EOC due to DEREGISTER
+            svc.pending.clear()
+        self.cond.notify_all()
+
+    # --- conversations -------------------------------------------------
+
+    def newconv(self, p, key, nonconv):
+        svc = self.services.get(key)
+        if svc is None or not svc.servers:
+            raise AciFault('00070007')          # Service not registered
+        conv = _Conversation('%016d' % next(self._convno), key, p, nonconv)
+        self.convs[conv.conv_id] = conv
+        p.convs[conv.conv_id] = conv
+        svc.pending.append(conv)
+        svc.total_requests += 1
+        return conv
+
+    def getconv(self, p, conv_id):
+        conv = p.convs.get(conv_id)
+        if conv is None:
+            raise AciFault('00030003')          # No matching conversation
+        return conv
+
+    def endconv(self, conv, p, reason):
+        """End conversation by participant p (None: by the Broker)"""
+        if p is None:
+            p = self.kernel
+        if conv.endedby is not None and conv.endedby is not p:
+            self.dropconv(conv)                 # both sides have ended
+        else:
+            conv.endedby = p
+            conv.eocreason = reason
+            conv.sending.pop(p, None)
+            p.convs.pop(conv.conv_id, None)
+            if conv.server is None and conv.client is p and not conv.toserver:
+                self.dropconv(conv)             # not seen by any server
+        self.cond.notify_all()
+
+    def dropconv(self, conv):
+        self.convs.pop(conv.conv_id, None)
+        for p in (conv.client, conv.server):
+            if p is not None:
+                p.convs.pop(conv.conv_id, None)
+        svc = self.services.get(conv.service)
+        if svc is not None and conv in svc.pending:
+            svc.pending.remove(conv)
+
+    def eoc(self, cb, send, receive, errtext):
+        p = self.participant(cb)
+        conv_id = self.gets(cb, 'conv_id')
+        reason = '00030011' if self.geti(cb, 'option') == OPT_CANCEL \
+            else '00030005'
+        if conv_id in ('', 'NONE'):
+            for conv in list(p.convs.values()):
+                self.endconv(conv, p, reason)
+        else:
+            self.endconv(self.getconv(p, conv_id), p, reason)
+
+    # --- messages ------------------------------------------------------
+
+    def send(self, cb, send, receive, errtext):
+        p = self.participant(cb)
+        conv_id = self.gets(cb, 'conv_id')
+        option = self.geti(cb, 'option')
+        length = self.geti(cb, 'send_length')
+        if length > self.maxmsg:
+            raise AciFault('00200184')          # Invalid send length
+        data = bytes(send[:length]) if length else b''
+
+        key = self.svckey(cb)
+        if conv_id in ('NEW', 'NONE') and key[:2] == (CIS_CLASS, CIS_SERVER):
+            conv = self.cis(p, key[2], data, conv_id == 'NONE')
+        else:
+            if conv_id in ('NEW', 'NONE'):
+                conv = self.newconv(p, key, conv_id == 'NONE')
+            elif not conv_id:
+                raise AciFault('00200185')      # Invalid function/conv_id
+            else:
+                conv = self.getconv(p, conv_id)
+                if conv.endedby is not None:
+                    raise AciFault(conv.eocreason)
+
+            if option in (OPT_SYNC, OPT_COMMIT):
+                uow = conv.sending.get(p)
+                if uow is None:
+                    uow = conv.sending[p] = _Uow('%016d' % next(self._uowno), p)
+                uow.messages.append(data)
+                self.puts(cb, 'uowID', uow.uowid)
+                if option == OPT_COMMIT:
+                    self.commit(cb, conv, p)
+            else:
+                conv.outqueue(p).append(data)
+            if option == OPT_EOC:
+                self.endconv(conv, p, '00030005')
+            elif conv.nonconv and p is conv.server:
+                self.endconv(conv, p, '00030005')   # reply ends NONE conv.
+            conv.last_active = time.time()
+            self.cond.notify_all()
+
+        if conv_id != 'NONE':
+            self.puts(cb, 'conv_id', conv.conv_id)
+        if waitsecs(self.gets(cb, 'wait')) != 0 and \
+                (conv.client is p and conv.endedby is not p):
+            self.receiveconv(cb, receive, p, conv, waitsecs(self.gets(cb, 'wait')))
+
+    def commit(self, cb, conv, p):
+        uow = conv.sending.pop(p)
+        uow.status = ACCEPTED
+        uow.commit_time = time.strftime('%Y%m%d%H%M%S000', time.gmtime())
+        conv.outqueue(p).append(uow)
+        self.puts(cb, 'commitTime', uow.commit_time)
+        self.puti(cb, 'uowStatus', ACCEPTED)
+
+    def undo(self, cb, send, receive, errtext):
+        p = self.participant(cb)
+        conv = self.getconv(p, self.gets(cb, 'conv_id'))
+        q = conv.outqueue(p)
+        for item in list(q):
+            if not isinstance(item, _Uow):
+                q.remove(item)
+
+    def receive(self, cb, send, receive, errtext):
+        p = self.participant(cb)
+        conv_id = self.gets(cb, 'conv_id')
+        option = self.geti(cb, 'option')
+        wait = waitsecs(self.gets(cb, 'wait'))
+
+        if option == OPT_LAST:
+            conv = self.getconv(p, conv_id)
+            if p not in conv.last:
+                raise AciFault('00200006')      # Last message not found
+            self.puts(cb, 'conv_id', conv_id)
+            self.deliver(cb, receive, conv.last[p])
+            return
+
+        if conv_id not in ('NEW', 'OLD', 'ANY'):
+            self.receiveconv(cb, receive, p, self.getconv(p, conv_id), wait,
+                             preview=option == OPT_PREVIEW)
+            return
+
+        if conv_id == 'ANY' and not p.services:
+            raise AciFault('00200199')          # ANY invalid for clients
+        if conv_id in ('NEW', 'ANY'):
+            if option == OPT_ANY or conv_id == 'ANY':
+                keys = p.services
+            else:
+                keys = [self.svckey(cb)]
+                if keys[0] not in p.services:
+                    raise AciFault('00070007')  # Service not registered
+
+        deadline = None if wait is None else time.time() + wait
+        p.waitconv = conv_id
+        try:
+            while True:
+                conv = None
+                if conv_id in ('OLD', 'ANY'):
+                    for c in p.convs.values():
+                        if c.pending(p):
+                            conv = c
+                            break
+                if conv is None and conv_id in ('NEW', 'ANY'):
+                    for key in keys:
+                        for c in self.services[key].pending:
+                            if c.pending(p):
+                                conv = c
+                                break
+                        if conv is not None:
+                            break
+                if conv is not None:
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise AciFault('00740074')  # Wait timeout
+                self.cond.wait(remaining)
+        finally:
+            p.waitconv = ''
+
+        convstat = CONVSTAT_OLD
+        if conv.server is None and conv.client is not p:    # accept new conv.
+            svc = self.services[conv.service]
+            svc.pending.remove(conv)
+            conv.server = p
+            p.convs[conv.conv_id] = conv
+            convstat = CONVSTAT_NONE if conv.nonconv else CONVSTAT_NEW
+            self.puts(cb, 'server_class', conv.service[0])
+            self.puts(cb, 'server_name', conv.service[1])
+            self.puts(cb, 'service', conv.service[2])
+        self.puts(cb, 'client_uid', conv.client.user_id)
+        self.take(cb, receive, p, conv, convstat)
+
+    def receiveconv(self, cb, receive, p, conv, wait, preview=False):
+        """Receive next message on conversation conv"""
+        deadline = None if wait is None else time.time() + wait
+        p.waitconv = conv.conv_id
+        try:
+            while not conv.pending(p):
+                uow = conv.inflight.get(p)
+                if uow is not None:
+                    raise AciFault('00740301')  # end of unit of work
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise AciFault('00740074')  # Wait timeout
+                self.cond.wait(remaining)
+        finally:
+            p.waitconv = ''
+        convstat = CONVSTAT_NONE if conv.nonconv else CONVSTAT_OLD
+        self.take(cb, receive, p, conv, convstat, preview)
+
+    def take(self, cb, receive, p, conv, convstat, preview=False):
+        """Take next message of conversation conv for participant p"""
+        if not (conv.nonconv and p is conv.client):
+            self.puts(cb, 'conv_id', conv.conv_id)
+        self.puti(cb, 'conv_stat', convstat)
+        conv.last_active = time.time()
+
+        uow = conv.inflight.get(p)
+        q = conv.inqueue(p)
+        if uow is None and q and isinstance(q[0], _Uow):
+            uow = q[0]
+            if not preview:
+                q.popleft()
+                conv.inflight[p] = uow
+                uow.status = RECEIVED
+                uow.pos = 0
+                uow.adcount += 1
+
+        if uow is not None:
+            n, i = len(uow.messages), uow.pos
+            data = uow.messages[i]
+            if not preview:
+                uow.pos += 1
+            self.puts(cb, 'uowID', uow.uowid)
+            self.puti(cb, 'uowStatus', RECV_ONLY if n == 1 else
+                      RECV_FIRST if i == 0 else
+                      RECV_LAST if i == n-1 else RECV_MIDDLE)
+            self.puti(cb, 'adcount', uow.adcount)
+        elif q:
+            data = q[0] if preview else q.popleft()
+            self.puts(cb, 'uowID', '')
+            self.puti(cb, 'uowStatus', RECV_NONE)
+        else:                                   # partner ended conversation
+            self.dropconv(conv)
+            raise AciFault(conv.eocreason)
+
+        if not preview:
+            conv.last[p] = data
+            if conv.nonconv and p is conv.client:
+                self.dropconv(conv)             # reply completes NONE conv.
+        self.deliver(cb, receive, data)
+
+    def deliver(self, cb, receive, data):
+        """Copy message to receive buffer and set return length"""
+        length = len(data)
+        self.puti(cb, 'return_length', length)
+        if length == 0:
+            return
+        if receive is None:
+            raise AciFault('00200189')          # Invalid receive length
+        size = min(self.geti(cb, 'receive_length'), len(receive))
+        ctypes.memmove(receive, data, min(length, size))
+        if length > size:
+            raise AciFault('00200094')          # Message truncated
+
+    # --- units of work -------------------------------------------------
+
+    def syncpoint(self, cb, send, receive, errtext):
+        p = self.participant(cb)
+        option = self.geti(cb, 'option')
+        conv_id = self.gets(cb, 'conv_id')
+        uowid = self.gets(cb, 'uowID')
+        if conv_id and conv_id not in ('NEW', 'NONE'):
+            conv = self.getconv(p, conv_id)
+        else:
+            for conv in p.convs.values():
+                if any(u.uowid == uowid for u in conv.uows()) or \
+                        conv.sending.get(p, None) is not None and \
+                        conv.sending[p].uowid == uowid:
+                    break
+            else:
+                raise AciFault('00030003')      # No matching conversation
+
+        inflight = conv.inflight.get(p)
+        if inflight is not None and uowid in ('', inflight.uowid):
+            del conv.inflight[p]                # receiver side
+            if option == OPT_BACKOUT:
+                inflight.status = BACKEDOUT
+                inflight.pos = 0
+                conv.inqueue(p).appendleft(inflight)
+            else:
+                inflight.status = PROCESSED
+            self.puti(cb, 'uowStatus', inflight.status)
+        elif conv.sending.get(p) is not None:   # sender side
+            if option == OPT_BACKOUT:
+                uow = conv.sending.pop(p)
+                self.puti(cb, 'uowStatus', BACKEDOUT)
+            else:
+                self.commit(cb, conv, p)
+        elif option in (OPT_COMMIT, OPT_BACKOUT):
+            raise AciFault('00740300')          # no units of work
+        if option == OPT_EOC:
+            self.endconv(conv, p, '00030005')
+        self.cond.notify_all()
+
+    # --- publish and subscribe -----------------------------------------
+
+    def subscription(self, cb, p):
+        topic = self.gets(cb, 'topic')
+        sub = self.topics.get(topic, {}).get((p.user_id, p.token))
+        if sub is None:
+            raise AciFault('02160206')          # Topic not defined
+        return topic, sub
+
+    def subscribe(self, cb, send, receive, errtext):
+        p = self.participant(cb)
+        topic = self.gets(cb, 'topic')
+        if not topic:
+            raise AciFault('02160206')          # Topic not defined
+        subs = self.topics.setdefault(topic, {})
+        sub = subs.get((p.user_id, p.token))
+        if sub is None:
+            subs[(p.user_id, p.token)] = _Subscription(
+                self.geti(cb, 'option') == OPT_DURABLE)
+        elif self.geti(cb, 'option') == OPT_DURABLE:
+            sub.durable = True
+
+    def unsubscribe(self, cb, send, receive, errtext):
+        p = self.participant(cb)
+        self.subscription(cb, p)
+        del self.topics[self.gets(cb, 'topic')][(p.user_id, p.token)]
+
+    def unsubscribeall(self, p):
+        """End subscriptions of participant p after logoff: durable
+        subscriptions are kept with received publications redelivered"""
+        key = (p.user_id, p.token)
+        if any((q.user_id, q.token) == key for q in self.participants.values()):
+            return                              # user still logged on
+        for subs in self.topics.values():
+            sub = subs.get(key)
+            if sub is None:
+                continue
+            if sub.durable:
+                self.redeliver(sub, list(sub.inflight))
+            else:
+                del subs[key]
+
+    def redeliver(self, sub, pubids):
+        for pubid in reversed(pubids):
+            pub, pos = sub.inflight.pop(pubid)
+            sub.queue.appendleft(pub)
+
+    def sendpublication(self, cb, send, receive, errtext):
+        p = self.participant(cb)
+        topic = self.gets(cb, 'topic')
+        if not topic:
+            raise AciFault('02160206')          # Topic not defined
+        pubid = self.gets(cb, 'publicationID')
+        if pubid in ('', 'NEW'):
+            pub = _Publication('%016d' % next(self._pubno), topic)
+            p.publishing[pub.pubid] = pub
+        else:
+            pub = p.publishing.get(pubid)
+            if pub is None or pub.topic != topic:
+                raise AciFault('00200185')      # Invalid function/publicationID
+        length = self.geti(cb, 'send_length')
+        pub.messages.append(bytes(send[:length]) if length else b'')
+        self.puts(cb, 'publicationID', pub.pubid)
+        if self.geti(cb, 'option') == OPT_COMMIT:
+            self.publish(p.publishing.pop(pub.pubid))
+
+    def publish(self, pub):
+        for sub in self.topics.get(pub.topic, {}).values():
+            sub.queue.append(pub)
+        self.cond.notify_all()
+
+    def recvpublication(self, cb, send, receive, errtext):
+        p = self.participant(cb)
+        topic, sub = self.subscription(cb, p)
+        pubid = self.gets(cb, 'publicationID')
+        if pubid in ('', 'NEW'):
+            wait = waitsecs(self.gets(cb, 'wait'))
+            deadline = None if wait is None else time.time() + wait
+            while not sub.queue:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise AciFault('00740074')  # Wait timeout
+                self.cond.wait(remaining)
+                if self.topics.get(topic, {}).get((p.user_id, p.token)) \
+                        is not sub:
+                    raise AciFault('02160206')  # unsubscribed meanwhile
+            pub = sub.queue.popleft()
+            entry = sub.inflight[pub.pubid] = [pub, 0]
+        else:
+            entry = sub.inflight.get(pubid)
+            if entry is None:
+                raise AciFault('00200185')      # Invalid function/publicationID
+        pub, i = entry
+        n = len(pub.messages)
+        if i >= n:
+            raise AciFault('00740301')          # end of publication
+        entry[1] += 1
+        self.puts(cb, 'publicationID', pub.pubid)
+        self.puti(cb, 'uowStatus', RECV_ONLY if n == 1 else
+                  RECV_FIRST if i == 0 else
+                  RECV_LAST if i == n-1 else RECV_MIDDLE)
+        self.deliver(cb, receive, pub.messages[i])
+
+    def cntlpublication(self, cb, send, receive, errtext):
+        """Commit or backout publication sent or received"""
+        p = self.participant(cb)
+        option = self.geti(cb, 'option')
+        if option not in (OPT_COMMIT, OPT_BACKOUT):
+            raise AciFault('00200187')          # Invalid function/option
+        pubid = self.gets(cb, 'publicationID')
+        pub = p.publishing.pop(pubid, None)
+        if pub is not None:                     # publisher
+            if option == OPT_COMMIT:
+                self.publish(pub)
+            return
+        topic, sub = self.subscription(cb, p)
+        if pubid not in sub.inflight:
+            raise AciFault('00200185')          # Invalid function/publicationID
+        if option == OPT_COMMIT:
+            del sub.inflight[pubid]
+        else:
+            self.redeliver(sub, [pubid])
+        self.cond.notify_all()
+
+    # --- Command and Information Services ------------------------------
+
+    def cis(self, p, service, request, nonconv):
+        """Process CIS request and queue the reply blocks to the client"""
+        from adapya.entirex import cmdinfo
+
+        conv = _Conversation('%016d' % next(self._convno),
+                             (CIS_CLASS, CIS_SERVER, service), p, nonconv)
+        self.convs[conv.conv_id] = conv
+        p.convs[conv.conv_id] = conv
+        conv.endedby = conv.server = self.kernel
+        conv.eocreason = '00030005'
+
+        hdr = cmdinfo.Cishdr()
+        hdr.buffer = Abuf(hdr.dmlen)
+        hdr.reset()
+        hdr.etb_error_code = '00000000'
+
+        if service == 'CMD' or service.endswith('SHUTDOWN') or \
+                service.endswith('-CMD'):
+            req = cmdinfo.Cisreq()
+            req.buffer = Abuf(request.ljust(req.dmlen, b'\x00'))
+            hdr.error_code = self.ciscmd(req)
+            conv.toclient.append(hdr.buffer.raw)
+            return conv
+
+        req = cmdinfo.Infreq()
+        req.buffer = Abuf(request.ljust(req.dmlen, b'\x00'))
+        if req.version > 8:
+            from adapya.entirex import etbcinf as inf
+        else:
+            from adapya.entirex import etbcinf8 as inf
+
+        infos = [info.buffer.raw for info in self.cisinfo(req, inf, cmdinfo)]
+        perblock = len(infos)
+        if infos:
+            perblock = max(1, req.block_length // len(infos[0]))
+        hdr.error_code = 0 if infos else 4      # 4: nothing found
+        hdr.totobj = len(infos)
+        for i in range(0, max(len(infos), 1), max(perblock, 1)):
+            block = infos[i:i+perblock]
+            hdr.curobj = len(block)
+            conv.toclient.append(hdr.buffer.raw + b''.join(block))
+        return conv
+
+    def ciscmd(self, req):
+        """Execute CIS command request
+
+        :returns: CIS error code
+        """
+        from adapya.entirex import cmdinfo as c
+
+        cmd, obj = req.command, req.object_type
+        sel = lambda k: getattr(req, k).strip('\x00 ')
+        if cmd == c.CIC_SHUTDOWN:
+            if obj == c.CIO_CONVERSATION:
+                conv = self.convs.get(sel('conv_id'))
+                if conv is None:
+                    return 54                   # Conversation not found
+                self.endconv(conv, None, '00030011')
+            elif obj == c.CIO_SERVICE:
+                svc = self.services.get((sel('server_class'), sel('server'),
+                                         sel('service')))
+                if svc is None or not svc.servers:
+                    return 52                   # Service not found
+                for p in list(svc.servers):
+                    self.unregister(p, svc.key)
+            elif obj in (c.CIO_SERVER, c.CIO_PARTICIPANT):
+                found = [a for a, p in self.participants.items()
+                         if (req.seqno and p.seqno == req.seqno) or
+                         (sel('uid') and p.user_id == sel('uid'))]
+                if not found:
+                    return 24                   # Participant not found
+                for a in found:
+                    self.drop(a)
+            else:
+                return 5                        # Invalid object type
+        elif cmd == c.CIC_PURGE:
+            for conv in self.convs.values():
+                for q in (conv.toserver, conv.toclient):
+                    for item in list(q):
+                        if isinstance(item, _Uow) and item.uowid == sel('uowid'):
+                            q.remove(item)
+                            return 0
+            return 25                           # Purge UOW failed
+        elif cmd == c.CIC_SET_SINGLE_CONVERSATION:
+            svc = self.services.get((sel('server_class'), sel('server'),
+                                     sel('service')))
+            if svc is None:
+                return 52                       # Service not found
+            if svc.pending or any(c.service == svc.key
+                                  for c in self.convs.values()):
+                return 71                       # still active conversations
+            svc.scm = 1
+            svc.prefetch = int(req.option == c.CIP_ETB_PREFETCH)
+        self.cond.notify_all()
+        return 0
+
+    def cisinfo(self, req, inf, c):
+        """Generator of Info_* objects selected by information request"""
+        sel = lambda k: getattr(req, k).strip('\x00 ')
+        obj = req.object_type
+        now = time.time()
+
+        def svcmatch(key):
+            return match(key[0], sel('server_class')) and \
+                match(key[1], sel('server')) and match(key[2], sel('service'))
+
+        def new(cls, **kw):
+            info = cls()
+            info.buffer = Abuf(info.dmlen)
+            info.reset()
+            for k, v in kw.items():
+                if k in info.keydict:
+                    setattr(info, k, v)
+            return info
+
+        if obj == c.CIO_BROKER:
+            servers = [p for p in self.participants.values() if p.services]
+            yield new(inf.Info_broker, platform=sys.platform[:8],
+                runtime=int(now - self.started),
+                num_service=len(self.services), service_act=len(self.services),
+                num_server=len(servers), server_act=len(servers),
+                num_client=len(self.participants) - len(servers),
+                client_act=len(self.participants) - len(servers),
+                num_conv=len(self.convs), maxmsgsize=self.maxmsg,
+                totaluows=sum(1 for v in self.convs.values() for u in v.uows()),
+                apiversion=API_VERS_HIGHEST, cisversion=req.version,
+                platformname=sys.platform, pstoretype='NONE',
+                product_version=EMULATOR_VERSION, broker_id=self.broker_id,
+                client_nonact=300)
+
+        elif obj == c.CIO_SERVICE:
+            for key, svc in self.services.items():
+                if not svcmatch(key):
+                    continue
+                convs = [v for v in self.convs.values() if v.service == key]
+                yield new(inf.Info_service, server_class=key[0],
+                    server=key[1], service=key[2],
+                    conv_nonact=svc.conv_nonact, servers_act=len(svc.servers),
+                    conv_act=len(convs), num_conv=len(convs),
+                    num_server=len(svc.servers), pending=len(svc.pending),
+                    total_requests=svc.total_requests, maxuows=svc.maxuows,
+                    maxuowmsg=svc.maxuowmsg, uwtime=svc.uwtime,
+                    maxmsgsize=svc.maxmsgsize,
+                    totaluows=sum(1 for v in convs for u in v.uows()),
+                    scm=svc.scm, prefetch=svc.prefetch)
+
+        elif obj in (c.CIO_SERVER, c.CIO_CLIENT):
+            for p in list(self.participants.values()):
+                if (obj == c.CIO_SERVER) != bool(p.services):
+                    continue
+                if not (match(p.user_id, sel('uid')) and
+                        match(p.token, sel('token'))):
+                    continue
+                if obj == c.CIO_SERVER and \
+                        not any(svcmatch(k) for k in p.services):
+                    continue
+                key = p.services[0] if p.services else ('', '', '')
+                yield new(inf.Info_server if p.services else inf.Info_client,
+                    uid=p.user_id, puid=p.puid, token=p.token,
+                    status=5 if p.waitconv else 0, waitconvid=p.waitconv, server_class=key[0],
+                    server=key[1], service=key[2], conv_act=len(p.convs),
+                    convs=len(p.convs), service_act=len(p.services),
+                    last_active=int(now - p.last_active), nonact=300,
+                    created=int(p.created), seqno=p.seqno)
+
+        elif obj == c.CIO_CONVERSATION:
+            for conv in list(self.convs.values()):
+                if not svcmatch(conv.service) or \
+                        not match(conv.conv_id, sel('conv_id')):
+                    continue
+                server = conv.server or _Participant(0, '', '')
+                yield new(inf.Info_conversation, conv_id=conv.conv_id,
+                    serveruid=server.user_id, servertoken=server.token,
+                    clientuid=conv.client.user_id,
+                    clienttoken=conv.client.token,
+                    server_class=conv.service[0], server=conv.service[1],
+                    service=conv.service[2],
+                    conv_nonact=self.services[conv.service].conv_nonact
+                        if conv.service in self.services else 0,
+                    last_active=int(now - conv.last_active),
+                    type=1 if conv.nonconv else 0,
+                    totaluows=sum(1 for u in conv.uows()),
+                    scm=self.services[conv.service].scm
+                        if conv.service in self.services else 0)
+
+        elif obj == c.CIO_PSF:
+            for conv in list(self.convs.values()):
+                if not svcmatch(conv.service) or \
+                        not match(conv.conv_id, sel('conv_id')):
+                    continue
+                for uow in conv.uows():
+                    if not match(uow.uowid, sel('uowid')):
+                        continue
+                    yield new(inf.Info_psf, uow_id=uow.uowid,
+                        conv_id=conv.conv_id, senderuid=uow.sender.user_id,
+                        sendertoken=uow.sender.token,
+                        senderclass=conv.service[0],
+                        senderserver=conv.service[1],
+                        senderservice=conv.service[2],
+                        uowstatus=uow.status, deliveries=uow.adcount,
+                        msgcnt=len(uow.messages),
+                        msgsize=sum(len(m) for m in uow.messages),
+                        uwcreate_time=time.strftime('%Y%m%d%H%M%S',
+                            time.gmtime(uow.created)),
+                        commit_time=uow.commit_time)
+
+        elif obj == c.CIO_UOW_STATISTICS:
+            for key in self.services:
+                if not svcmatch(key):
+                    continue
+                uows = [u for v in self.convs.values() if v.service == key
+                        for u in v.uows()]
+                if not uows:
+                    continue
+                yield new(inf.Info_UOW_statistics, server_class=key[0],
+                    server=key[1], service=key[2], uows=len(uows),
+                    messages=sum(len(u.messages) for u in uows),
+                    Bytes=sum(len(m) for u in uows for m in u.messages),
+                    max_messages=max(len(u.messages) for u in uows),
+                    max_bytes=max(sum(len(m) for m in u.messages) for u in uows))
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
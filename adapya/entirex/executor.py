@@ -0,0 +1,144 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""executor.py provides BrokerExecutor for parallel request/reply calls
+
+BrokerExecutor submits requests to a service on conv_id NONE
+conversations and returns concurrent.futures.Future objects for the
+replies. The requests are performed by worker threads using the Broker
+instances of a BrokerPool::
+
+    >>> from adapya.entirex.executor import BrokerExecutor
+    >>> service = ('ACLASS', 'ASERVER', 'ASERVICE')
+    >>> with BrokerExecutor('localhost:1971', 'BATCH', workers=16) as ex:
+    ...     f = ex.submit(service, b'request')
+    ...     reply = f.result()
+    ...     for reply in ex.map(service, (b'req %d' % i for i in range(10000))):
+    ...         pass
+
+Requires concurrent.futures (Python 3 or the futures backport).
+"""
+from __future__ import print_function          # PY3
+
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from adapya.entirex.broker import TIMEDOUT
+from adapya.entirex.pool import BrokerPool
+
+
+class BrokerExecutor(object):
+    """Executor for request/reply calls to Broker services
+
+    :param broker_id: Broker id
+    :param user_id: user id for the Broker instances
+    :param token: token for the Broker instances
+    :param workers: number of worker threads and of Broker instances
+    :param wait: wait time for the replies
+    :param password: password for logon
+    :param pool: BrokerPool to use instead of creating one
+    :param kw: further BrokerPool and Broker parameters e.g.
+        receive_length, transport, adaptive
+    """
+    def __init__(self, broker_id='localhost', user_id='monty', token=None,
+                 workers=4, wait='30S', password=None, pool=None, **kw):
+        self.workers = workers
+        self.wait = wait
+        self.ownpool = pool is None
+        self.pool = pool if pool is not None else BrokerPool(broker_id,
+            user_id, token, size=workers, password=password, **kw)
+        self.executor = ThreadPoolExecutor(workers)
+
+    def call(self, service, payload, wait=None):
+        """Send request and wait for the reply in the calling thread
+
+        :param service: tuple (server_class, server_name, service)
+        :param payload: request message, bytes or buffer object
+        :param wait: wait time for the reply, default wait of
+            the executor
+        :returns: reply message as bytes or TIMEDOUT on timeout if
+            raise_timeout of the Broker instances is False
+        """
+        with self.pool.broker() as bb:
+            bb.server_class, bb.server_name, bb.service = service
+            bb.conv_id = 'NONE'
+            bb.option = 0
+            bb.wait = wait or self.wait
+            bb.receive_length = len(bb.receive_buffer)
+            if bb.send(payload=payload) is TIMEDOUT:
+                return TIMEDOUT
+            return bytes(bb.receive_buffer[0:bb.return_length])
+
+    def submit(self, service, payload, wait=None):
+        """Submit request, see call()
+
+        :returns: Future of the reply
+        """
+        return self.executor.submit(self.call, service, payload, wait)
+
+    def map(self, service, payloads, timeout=None, inflight=None):
+        """Return iterator over the replies to payloads in their order
+
+        Unlike Executor.map() the payloads are submitted while
+        iterating, with at most inflight requests not yet returned.
+
+        :param timeout: seconds from the call of map() after which
+            a reply not yet available raises TimeoutError
+        :param inflight: maximum number of requests in flight,
+            default twice the number of workers
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        inflight = inflight or 2 * self.workers
+        pending = deque()
+
+        def result(f):
+            if deadline is None:
+                return f.result()
+            remaining = deadline - time.time()
+            if remaining <= 0 and not f.done():
+                raise TimeoutError()
+            return f.result(max(remaining, 0))
+
+        def replies():
+            try:
+                for payload in payloads:
+                    if len(pending) >= inflight:
+                        yield result(pending.popleft())
+                    pending.append(self.submit(service, payload))
+                while pending:
+                    yield result(pending.popleft())
+            finally:
+                for f in pending:
+                    f.cancel()
+        return replies()
+
+    def shutdown(self, wait=True):
+        """End the worker threads and close the pool if created
+        by the executor"""
+        self.executor.shutdown(wait)
+        if self.ownpool:
+            self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
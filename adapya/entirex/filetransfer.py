@@ -0,0 +1,504 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""filetransfer.py transfers files over Broker conversations with
+memory-mapped source and destination files
+
+The sender maps the source file into memory and passes slices of the
+mapping as send buffers. The receiver preallocates the destination file,
+maps it and receives each message directly into the mapping at its
+offset with Broker.receive_into(). The data is not copied by Python on
+either side.
+
+The header of each range carries its length and CRC-32 checksum. The
+receiver replies OK only if both match the data received.
+
+A file can be split into ranges each sent on its own conversation with
+its own Broker instance and thread. The receiver serves the ranges with
+one thread per Broker instance::
+
+    >>> from adapya.entirex.broker import Broker
+    >>> from adapya.entirex.filetransfer import send_file, FileReceiver, \
+    ...     RECEIVE_LENGTH
+    >>> service = ('FILES', 'TRANSFER', 'NIGHTLY')
+    >>> rcv = [Broker('localhost:1971', 'RECEIVER', token='R%d' % i,
+    ...               receive_length=RECEIVE_LENGTH) for i in range(4)]
+    >>> for bb in rcv: bb.logon()
+    >>> fr = FileReceiver(rcv, service, directory='/data/in')
+    >>> fr.serve(count=1)                                       # server
+    ['/data/in/extract.dat']
+
+    >>> snd = [Broker('localhost:1971', 'SENDER', token='S%d' % i)
+    ...        for i in range(4)]
+    >>> for bb in snd: bb.logon()
+    >>> send_file(snd, service, 'extract.dat')                  # client
+
+Usage: filetransfer [options] [files]
+
+Options::
+
+    -h, --help              display this help
+    -b, --broker ..         id of broker ETBxxxxx or hostname:port
+    -c, --chunk ..          maximum message size, default MAX-MSG
+    -d, --directory ..      directory of received files, default .
+    -n, --count ..          number of files to receive, default unlimited
+    -p, --parallel ..       number of conversations per file, default 1
+    -r, --receive           receive files instead of sending them
+    -s, --service ..        Broker service class/server/service
+    -u, --userid ..         user id for broker communication
+    -w, --wait ..           wait time for messages, default 60S
+    -x, --password ..       password
+
+Example::
+
+    > filetransfer -b zos3:3800 -s FILES/TRANSFER/NIGHTLY -r -d /data/in
+    > filetransfer -b zos3:3800 -s FILES/TRANSFER/NIGHTLY -p 4 extract.dat
+
+"""
+from __future__ import print_function          # PY3
+
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from adapya.entirex.broker import Broker, BrokerConversationError, \
+    BrokerException, BrokerTimeOut, TIMEDOUT, OPT_CANCEL
+
+CHUNK_SIZE = 32768      # default if MAX-MSG of the kernel is not known
+
+MAGIC = b'ADFT'
+_HEADER = struct.Struct('>4sQQQI')  # magic, file size, range offset, length,
+# CRC-32 of range followed by the file name in UTF-8
+
+RECEIVE_LENGTH = 1024   # receive buffer size for the header with file name
+
+
+def usage():
+    print(__doc__)
+
+
+def _ranges(size, parts, chunk):
+    """Return list of (offset, length) of up to parts ranges of size
+    bytes, each starting at a multiple of chunk"""
+    chunks = (size + chunk - 1) // chunk
+    parts = max(1, min(parts, chunks))
+    ranges = []
+    offset = 0
+    for i in range(parts):
+        n = (chunks * (i + 1) // parts - chunks * i // parts) * chunk
+        n = min(n, size - offset)
+        ranges.append((offset, n))
+        offset += n
+    return ranges
+
+
+def _chunk_size(bb, chunk_size):
+    """Return chunk_size limited by MAX-MSG of the kernel if known by
+    Broker.kernelVersion(), default MAX-MSG or CHUNK_SIZE"""
+    maxmsg = getattr(bb, 'maxmsg', 0)
+    if chunk_size is None:
+        return maxmsg or CHUNK_SIZE
+    return min(chunk_size, maxmsg) if maxmsg else chunk_size
+
+
+def send_range(bb, service, name, data, size, offset, length,
+               chunk_size=None, wait='60S'):
+    """Send a range of a file on a new conversation
+
+    The first message is the header with file name, size, range and
+    checksum of the range.
+    The data follows in messages of up to chunk_size bytes, the last one
+    is sent waiting for the reply of the receiver.
+
+    :param bb: logged on Broker instance
+    :param service: tuple (server_class, server_name, service)
+    :param data: buffer object with the file data e.g. mmap, slices
+        are sent without copying
+    :param chunk_size: maximum message size (see _chunk_size())
+    :raises BrokerException: the receiver replied with an error
+    :raises BrokerTimeOut: no reply within wait time
+    :raises ValueError: header with file name exceeds RECEIVE_LENGTH
+    """
+    view = memoryview(data)
+    header = _HEADER.pack(MAGIC, size, offset, length,
+        zlib.crc32(view[offset:offset+length]) & 0xffffffff) \
+        + name.encode('utf-8')
+    if len(header) > RECEIVE_LENGTH:
+        raise ValueError('File name too long: %s' % name)
+    chunk_size = _chunk_size(bb, chunk_size)
+    bb.server_class, bb.server_name, bb.service = service
+    bb.option = 0
+    bb.wait = wait if length == 0 else 'NO'
+    bb.receive_length = len(bb.receive_buffer) if length == 0 else 0
+    rc = bb.send(conv_id='NEW', payload=header)
+    conv_id = bb.conv_id
+    try:
+        end = offset + length
+        for i in range(offset, end, chunk_size):
+            if i + chunk_size >= end:   # last message waits for reply
+                bb.wait = wait
+                bb.receive_length = len(bb.receive_buffer)
+            bb.option = 0
+            rc = bb.send(conv_id=conv_id,
+                         payload=view[i:min(i+chunk_size, end)])
+        view = None
+        if rc is TIMEDOUT:
+            raise BrokerTimeOut('File transfer of %s range %d:%d: no reply'
+                                % (name, offset, end), bb)
+        reply = bytes(bb.receive_buffer[0:bb.return_length])
+    finally:
+        bb.conv_id = conv_id
+        try:
+            bb.endConversation()
+        except BrokerException:
+            pass
+    if reply != b'OK':
+        raise BrokerException('File transfer of %s range %d:%d failed: %s'
+            % (name, offset, offset+length, reply.decode('latin1')), bb)
+
+
+def send_file(brokers, service, path, name=None, chunk_size=None, wait='60S'):
+    """Send file with one conversation per Broker instance
+
+    The file is split into one range per Broker instance. The ranges
+    are sent in parallel, the first one in the calling thread.
+
+    :param brokers: logged on Broker instance or list of instances
+    :param service: tuple (server_class, server_name, service)
+    :param path: file to send
+    :param name: name of the file for the receiver, default base name
+        of path
+    :param chunk_size: maximum message size (see _chunk_size())
+    :param wait: wait time for the reply of the receiver to each range
+    :returns: number of bytes sent
+    :raises BrokerException: the transfer of a range failed
+    """
+    if isinstance(brokers, Broker):
+        brokers = [brokers]
+    if name is None:
+        name = os.path.basename(path)
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            send_range(brokers[0], service, name, b'', 0, 0, 0, wait=wait)
+            return 0
+        mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+    chunk_size = _chunk_size(brokers[0], chunk_size)
+    ranges = _ranges(size, len(brokers), chunk_size)
+    errors = []
+
+    def sender(bb, offset, length):
+        try:
+            send_range(bb, service, name, mm, size, offset, length,
+                       chunk_size=chunk_size, wait=wait)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=sender, args=(bb,) + r,
+                                name='send_file-%d' % i)
+               for i, (bb, r) in enumerate(zip(brokers, ranges)) if i]
+    try:
+        for t in threads:
+            t.start()
+        sender(brokers[0], *ranges[0])
+    finally:
+        for t in threads:
+            t.join()
+        try:
+            mm.close()
+        except BufferError:
+            pass    # view kept by traceback of error, closed when freed
+    if errors:
+        raise errors[0]
+    return size
+
+
+class _Destination(object):
+    """Destination file mapped into memory while ranges are received"""
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.outstanding = size     # bytes neither received nor failed
+        self.failed = False
+        self.f = open(path, 'w+b')
+        self.f.truncate(size)       # preallocate
+        self.mm = mmap.mmap(self.f.fileno(), size,
+                            access=mmap.ACCESS_WRITE) if size else None
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.flush()
+            self.mm.close()
+        self.f.close()
+
+
+class FileReceiver(object):
+    """Server receiving files sent with send_file()
+
+    Each Broker instance receives the ranges of files in its own thread.
+    A destination file is created and preallocated with the first range
+    received and closed when all of its ranges are received.
+
+    :param brokers: list of logged on Broker instances with receive
+        buffers of at least RECEIVE_LENGTH bytes for the header message
+    :param service: tuple (server_class, server_name, service)
+    :param directory: directory of the received files. Directory parts
+        of the names sent are ignored.
+    :param wait: receive wait time, serve() checks for its end after
+        this time
+    :param register: if True register the service with all instances
+        and deregister it at the end of serve()
+
+    :ivar received: list of paths of the files received completely
+    :ivar failed: list of paths of the files with failed ranges
+    """
+    def __init__(self, brokers, service, directory='.', wait='60S',
+                 register=True):
+        self.brokers = brokers
+        self.service = service
+        self.directory = directory
+        self.wait = wait
+        self.register = register
+        self.files = {}         # name: _Destination
+        self.lock = threading.Lock()
+        self.received = []
+        self.failed = []
+        self.bytes = 0
+        self.stopping = False
+
+    def _open(self, name, size):
+        with self.lock:
+            dest = self.files.get(name)
+            if dest is None:
+                path = os.path.join(self.directory, os.path.basename(name))
+                dest = self.files[name] = _Destination(path, size)
+            elif dest.size != size:
+                raise ValueError('File %s of size %d already being received'
+                                 ' with size %d' % (name, dest.size, size))
+            return dest
+
+    def _done(self, name, dest, received, length, ok):
+        """Account for range, close destination when complete and
+        return its path"""
+        with self.lock:
+            self.bytes += received
+            dest.outstanding -= length
+            if not ok:
+                dest.failed = True
+            if dest.outstanding > 0:
+                return None
+            del self.files[name]
+            dest.close()
+            (self.failed if dest.failed else self.received).append(dest.path)
+            return None if dest.failed else dest.path
+
+    def _receive_data(self, bb, conv_id, mm, offset, length):
+        """Receive messages of conversation into the range of the mapped
+        file mm and return the number of bytes received"""
+        if not length:
+            return 0
+        view = memoryview(mm)[offset:offset+length]
+        received = 0
+        try:
+            while received < length:
+                m = bb.receive_into(view[received:], conv_id=conv_id,
+                                    wait=self.wait)
+                if m is TIMEDOUT:
+                    break
+                received += len(m)
+        except BrokerException:
+            pass                # partial range, views released on return
+        return received
+
+    def receive(self, bb):
+        """Receive one range of a file on the next conversation
+
+        :param bb: Broker instance with the service registered
+        :returns: path of the file completed with this range, None if
+            the file is not complete or TIMEDOUT if no conversation
+            started within the wait time
+        """
+        while True:
+            bb.option = 0
+            bb.receive_length = len(bb.receive_buffer)
+            try:
+                if bb.receive(conv_id='ANY', wait=self.wait) is TIMEDOUT:
+                    return TIMEDOUT
+                break
+            except BrokerConversationError:
+                continue            # sender ended conversation
+            except BrokerTimeOut:
+                return TIMEDOUT
+        conv_id = bb.conv_id
+        header = bytes(bb.receive_buffer[0:bb.return_length])
+
+        def reply(payload):
+            bb.option = 0
+            bb.wait = 'NO'
+            bb.receive_length = 0
+            bb.send(conv_id=conv_id, payload=payload)
+
+        def cancel():       # data of the range not received is discarded
+            bb.conv_id = conv_id
+            try:
+                bb.endConversation(option=OPT_CANCEL)
+            except BrokerException:
+                pass
+
+        try:
+            magic, size, offset, length, crc = _HEADER.unpack_from(header)
+            if magic != MAGIC or offset + length > size:
+                raise ValueError('invalid header')
+            name = header[_HEADER.size:].decode('utf-8')
+            dest = self._open(name, size)
+        except (struct.error, ValueError, EnvironmentError) as e:
+            try:
+                reply(('ERROR %s' % e).encode('latin1'))
+            finally:
+                cancel()
+            return None
+        received = self._receive_data(bb, conv_id, dest.mm, offset, length)
+        ok = received == length and (not length or crc ==
+            zlib.crc32(memoryview(dest.mm)[offset:offset+length]) & 0xffffffff)
+        if ok:
+            reply(b'OK')
+        elif received == length:
+            reply(b'ERROR checksum mismatch')
+        else:
+            cancel()
+        return self._done(name, dest, received, length, ok)
+
+    def _receiver(self, bb, count):
+        while not self.stopping:
+            try:
+                self.receive(bb)
+            except BrokerException:
+                pass
+            if count is not None and \
+                    len(self.received) + len(self.failed) >= count:
+                self.stopping = True
+
+    def serve(self, count=None):
+        """Receive files with one thread per Broker instance
+
+        :param count: number of files to receive, None without limit
+        :returns: list of paths of the files received completely
+        """
+        if self.register:
+            for bb in self.brokers:
+                bb.server_class, bb.server_name, bb.service = self.service
+                bb.register()
+        self.stopping = False
+        threads = [threading.Thread(target=self._receiver, args=(bb, count),
+                                    name='FileReceiver-%d' % i)
+                   for i, bb in enumerate(self.brokers)]
+        try:
+            for t in threads:
+                t.daemon = True
+                t.start()
+            for t in threads:
+                while t.is_alive():
+                    t.join(0.5)
+        finally:
+            self.stopping = True
+            for t in threads:
+                t.join()
+            if self.register:
+                for bb in self.brokers:
+                    bb.server_class, bb.server_name, bb.service = self.service
+                    try:
+                        bb.deregister()
+                    except BrokerException:
+                        pass
+        return self.received
+
+
+__version__ = '1.3.0'
+
+
+if __name__=='__main__':
+
+    import getopt
+    import sys
+
+    brokerid = 'localhost:1971'
+    userid = 'filetransfer.py'
+    pwd = None
+    service = None
+    chunk = None
+    directory = '.'
+    count = None
+    parallel = 1
+    recv = False
+    wait = '60S'
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hb:c:d:n:p:rs:u:w:x:',
+            ['help','broker=','chunk=','count=','directory=','parallel=',
+             'password=','receive','service=','userid=','wait='])
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            usage()
+            sys.exit()
+        elif opt in ('-b', '--broker'):
+            brokerid = arg
+        elif opt in ('-c', '--chunk'):
+            chunk = int(arg)
+        elif opt in ('-d', '--directory'):
+            directory = arg
+        elif opt in ('-n', '--count'):
+            count = int(arg)
+        elif opt in ('-p', '--parallel'):
+            parallel = int(arg)
+        elif opt in ('-r', '--receive'):
+            recv = True
+        elif opt in ('-s', '--service'):
+            service = tuple(arg.split('/'))
+        elif opt in ('-u', '--userid'):
+            userid = arg
+        elif opt in ('-w', '--wait'):
+            wait = arg
+        elif opt in ('-x', '--password'):
+            pwd = arg
+
+    if service is None or len(service) != 3 or not (recv or args):
+        usage()
+        sys.exit(2)
+
+    brokers = [Broker(brokerid, userid, token='FT%d' % i,
+                      receive_length=RECEIVE_LENGTH)
+               for i in range(parallel)]
+    for bb in brokers:
+        bb.logon(password=pwd)
+        bb.kernelVersion()
+    try:
+        if recv:
+            fr = FileReceiver(brokers, service, directory=directory, wait=wait)
+            for path in fr.serve(count=count):
+                print('received', path)
+        else:
+            for path in args:
+                print('sent %s, %d bytes' % (path,
+                      send_file(brokers, service, path, chunk_size=chunk,
+                                wait=wait)))
+    finally:
+        for bb in brokers:
+            bb.logoff()
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
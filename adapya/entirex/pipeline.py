@@ -0,0 +1,207 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""pipeline.py provides a pipelined client for one Broker instance
+
+A Broker user can hold many conversations at the same time. Pipeline
+sends requests on several open conversations without waiting for the
+replies and collects the replies of all conversations with RECEIVE
+conv_id OLD. Each reply is routed by its conv_id to the pending request,
+so that one Broker instance and one thread keep many requests in flight::
+
+    >>> from adapya.entirex.broker import Broker
+    >>> from adapya.entirex.pipeline import Pipeline
+    >>> bb = Broker('localhost:1971', 'CLIENT')
+    >>> bb.logon()
+    >>> pl = Pipeline(bb, ('ACLASS', 'ASERVER', 'ASERVICE'), conversations=32)
+    >>> pending = [pl.submit(b'request %d' % i) for i in range(100)]
+    >>> replies = [r.result() for r in pending]
+    >>> pl.close()
+
+Conversations are reused for further requests after their reply is
+received. The server must reply with one message per request and must
+not end the conversation.
+
+Receiving with conv_id ANY is only allowed for servers, clients receive
+from any of their conversations with conv_id OLD.
+"""
+from __future__ import print_function          # PY3
+
+from collections import deque
+
+from adapya.entirex.broker import BrokerConversationError, BrokerException, \
+    BrokerTimeOut, TIMEDOUT
+
+
+class Reply(object):
+    """Pending reply of a request submitted to a Pipeline
+
+    :ivar conv_id: conversation of the request
+    :ivar tag: tag given with submit()
+    :ivar data: reply message as bytes when done
+    :ivar error: BrokerException if the conversation was ended
+    :ivar done: True when the reply or an error was received
+    """
+    def __init__(self, pipeline, conv_id, tag=None):
+        self.pipeline = pipeline
+        self.conv_id = conv_id
+        self.tag = tag
+        self.data = None
+        self.error = None
+        self.done = False
+
+    def result(self):
+        """Collect replies until this reply is received and return it
+
+        :raises BrokerException: the conversation was ended or
+            a Broker error occurred while collecting
+        """
+        while not self.done:
+            if self.pipeline.collect() is TIMEDOUT:
+                return TIMEDOUT
+        if self.error is not None:
+            raise self.error
+        return self.data
+
+
+class Pipeline(object):
+    """Pipelined requests to one service on several conversations
+
+    :param broker: logged on Broker instance not used otherwise
+        while the pipeline is open
+    :param service: tuple (server_class, server_name, service)
+    :param conversations: maximum number of open conversations
+        and of requests in flight
+    :param wait: wait time for a reply when collecting
+
+    :ivar idle: conv_ids of open conversations without request in flight
+    :ivar pending: dict conv_id: Reply of requests in flight
+    """
+    def __init__(self, broker, service, conversations=16, wait='30S'):
+        self.broker = broker
+        self.service = service
+        self.conversations = conversations
+        self.wait = wait
+        self.idle = deque()
+        self.pending = {}
+
+    def submit(self, payload, tag=None):
+        """Send request on an idle or new conversation without waiting
+
+        If all conversations have a request in flight replies are
+        collected first.
+
+        :param payload: request message, bytes or buffer object
+        :param tag: any value kept in the Reply e.g. to identify the request
+        :returns: Reply
+        :raises BrokerTimeOut: no reply received within wait time while
+            all conversations were busy, also if raise_timeout of the
+            Broker is False
+        """
+        while not self.idle and len(self.pending) >= self.conversations:
+            if self.collect() is TIMEDOUT:
+                raise BrokerTimeOut('No reply within %s on %d busy '
+                    'conversations' % (self.wait, len(self.pending)),
+                    self.broker)
+        bb = self.broker
+        bb.server_class, bb.server_name, bb.service = self.service
+        bb.option = 0
+        bb.wait = 'NO'
+        bb.receive_length = 0
+        while True:
+            conv_id = self.idle.popleft() if self.idle else 'NEW'
+            try:
+                bb.send(conv_id=conv_id, payload=payload)
+                break
+            except BrokerConversationError:
+                if conv_id == 'NEW':
+                    raise
+                # idle conversation ended e.g. by timeout: try next one
+        reply = self.pending[bb.conv_id] = Reply(self, bb.conv_id, tag)
+        return reply
+
+    def collect(self):
+        """Receive one reply of any conversation and route it to its Reply
+
+        The end of an idle conversation e.g. by a timeout is skipped.
+
+        :returns: Reply received, None if no request is in flight or
+            TIMEDOUT on timeout if raise_timeout of the Broker is False
+        """
+        if not self.pending:
+            return None
+        bb = self.broker
+        bb.option = 0
+        bb.wait = self.wait
+        bb.receive_length = len(bb.receive_buffer)
+        while True:
+            try:
+                if bb.receive(conv_id='OLD') is TIMEDOUT:
+                    return TIMEDOUT
+                break
+            except BrokerConversationError as e:
+                reply = self.pending.pop(bb.conv_id, None)
+                if reply is not None:
+                    reply.error = e
+                    reply.done = True
+                    return reply
+                if bb.conv_id not in self.idle:
+                    raise
+                self.idle.remove(bb.conv_id)    # idle conversation ended
+        reply = self.pending.pop(bb.conv_id, None)
+        if reply is None:
+            raise BrokerException('Pipeline received message for unknown '
+                                  'conversation %s' % bb.conv_id, bb)
+        reply.data = bytes(bb.receive_buffer[0:bb.return_length])
+        reply.done = True
+        self.idle.append(reply.conv_id)
+        return reply
+
+    def map(self, payloads):
+        """Return iterator over the replies to payloads in their order"""
+        inflight = deque()
+        for payload in payloads:
+            if len(inflight) >= self.conversations:
+                yield inflight.popleft().result()
+            inflight.append(self.submit(payload))
+        while inflight:
+            yield inflight.popleft().result()
+
+    def drain(self):
+        """Collect the replies of all requests in flight"""
+        while self.pending:
+            if self.collect() is TIMEDOUT:
+                return TIMEDOUT
+
+    def close(self):
+        """Collect outstanding replies and end all conversations"""
+        try:
+            self.drain()
+        finally:
+            bb = self.broker
+            convs = list(self.idle) + list(self.pending)
+            self.idle.clear()
+            self.pending.clear()
+            for conv_id in convs:
+                bb.conv_id = conv_id
+                try:
+                    bb.endConversation()
+                except BrokerException:
+                    pass
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,429 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""pool.py provides pools of logged on Broker instances for threads
+
+A Broker instance holds one control block and must not be used by
+several threads at the same time. BrokerPool keeps logged on Broker
+instances of one broker_id/user_id/token that threads check out for
+a series of calls and check in again::
+
+    >>> from adapya.entirex.pool import BrokerPool
+    >>> pool = BrokerPool('localhost:1971', 'WEBUSER', size=8)
+    >>> with pool.broker() as bb:
+    ...     bb.server_class, bb.server_name, bb.service = 'ACLASS','ASERVER','ASERVICE'
+    ...     bb.send(conv_id='NONE', payload=b'request')
+
+getpool() returns the pool shared by all callers with the same
+broker_id, user_id and token.
+
+Instances idle longer than validate_after seconds are checked with a
+kernel version call before they are handed out. Instances with a
+connection error or transport timeout (error class 0215) or with the
+user no longer known to the Broker (class 0002) are logged off and
+replaced.
+
+ConversationPool keeps conversations to one service open and reuses
+them for successive requests instead of opening a conversation with
+conv_id NEW and ending it for each request::
+
+    >>> from adapya.entirex.pool import ConversationPool
+    >>> convs = ConversationPool(pool, ('ACLASS', 'ASERVER', 'ASERVICE'))
+    >>> reply = convs.request(b'request')
+"""
+from __future__ import print_function          # PY3
+
+import threading
+import time
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+
+from adapya.entirex.broker import Broker, BrokerException, \
+    BrokerConnectionError, BrokerConversationError, FCT_KERNELVERS, \
+    TIMEDOUT, OPT_CANCEL, OPT_EXTENDED
+
+# error classes leaving the control block in an unknown state
+BROKEN_CLASSES = ('0002', '0215')
+
+
+class PoolTimeOut(BrokerException):
+    """No Broker instance became available within the checkout timeout"""
+    def __init__(self, value):
+        self.value = value
+        self.etb = None
+
+
+class BrokerPool(object):
+    """Pool of logged on Broker instances
+
+    :param broker_id: Broker id for all instances
+    :param user_id: user id for all instances
+    :param token: token for all instances
+    :param size: maximum number of instances
+    :param prelogon: number of instances created and logged on
+        when the pool is created
+    :param validate_after: seconds of idle time after which an
+        instance is checked before checkout, 0 to check always,
+        None to never check
+    :param password: password for logon
+    :param kw: further Broker parameters e.g. receive_length, transport,
+        adaptive, raise_timeout
+
+    :ivar metrics: dict of counters: created, closed, checkouts,
+        waits, timeouts, validations, evicted
+    """
+    def __init__(self, broker_id='localhost', user_id='monty', token=None,
+                 size=4, prelogon=0, validate_after=60., password=None, **kw):
+        self.broker_id = broker_id
+        self.user_id = user_id
+        self.token = token
+        self.size = size
+        self.validate_after = validate_after
+        self.password = password
+        self.kw = kw
+
+        self.cond = threading.Condition(threading.Lock())
+        self.idle = deque()         # (Broker, checkin time)
+        self.images = {}            # id(Broker): control block after logon
+        self.count = 0              # instances existing or being created
+        self.closed = False
+        self.metrics = dict(created=0, closed=0, checkouts=0, waits=0,
+                            timeouts=0, validations=0, evicted=0)
+
+        for i in range(min(prelogon, size)):
+            self.count += 1
+            self.checkin(self._create())
+
+    def _create(self):
+        """Create and logon new Broker instance (count already incremented)"""
+        try:
+            bb = Broker(broker_id=self.broker_id, user_id=self.user_id,
+                        token=self.token, **self.kw)
+            bb.logon(password=self.password)
+        except:
+            with self.cond:
+                self.count -= 1
+                self.cond.notify()
+            raise
+        self.images[id(bb)] = bb.snapshot()
+        self._count('created')
+        return bb
+
+    def _count(self, metric):
+        with self.cond:
+            self.metrics[metric] += 1
+
+    def _logoff(self, bb):
+        self.images.pop(id(bb), None)
+        try:
+            bb.logoff()
+        except BrokerException:
+            pass
+        self._count('closed')
+
+    def _valid(self, bb):
+        """Check instance with a kernel version call"""
+        self._count('validations')
+        bb.function = FCT_KERNELVERS
+        bb.option = OPT_EXTENDED
+        try:
+            bb.call()
+        except BrokerException:
+            return False
+        bb.restore(self.images[id(bb)])
+        return True
+
+    def checkout(self, timeout=None):
+        """Return a logged on Broker instance from the pool
+
+        :param timeout: maximum seconds to wait for an instance if
+            all size instances are in use, None waits without limit
+        :raises PoolTimeOut: no instance became available
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self.cond:
+                while not self.idle and self.count >= self.size:
+                    if self.closed:
+                        raise PoolTimeOut('BrokerPool is closed')
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        self.metrics['timeouts'] += 1
+                        raise PoolTimeOut('No Broker instance available in pool '
+                                          'of %s/%s within %s seconds' % (
+                                          self.broker_id, self.user_id, timeout))
+                    self.metrics['waits'] += 1
+                    self.cond.wait(remaining)
+                if self.closed:
+                    raise PoolTimeOut('BrokerPool is closed')
+                self.metrics['checkouts'] += 1
+                if self.idle:
+                    bb, since = self.idle.pop()     # most recently used
+                else:
+                    bb, since = None, None
+                    self.count += 1
+
+            if bb is None:
+                return self._create()
+            if self.validate_after is None or \
+                    time.time() - since < self.validate_after or self._valid(bb):
+                return bb
+            self.evict(bb)
+
+    def checkin(self, bb, broken=False):
+        """Return a Broker instance to the pool
+
+        The control block is reset to the state after logon. An instance
+        whose last call failed with an error class of BROKEN_CLASSES
+        e.g. a transport timeout is evicted.
+
+        :param broken: if True the instance is logged off and
+            removed from the pool
+        """
+        if broken or self.closed or bb.error_code[0:4] in BROKEN_CLASSES:
+            self.evict(bb)
+            return
+        bb.restore(self.images[id(bb)])
+        with self.cond:
+            self.idle.append((bb, time.time()))
+            self.cond.notify()
+
+    def evict(self, bb):
+        """Log off a checked out instance and remove it from the pool"""
+        self._logoff(bb)
+        with self.cond:
+            self.count -= 1
+            self.metrics['evicted'] += 1
+            self.cond.notify()
+
+    @contextmanager
+    def broker(self, timeout=None):
+        """Context manager checking out a Broker instance and checking
+        it in again. Instances with connection errors or transport
+        timeouts are evicted.
+        """
+        bb = self.checkout(timeout)
+        try:
+            yield bb
+        except BrokerConnectionError:
+            self.checkin(bb, broken=True)
+            raise
+        except:
+            self.checkin(bb)
+            raise
+        else:
+            self.checkin(bb)
+
+    def stats(self):
+        """Return dict with metrics and the current numbers of idle
+        and checked out instances"""
+        with self.cond:
+            d = dict(self.metrics)
+            d['idle'] = len(self.idle)
+            d['in_use'] = self.count - len(self.idle)
+        return d
+
+    def close(self):
+        """Log off idle instances; checked out instances are logged
+        off when they are checked in"""
+        with self.cond:
+            self.closed = True
+            idle, self.idle = self.idle, deque()
+            self.count -= len(idle)
+            self.cond.notify_all()
+        for bb, since in idle:
+            self._logoff(bb)
+
+
+class ConversationPool(object):
+    """Open conversations to one service reused for successive requests
+
+    Each conversation belongs to a Broker instance checked out from a
+    BrokerPool while the conversation is open. A request uses the most
+    recently used idle conversation or opens a new one. The server
+    replies with one message per request and keeps the conversation open.
+
+    The Broker ends conversations idle longer than the conv_nonact time
+    of the service. Idle conversations older than refresh * conv_nonact
+    are therefore ended and replaced by new ones before they time out.
+    If more than size conversations are idle the least recently used
+    ones are ended.
+
+    :param pool: BrokerPool providing the Broker instances
+    :param service: tuple (server_class, server_name, service)
+    :param size: maximum number of idle conversations kept open
+    :param conv_nonact: conversation timeout of the service in seconds,
+        None reads it from the Broker information service (CIS),
+        0 for no refresh
+    :param refresh: share of conv_nonact after which an idle
+        conversation is refreshed
+    :param wait: wait time for the replies
+
+    :ivar metrics: dict of counters: requests, opened, reused,
+        refreshed, evicted, retried
+    """
+    def __init__(self, pool, service, size=4, conv_nonact=None, refresh=0.8,
+                 wait='30S'):
+        self.pool = pool
+        self.service = service
+        self.size = size
+        self.refresh = refresh
+        self.wait = wait
+        self.lock = threading.Lock()
+        self.idle = OrderedDict()   # conv_id: (Broker, last use), LRU first
+        self.metrics = dict(requests=0, opened=0, reused=0, refreshed=0,
+                            evicted=0, retried=0)
+        if conv_nonact is None:
+            conv_nonact = self.read_conv_nonact()
+        self.conv_nonact = conv_nonact
+
+    def read_conv_nonact(self):
+        """Return the conversation timeout of the service in seconds
+        from CIS or 0 if the service is not found"""
+        from adapya.entirex.cmdinfo import Cis
+        cis = Cis(broker=self.pool.broker_id, user=self.pool.user_id,
+                  transport=self.pool.kw.get('transport'))
+        info = cis.iservice(*self.service)
+        return info.conv_nonact if info is not None else 0
+
+    def _end(self, bb, conv_id, option=0):
+        """End conversation and check in its Broker instance"""
+        bb.conv_id = conv_id
+        try:
+            bb.endConversation(option=option)
+        except BrokerConnectionError:
+            self.pool.checkin(bb, broken=True)
+            return
+        except BrokerException:
+            pass
+        self.pool.checkin(bb)
+
+    def _checkout(self):
+        """Return Broker instance and conv_id of an idle conversation
+        or of a new Broker instance with conv_id NEW"""
+        stale = []
+        with self.lock:
+            self.metrics['requests'] += 1
+            if self.conv_nonact and self.idle:
+                limit = time.time() - self.refresh * self.conv_nonact
+                for conv_id, (bb, used) in list(self.idle.items()):
+                    if used > limit:
+                        break
+                    del self.idle[conv_id]
+                    stale.append((bb, conv_id))
+                self.metrics['refreshed'] += len(stale)
+            if self.idle:
+                conv_id, (bb, used) = self.idle.popitem()   # most recent
+                self.metrics['reused'] += 1
+            else:
+                bb = None
+        for b, c in stale:
+            self._end(b, c)
+        if bb is None:
+            bb, conv_id = self.pool.checkout(), 'NEW'
+        return bb, conv_id
+
+    def _checkin(self, bb):
+        """Keep conversation of bb idle, end least recently used ones"""
+        evicted = []
+        with self.lock:
+            self.idle[bb.conv_id] = (bb, time.time())
+            while len(self.idle) > self.size:
+                conv_id, (b, used) = self.idle.popitem(last=False)
+                evicted.append((b, conv_id))
+            self.metrics['evicted'] += len(evicted)
+        for b, c in evicted:
+            self._end(b, c)
+
+    def _send(self, bb, conv_id, payload, wait):
+        if conv_id == 'NEW':
+            with self.lock:
+                self.metrics['opened'] += 1
+        bb.server_class, bb.server_name, bb.service = self.service
+        bb.conv_id = conv_id
+        bb.option = 0
+        bb.wait = wait or self.wait
+        bb.receive_length = len(bb.receive_buffer)
+        if bb.send(payload=payload) is TIMEDOUT:
+            return TIMEDOUT
+        return bytes(bb.receive_buffer[0:bb.return_length])
+
+    def request(self, payload, wait=None):
+        """Send request on an open conversation and return the reply
+
+        A request on a conversation ended meanwhile by the Broker or the
+        server is repeated on a new conversation.
+
+        :param payload: request message, bytes or buffer object
+        :param wait: wait time for the reply, default wait of the pool
+        :returns: reply message as bytes or TIMEDOUT on timeout if
+            raise_timeout of the Broker instances is False
+        """
+        bb, conv_id = self._checkout()
+        try:
+            try:
+                reply = self._send(bb, conv_id, payload, wait)
+            except BrokerConversationError:
+                if conv_id == 'NEW':
+                    raise
+                with self.lock:
+                    self.metrics['retried'] += 1
+                reply = self._send(bb, 'NEW', payload, wait)
+        except BrokerConnectionError:
+            self.pool.checkin(bb, broken=True)
+            raise
+        except:
+            # state of the conversation unknown e.g. after timeout
+            self._end(bb, bb.conv_id, OPT_CANCEL)
+            raise
+        if reply is TIMEDOUT:
+            self._end(bb, bb.conv_id, OPT_CANCEL)
+            return TIMEDOUT
+        self._checkin(bb)
+        return reply
+
+    def stats(self):
+        """Return dict with metrics and the number of idle conversations"""
+        with self.lock:
+            d = dict(self.metrics)
+            d['idle'] = len(self.idle)
+        return d
+
+    def close(self):
+        """End the idle conversations"""
+        with self.lock:
+            idle, self.idle = self.idle, OrderedDict()
+        for conv_id, (bb, used) in idle.items():
+            self._end(bb, conv_id)
+
+
+_pools = {}
+_poolslock = threading.Lock()
+
+
+def getpool(broker_id='localhost', user_id='monty', token=None, **kw):
+    """Return the BrokerPool for broker_id, user_id and token,
+    creating it with the parameters kw (see BrokerPool) if needed"""
+    key = (broker_id, user_id, token)
+    with _poolslock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            pool = _pools[key] = BrokerPool(broker_id, user_id, token, **kw)
+        return pool
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,293 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""pubsub.py provides publish and subscribe clients
+
+A publication is sent once to a topic and delivered by the Broker to
+all subscribers of the topic without a conversation per subscriber.
+
+Publisher collects messages per topic into one publication and commits
+it when it reaches a number of messages or has been open for a linger
+time. The last message commits the publication without a separate
+CONTROL_PUBLICATION call::
+
+    >>> from adapya.entirex.broker import Broker
+    >>> from adapya.entirex.pubsub import Publisher, Subscriber
+    >>> bb = Broker('localhost:1971', 'PUBLISHER')
+    >>> bb.logon()
+    >>> with Publisher(bb, max_messages=50) as pub:
+    ...     pub.publish('PRICES', b'ABC 12.3')
+
+Subscriber iterates over the publications of a topic and acknowledges
+the publications processed in groups, each publication with its own
+CONTROL_PUBLICATION call::
+
+    >>> sb = Broker('localhost:1971', 'SUBSCRIBER')
+    >>> sb.logon()
+    >>> sub = Subscriber(sb, 'PRICES', durable=True, ack_every=100)
+    >>> for p in sub.publications():
+    ...     print(p.publicationID, p.messages)
+
+Publications not acknowledged are delivered again after a backout
+or, with a durable subscription, after the next logon.
+"""
+from __future__ import print_function          # PY3
+
+import collections
+import time
+
+from adapya.entirex.broker import BrokerException, BrokerTimeOut, \
+    TIMEDOUT, OPT_BACKOUT, OPT_COMMIT, OPT_DURABLE, RECV_FIRST, RECV_MIDDLE
+
+Publication = collections.namedtuple('Publication', 'topic publicationID messages')
+Publication.__doc__ = """Publication received with the list of its messages"""
+
+
+class Publisher(object):
+    """Publisher sending messages in publications batched per topic
+
+    :param broker: logged on Broker instance used only by the publisher
+    :param max_messages: maximum number of messages in a publication
+    :param linger: seconds after the first message of a publication
+        after which it is committed, None for no time limit. It is
+        checked with each publish() and with poll().
+
+    :ivar publications: number of publications committed
+    :ivar messages: number of messages in committed publications
+    """
+    def __init__(self, broker, max_messages=100, linger=1.):
+        self.broker = broker
+        self.max_messages = max_messages
+        self.linger = linger
+        self.open = {}      # topic: [publicationID, messages, start time]
+        self.publications = 0
+        self.messages = 0
+
+    def publish(self, topic, payload, commit=False):
+        """Add message to the open publication of topic
+
+        :param payload: message, bytes or buffer object
+        :param commit: if True commit the publication with this message
+        """
+        bb = self.broker
+        entry = self.open.get(topic)
+        count = entry[1] if entry else 0
+        last = commit or count + 1 >= self.max_messages
+        bb.sendPublication(topic, option=OPT_COMMIT if last else 0,
+                           payload=payload,
+                           publicationID=entry[0] if entry else 'NEW')
+        if last:
+            self.open.pop(topic, None)
+            self.publications += 1
+            self.messages += count + 1
+            return
+        if entry is None:
+            entry = self.open[topic] = [bb.publicationID, 0, time.time()]
+        entry[1] += 1
+        self.poll()
+
+    def flush(self, topic=None):
+        """Commit the open publication of topic or of all topics"""
+        for t in [topic] if topic is not None else list(self.open):
+            entry = self.open.pop(t, None)
+            if entry is None:
+                continue
+            self.broker.controlPublication(OPT_COMMIT, entry[0], t)
+            self.publications += 1
+            self.messages += entry[1]
+
+    def backout(self, topic=None):
+        """Discard the open publication of topic or of all topics"""
+        for t in [topic] if topic is not None else list(self.open):
+            entry = self.open.pop(t, None)
+            if entry is not None:
+                self.broker.controlPublication(OPT_BACKOUT, entry[0], t)
+
+    def poll(self):
+        """Commit publications open longer than the linger time"""
+        if self.linger is None:
+            return
+        limit = time.time() - self.linger
+        for topic, entry in list(self.open.items()):
+            if entry[2] <= limit:
+                self.flush(topic)
+
+    def close(self):
+        """Commit all open publications"""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        if type is None:
+            self.close()
+        else:
+            self.backout()
+
+
+class Subscriber(object):
+    """Subscriber receiving the publications of a topic
+
+    Processed publications are acknowledged together when ack_every
+    publications are unacknowledged, after ack_after seconds or when
+    no further publication is waiting. CONTROL_PUBLICATION commits
+    or backs out one publicationID, so each is acknowledged by its own
+    call.
+
+    :param broker: logged on Broker instance used only by the subscriber
+    :param topic: topic name
+    :param durable: if True the subscription and its publications are
+        kept by the Broker after logoff
+    :param wait: wait time for a publication
+    :param ack_every: maximum number of unacknowledged publications
+    :param ack_after: maximum seconds publications stay unacknowledged
+        while further ones are received
+
+    :ivar received: number of publications received
+    :ivar acked: number of publications acknowledged
+    """
+    def __init__(self, broker, topic, durable=False, wait='1S',
+                 ack_every=100, ack_after=1.):
+        self.broker = broker
+        self.topic = topic
+        self.durable = durable
+        self.wait = wait
+        self.ack_every = ack_every
+        self.ack_after = ack_after
+        self.unacked = 0
+        self.unacked_since = 0.
+        self.inflight = collections.OrderedDict()   # publicationID: processed
+        self.received = 0
+        self.acked = 0
+        self.subscribed = False
+
+    def subscribe(self):
+        self.broker.subscribe(self.topic,
+                              option=OPT_DURABLE if self.durable else 0)
+        self.subscribed = True
+
+    def unsubscribe(self):
+        """Cancel the subscription, also a durable one"""
+        self.broker.unsubscribe(self.topic)
+        self.subscribed = False
+
+    def receive(self):
+        """Receive all messages of the next publication
+
+        :returns: Publication or TIMEDOUT if no publication arrived
+            within the wait time
+        :raises BrokerTimeOut: timeout within the publication, which is
+            backed out to be delivered again
+        """
+        if not self.subscribed:
+            self.subscribe()
+        bb = self.broker
+        bb.receive_length = len(bb.receive_buffer)
+        try:
+            if bb.receivePublication(self.topic, 'NEW', self.wait) is TIMEDOUT:
+                return TIMEDOUT
+        except BrokerTimeOut:
+            return TIMEDOUT
+        pubid = bb.publicationID
+        messages = [bytes(bb.receive_buffer[0:bb.return_length])]
+        try:
+            while bb.uowStatus in (RECV_FIRST, RECV_MIDDLE):
+                bb.receive_length = len(bb.receive_buffer)
+                if bb.receivePublication(self.topic, pubid, self.wait) \
+                        is TIMEDOUT:
+                    raise BrokerTimeOut('Wait timeout within publication %s'
+                                        % pubid, bb)
+                messages.append(bytes(bb.receive_buffer[0:bb.return_length]))
+        except BrokerTimeOut:
+            try:
+                bb.controlPublication(OPT_BACKOUT, pubid, self.topic)
+            except BrokerException:
+                pass
+            raise
+        self.received += 1
+        self.inflight[pubid] = False
+        return Publication(self.topic, pubid, messages)
+
+    def processed(self, publication):
+        """Mark received publication as processed, to be acknowledged"""
+        if self.inflight.get(publication.publicationID) is not False:
+            return
+        if not self.unacked:
+            self.unacked_since = time.time()
+        self.inflight[publication.publicationID] = True
+        self.unacked += 1
+
+    def ack(self):
+        """Acknowledge all publications processed"""
+        for pubid, processed in list(self.inflight.items()):
+            if processed:
+                self.broker.controlPublication(OPT_COMMIT, pubid, self.topic)
+                del self.inflight[pubid]
+                self.acked += 1
+                self.unacked -= 1
+
+    def backout(self, publication=None):
+        """Have publication or all publications not acknowledged
+        delivered again"""
+        if publication is not None:
+            pubids = [publication.publicationID]
+        else:
+            pubids = list(self.inflight)
+        for pubid in reversed(pubids):      # keep order of redelivery
+            processed = self.inflight.pop(pubid, None)
+            if processed is None:
+                continue
+            self.broker.controlPublication(OPT_BACKOUT, pubid, self.topic)
+            if processed:
+                self.unacked -= 1
+
+    def publications(self, until_idle=False):
+        """Generator of received Publications
+
+        A publication is processed when the next one is requested.
+        If the iteration is ended by break or an exception the current
+        publication is backed out and the processed ones acknowledged.
+
+        :param until_idle: if True end the iteration when no
+            publication arrived within the wait time
+        """
+        current = None
+        try:
+            while True:
+                if self.unacked and (self.unacked >= self.ack_every or
+                        time.time() - self.unacked_since >= self.ack_after):
+                    self.ack()
+                current = self.receive()
+                if current is TIMEDOUT:
+                    current = None
+                    self.ack()
+                    if until_idle:
+                        return
+                    continue
+                yield current
+                self.processed(current)
+                current = None
+        finally:
+            if current is not None:
+                self.backout(current)
+            self.ack()
+
+    __iter__ = publications
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,288 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""schema.py compiles Datamap field definitions into message codecs
+
+A Schema describes a fixed-length record with the field types of
+adapya.base.datamap and compiles it into one struct.Struct. A record
+is encoded from or decoded to a tuple of field values with one struct
+call, only text fields are converted individually::
+
+    >>> from adapya.base.datamap import String, Uint4, Bytes, Double, \\
+    ...     NETWORKBO
+    >>> from adapya.entirex.schema import Schema
+    >>> order = Schema('order', String('item', 8), Uint4('quantity'),
+    ...                Double('price'), Bytes('flags', 2),
+    ...                byteorder=NETWORKBO)
+    >>> order.size
+    22
+    >>> msg = order.encode(('ABC', 5, 12.5, b'\\x00\\x01'))
+    >>> order.decode(msg)
+    ('ABC', 5, 12.5, b'\\x00\\x01')
+
+Many records of one message are encoded and decoded in a batch::
+
+    >>> msg = order.encode_many([('ABC', 5, 12.5, b''), ('XY', 1, 3., b'')])
+    >>> order.decode_many(msg)
+    [('ABC', 5, 12.5, b'\\x00\\x00'), ('XY', 1, 3.0, b'\\x00\\x00')]
+
+With NumPy installed a message of records maps to a structured array
+without converting the fields. Text fields are then bytes padded with
+blanks::
+
+    >>> a = order.to_array(msg)                 # doctest: +SKIP
+    >>> a['quantity'].sum()                     # doctest: +SKIP
+    6
+    >>> msg = order.from_array(a)               # doctest: +SKIP
+
+Supported are the types String, Utf8, Unicode, Char, Bytes, Filler and
+the integer and float types. Packed and unpacked decimals, variable
+length and periodic fields are not supported.
+"""
+from __future__ import print_function          # PY3
+
+import struct
+import sys
+
+from adapya.base import datamap
+from adapya.base.datamap import Datamap, DatamapError, NETWORKBO, \
+    T_STRING, T_BYTE, T_UTF16, T_UTF8, T_CHAR, T_INT1, T_UINT1, T_INT2, \
+    T_UINT2, T_INT4, T_UINT4, T_INT8, T_UINT8, T_FLOAT, T_DOUBLE, \
+    T_NONE, T_NWBO, T_EBCDIC, T_VAR0, T_VAR1, T_VAR2, T_VAR4, T_DT, T_STCK
+
+# struct format and NumPy type code of numeric field types
+_NUMERIC = {T_INT1: ('b', 'i1'), T_UINT1: ('B', 'u1'),
+            T_INT2: ('h', 'i2'), T_UINT2: ('H', 'u2'),
+            T_INT4: ('i', 'i4'), T_UINT4: ('I', 'u4'),
+            T_INT8: ('q', 'i8'), T_UINT8: ('Q', 'u8'),
+            T_FLOAT: ('f', 'f4'), T_DOUBLE: ('d', 'f8')}
+
+_UNSUPPORTED = T_VAR0 | T_VAR1 | T_VAR2 | T_VAR4 | T_DT | T_STCK
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('Schema arrays require NumPy')
+    return numpy
+
+
+def _text_codec(size, encoding, espace):
+    """Return (encode, decode) functions of a text field padded with
+    blanks to size bytes. Longer text is truncated at a character
+    boundary."""
+    pad = espace * size
+    def encode(value):
+        if not isinstance(value, bytes):
+            value = value.encode(encoding)
+            if len(value) > size:
+                value = value[:size].decode(encoding, 'ignore').encode(encoding)
+        return value + pad[:size-len(value)]
+
+    def decode(value):
+        return value.decode(encoding, 'replace').rstrip(u' ')
+    return encode, decode
+
+
+class Schema(object):
+    """Compiled codec of a fixed-length record
+
+    :param name: name of the record
+    :param fields: field definitions e.g. String('name', 8), Uint4('count')
+        or a Datamap instance
+    :param raw: if True text fields are bytes passed unchanged to
+        struct, which pads shorter values with X'00'
+    :param kw: Datamap parameters e.g. byteorder=NETWORKBO, encoding,
+        ebcdic
+
+    :ivar names: names of the fields in the value tuples
+    :ivar size: record size in bytes
+    :ivar struct: struct.Struct of the record
+    :raises DatamapError: field type or option not supported
+    """
+    def __init__(self, name, *fields, **kw):
+        raw = kw.pop('raw', False)
+        if fields and isinstance(fields[0], Datamap):
+            dmap = fields[0]
+        else:
+            dmap = Datamap(name, *fields, **kw)
+        self.name = name
+        self.raw = raw
+        self.byteorder = dmap.byteOrder or datamap.byteOrder
+        encoding = dmap.encoding
+        espace = dmap.espace
+        fmt = []
+        dtype = dict(names=[], formats=[], offsets=[])
+        self.names = []
+        self._text = []         # (index, encode, decode) of text fields
+        self._pad = {}          # name: (encoding, blank) of text fields
+        pos = 0
+        for key in dmap.keylist:
+            fty, start, size, opt, fdict = dmap.keydict[key]
+            if opt & _UNSUPPORTED or 'submap' in fdict or \
+                    fdict.get('occurs') or callable(fdict.get('initsize')):
+                raise DatamapError('Field %s: option not supported '
+                                   'by Schema' % key, dmap)
+            if start < pos:
+                raise DatamapError('Field %s overlaps previous field' % key,
+                                   dmap)
+            if start > pos:
+                fmt.append('%dx' % (start - pos))
+            pos = start + size
+            if opt & T_NONE:
+                fmt.append('%dx' % size)
+                continue
+            if fty in _NUMERIC:
+                if opt & T_NWBO and self.byteorder != NETWORKBO and \
+                        sys.byteorder == 'little':
+                    raise DatamapError('Field %s: byte order differs from '
+                                       'record' % key, dmap)
+                code, ncode = _NUMERIC[fty]
+                fmt.append(code)
+                dtype['formats'].append(
+                    ('>' if self.byteorder == NETWORKBO else '=') + ncode)
+            elif fty in (T_STRING, T_UTF8, T_UTF16, T_CHAR, T_BYTE):
+                fmt.append('%ds' % size)
+                dtype['formats'].append('S%d' % size)
+                if fty != T_BYTE and not raw:
+                    if fty == T_UTF8:
+                        codec = _text_codec(size, 'utf_8', b' ')
+                    elif fty == T_UTF16:
+                        enc = 'utf_16_be' if self.byteorder == NETWORKBO \
+                            else datamap.UTF16_NATIVE
+                        codec = _text_codec(size, enc, u' '.encode(enc))
+                    elif opt & T_EBCDIC:
+                        codec = _text_codec(size, 'cp037', b'\x40')
+                        self._pad[key] = ('cp037', b'\x40')
+                    else:
+                        codec = _text_codec(size, encoding, espace)
+                        self._pad[key] = (encoding, espace)
+                    self._text.append((len(self.names),) + codec)
+            else:
+                raise DatamapError('Field %s: type %r not supported '
+                                   'by Schema' % (key, fty), dmap)
+            dtype['names'].append(key)
+            dtype['offsets'].append(start)
+            self.names.append(key)
+        if dmap.dmlen > pos:
+            fmt.append('%dx' % (dmap.dmlen - pos))
+        self.struct = struct.Struct(
+            ('!' if self.byteorder == NETWORKBO else '=') + ''.join(fmt))
+        self.size = self.struct.size
+        dtype['itemsize'] = self.size
+        self._dtype = dtype
+
+    @property
+    def dtype(self):
+        """NumPy structured dtype of the record, text fields as bytes"""
+        return _numpy().dtype(self._dtype)
+
+    def encode(self, values):
+        """Return record of the field values as bytes
+
+        :param values: sequence of field values in the order of names
+        """
+        if self._text:
+            values = list(values)
+            for i, encode, decode in self._text:
+                values[i] = encode(values[i])
+        return self.struct.pack(*values)
+
+    def encode_into(self, buffer, offset, values):
+        """Encode the field values into writable buffer at offset"""
+        if self._text:
+            values = list(values)
+            for i, encode, decode in self._text:
+                values[i] = encode(values[i])
+        self.struct.pack_into(buffer, offset, *values)
+
+    def decode(self, data, offset=0):
+        """Return tuple of the field values of the record at offset"""
+        values = self.struct.unpack_from(data, offset)
+        if self._text:
+            values = list(values)
+            for i, encode, decode in self._text:
+                values[i] = decode(values[i])
+            values = tuple(values)
+        return values
+
+    def encode_many(self, records):
+        """Return records as one message
+
+        :param records: sequence of value tuples
+        :returns: bytearray of len(records) * size bytes
+        """
+        size = self.size
+        buf = bytearray(size * len(records))
+        pack_into = self.struct.pack_into
+        if self._text:
+            for i, values in enumerate(records):
+                self.encode_into(buf, i * size, values)
+        else:
+            for i, values in enumerate(records):
+                pack_into(buf, i * size, *values)
+        return buf
+
+    def decode_many(self, data):
+        """Return list of value tuples of the records in data
+
+        :raises ValueError: length of data is not a multiple of size
+        """
+        if len(data) % self.size:
+            raise ValueError('Message length %d is not a multiple of the '
+                             'record size %d' % (len(data), self.size))
+        if not self._text and hasattr(self.struct, 'iter_unpack'):
+            return list(self.struct.iter_unpack(data))
+        return [self.decode(data, i)
+                for i in range(0, len(data), self.size)]
+
+    def to_array(self, data):
+        """Return NumPy structured array of the records in data
+
+        The array shares the memory of data, it is read-only if data is.
+        """
+        return _numpy().frombuffer(data, dtype=self.dtype)
+
+    def from_array(self, array):
+        """Return records of NumPy array as bytes
+
+        :param array: structured array with the dtype or with fields
+            of the same names convertible to it, missing fields are
+            set to zero. Text of String fields is encoded and padded
+            with blanks.
+        """
+        np = _numpy()
+        dtype = self.dtype
+        if array.dtype != dtype:
+            converted = np.zeros(len(array), dtype=dtype)
+            for name in self.names:
+                if name not in array.dtype.names:
+                    continue
+                values = array[name]
+                if name in self._pad and values.dtype.kind in 'SU':
+                    encoding, blank = self._pad[name]
+                    if values.dtype.kind == 'U':
+                        values = np.char.encode(values, encoding)
+                    values = np.char.ljust(values,
+                        dtype.fields[name][0].itemsize, blank)
+                converted[name] = values
+            array = converted
+        return np.ascontiguousarray(array).tobytes()
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,276 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""scm.py supports services in single conversation mode (SCM)
+
+In single conversation mode the units of work (UOW) of a client are
+delivered on one long-lived conversation to the server in the order
+they were committed, e.g. for replication flows. SCM requires ACI
+version 10 (Broker 9.7 or later). With the service option prefetch
+the Broker reads ahead the messages of the next UOWs from the
+persistent store while the server processes the current one.
+
+A service is switched into SCM with a CIS command while it has no
+conversations::
+
+    >>> from adapya.entirex.scm import ScmProducer, ScmConsumer, \\
+    ...     set_single_conversation
+    >>> service = ('REPTOR', 'MMSERV', 'REPLICATE')
+    >>> set_single_conversation(service, 'localhost:1971', 'ADMIN',
+    ...                         prefetch=True)
+
+Client streaming UOWs on one conversation::
+
+    >>> bb = Broker('localhost:1971', 'PRODUCER')
+    >>> prod = ScmProducer(bb, service)
+    >>> prod.send_uow([b'record 1', b'record 2'])
+    >>> prod.close()
+
+Server consuming the UOWs::
+
+    >>> srv = Broker('localhost:1971', 'CONSUMER')
+    >>> cons = ScmConsumer(srv, service)
+    >>> cons.serve(lambda messages: print(len(messages)))
+"""
+from __future__ import print_function          # PY3
+
+from adapya.entirex.broker import BrokerConversationError, InterfaceError, \
+    TIMEDOUT, API_VERS10, OPT_COMMIT, OPT_SYNC
+
+
+def negotiate_version(bb, version=API_VERS10):
+    """Use ACI version for Broker instance bb if the kernel supports it
+
+    :raises InterfaceError: kernel supports a lower ACI version
+    """
+    bb.use_api_version = version
+    bb.api_version = version
+    bb.kernelVersion()      # lowers api_version to the kernel version
+    if bb.api_version < version:
+        raise InterfaceError('Broker kernel supports ACI version %d, '
+                             'version %d required' % (bb.api_version, version), bb)
+
+
+def set_single_conversation(service, broker_id='localhost', user_id='monty',
+                            prefetch=False, transport=None):
+    """Switch service into single conversation mode with CIS command
+    SET-SINGLE-CONVERSATION
+
+    :param service: tuple (server_class, server_name, service)
+    :param prefetch: if True set option PREFETCH for the service
+    :raises CISError: e.g. service not found or has active conversations
+    """
+    from adapya.entirex.cmdinfo import Cis, CIC_SET_SINGLE_CONVERSATION, \
+        CIO_SERVICE, CIP_ETB_PREFETCH
+    cis = Cis(cis='CMD', broker=broker_id, user=user_id, transport=transport)
+    server_class, server, name = service
+    cis.icmd(CIO_SERVICE, CIC_SET_SINGLE_CONVERSATION,
+             option=CIP_ETB_PREFETCH if prefetch else 0,
+             server_class=server_class, server=server, service=name)
+
+
+class ScmProducer(object):
+    """Client sending units of work on one long-lived conversation
+
+    :param broker: Broker instance used only by the producer
+    :param service: tuple (server_class, server_name, service)
+    :param negotiate: if True check that ACI version 10 is supported
+        and use it
+
+    :ivar conv_id: conversation of the producer, 'NEW' before the first UOW
+    :ivar uows: number of UOWs committed
+    :ivar messages: number of messages sent in committed UOWs
+    """
+    def __init__(self, broker, service, negotiate=True):
+        self.broker = broker
+        self.service = service
+        self.conv_id = 'NEW'
+        self.pending = 0        # messages sent in current UOW
+        self.uows = 0
+        self.messages = 0
+        if negotiate:
+            negotiate_version(broker)
+
+    def send(self, payload, commit=False):
+        """Send message in the current UOW
+
+        If the conversation was ended e.g. by the Broker a new one
+        is started with the first message of a UOW.
+
+        :param commit: if True the UOW is committed with this message
+        """
+        bb = self.broker
+        bb.server_class, bb.server_name, bb.service = self.service
+        bb.wait = 'NO'
+        bb.receive_length = 0
+        bb.option = OPT_COMMIT if commit else OPT_SYNC
+        try:
+            bb.send(conv_id=self.conv_id, payload=payload)
+        except BrokerConversationError:
+            if self.pending or self.conv_id == 'NEW':
+                raise
+            self.conv_id = 'NEW'
+            bb.option = OPT_COMMIT if commit else OPT_SYNC
+            bb.send(conv_id=self.conv_id, payload=payload)
+        self.conv_id = bb.conv_id
+        self.pending += 1
+        if commit:
+            self._committed()
+
+    def _committed(self):
+        self.uows += 1
+        self.messages += self.pending
+        self.pending = 0
+
+    def commit(self):
+        """Commit the messages sent in the current UOW"""
+        if not self.pending:
+            return
+        bb = self.broker
+        bb.conv_id = self.conv_id
+        bb.commit()
+        self._committed()
+
+    def backout(self):
+        """Backout the messages sent in the current UOW"""
+        if not self.pending:
+            return
+        bb = self.broker
+        bb.conv_id = self.conv_id
+        bb.backout()
+        self.pending = 0
+
+    def send_uow(self, messages):
+        """Send list of messages as one UOW and commit it"""
+        for payload in messages[:-1]:
+            self.send(payload)
+        self.send(messages[-1], commit=True)
+
+    def close(self):
+        """Backout an uncommitted UOW and end the conversation.
+        Committed UOWs are still delivered to the server."""
+        self.backout()
+        if self.conv_id != 'NEW':
+            bb = self.broker
+            bb.conv_id = self.conv_id
+            bb.endConversation()
+            self.conv_id = 'NEW'
+
+
+class ScmConsumer(object):
+    """Server receiving the units of work of a service in single
+    conversation mode
+
+    Each UOW is received completely with Broker.receiveUow() and
+    committed after it has been processed.
+
+    :param broker: Broker instance used only by the consumer
+    :param service: tuple (server_class, server_name, service)
+    :param wait: wait time for the next UOW
+    :param negotiate: if True check that ACI version 10 is supported
+        and use it
+
+    :ivar conv_id: conversation of the current UOW
+    :ivar uowID: id of the current UOW
+    :ivar uows: number of UOWs committed
+    """
+    def __init__(self, broker, service, wait='YES', negotiate=True):
+        self.broker = broker
+        self.service = service
+        self.wait = wait
+        self.conv_id = ''
+        self.uowID = ''
+        self.uows = 0
+        self.registered = False
+        if negotiate:
+            negotiate_version(broker)
+
+    def register(self):
+        bb = self.broker
+        bb.server_class, bb.server_name, bb.service = self.service
+        bb.register()
+        self.registered = True
+
+    def deregister(self):
+        if self.registered:
+            bb = self.broker
+            bb.server_class, bb.server_name, bb.service = self.service
+            bb.deregister()
+            self.registered = False
+
+    def receive(self):
+        """Receive all messages of the next UOW
+
+        Notifications of conversations ended by the client are skipped.
+
+        :returns: list of messages or TIMEDOUT on timeout if
+            raise_timeout of the Broker is False
+        """
+        if not self.registered:
+            self.register()
+        bb = self.broker
+        while True:
+            bb.option = 0
+            try:
+                messages = bb.receiveUow(conv_id='ANY', wait=self.wait)
+                break
+            except BrokerConversationError:
+                continue
+        if messages is not TIMEDOUT:
+            self.conv_id = bb.conv_id
+            self.uowID = bb.uowID
+        return messages
+
+    def commit(self):
+        """Commit the received UOW as processed"""
+        bb = self.broker
+        bb.conv_id = self.conv_id
+        bb.uowID = self.uowID
+        bb.commit()
+        self.uows += 1
+
+    def backout(self):
+        """Backout the received UOW to receive it again later"""
+        bb = self.broker
+        bb.conv_id = self.conv_id
+        bb.uowID = self.uowID
+        bb.backout()
+
+    def serve(self, handler, count=None):
+        """Receive UOWs and pass their messages to handler
+
+        A UOW is committed when handler returns and backed out if
+        handler raises an exception, which is raised again.
+
+        :param handler: function(messages) with the list of messages
+        :param count: number of UOWs to process, None without limit
+        """
+        n = 0
+        while count is None or n < count:
+            messages = self.receive()
+            if messages is TIMEDOUT:
+                continue
+            try:
+                handler(messages)
+            except:
+                self.backout()
+                raise
+            self.commit()
+            n += 1
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
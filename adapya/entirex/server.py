@@ -0,0 +1,394 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""server.py provides a multi-threaded EntireX Broker ACI server
+
+BrokerServer runs a number of worker threads, each with its own Broker
+instance registered for the same service. Received requests are passed
+to a handler function returning the reply::
+
+    >>> from adapya.entirex.server import BrokerServer
+    >>> def echo(request, context):
+    ...     return request.upper()
+    >>> srv = BrokerServer(echo, broker_id='localhost:1971', user_id='ECHO',
+    ...     server_class='ACLASS', server_name='ASERVER', service='ECHO',
+    ...     workers=4)
+    >>> srv.start()
+    >>> srv.stop()
+
+The handler is called as handler(request, context) with the request
+message as bytes and a RequestContext. A reply of None sends no reply.
+Setting context.eoc to True ends the conversation with the reply.
+An exception in the handler cancels the conversation.
+
+The Broker call blocks without holding the Python GIL, so workers
+wait for and send messages in parallel.
+
+For handlers doing CPU-bound work PreforkServer runs BrokerServers
+in several child processes.
+"""
+from __future__ import print_function          # PY3
+
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+import traceback
+
+from adapya.entirex.broker import Broker, BrokerException, \
+    BrokerConversationError, TIMEDOUT, CONVSTAT_NONE, OPT_CANCEL, OPT_EOC
+
+
+class RequestContext(object):
+    """Context of a request passed to the handler
+
+    :ivar broker: Broker instance of the worker, e.g. to send further
+        messages or receive on the conversation
+    :ivar conv_id: conversation id
+    :ivar conv_stat: CONVSTAT_NEW, CONVSTAT_OLD or CONVSTAT_NONE
+    :ivar uowID: unit of work id or ''
+    :ivar user_id: user id of the client
+    :ivar worker: Worker
+    :ivar eoc: set to True to end the conversation with the reply
+    """
+    def __init__(self, worker):
+        bb = worker.broker
+        self.broker = bb
+        self.worker = worker
+        self.conv_id = bb.conv_id
+        self.conv_stat = bb.conv_stat
+        self.uowID = bb.uowID
+        self.user_id = bb.client_uid
+        self.eoc = False
+
+
+class Worker(threading.Thread):
+    """Server thread with its own Broker instance
+
+    :ivar requests: number of requests handled
+    :ivar errors: number of requests failed in the handler or
+        when replying
+    :ivar busy: seconds spent handling requests
+    :ivar started: start time
+    """
+    def __init__(self, server, number):
+        threading.Thread.__init__(self, name='%s-%d' % (server.service, number))
+        self.daemon = True
+        self.server = server
+        self.number = number
+        self.broker = None
+        self.requests = 0
+        self.errors = 0
+        self.busy = 0.
+        self.started = 0.
+
+    def run(self):
+        srv = self.server
+        self.started = time.time()
+        kw = dict(srv.kw)
+        kw['raise_timeout'] = False
+        bb = self.broker = Broker(broker_id=srv.broker_id, user_id=srv.user_id,
+                                  **kw)
+        bb.server_class = srv.server_class
+        bb.server_name = srv.server_name
+        bb.service = srv.service
+        registered = False
+        try:
+            bb.logon(password=srv.password)
+            bb.register()
+            registered = True
+            srv.ready.release()
+            self.serve('ANY', lambda: not srv.stopping)
+            # quiesce: no new conversations, finish existing ones
+            bb.deregister()
+            deadline = time.time() + srv.drain
+            self.serve('OLD', lambda: time.time() < deadline)
+        except BrokerException as e:
+            srv.error(self, e)
+        finally:
+            try:
+                bb.logoff()
+            except BrokerException:
+                pass
+            if not registered:
+                srv.ready.release()     # do not block start()
+
+    def serve(self, conv_id, running):
+        srv = self.server
+        bb = self.broker
+        while running():
+            bb.receive_length = len(bb.receive_buffer)
+            bb.option = 0
+            try:
+                if bb.receive(conv_id=conv_id, wait=srv.wait) is TIMEDOUT:
+                    continue
+            except BrokerConversationError:
+                continue                # partner ended conversation
+            t0 = time.time()
+            self.handle(bb.receive_buffer[0:bb.return_length])
+            self.busy += time.time() - t0
+
+    def handle(self, request):
+        bb = self.broker
+        context = RequestContext(self)
+        self.requests += 1
+        try:
+            reply = self.server.handler(request, context)
+        except Exception as e:
+            self.errors += 1
+            self.server.error(self, e)
+            if context.conv_stat != CONVSTAT_NONE:
+                bb.conv_id = context.conv_id
+                try:
+                    bb.endConversation(option=OPT_CANCEL)
+                except BrokerException:
+                    pass
+            return
+        try:
+            if reply is None:
+                if context.eoc:
+                    bb.conv_id = context.conv_id
+                    bb.endConversation()
+                return
+            bb.conv_id = context.conv_id
+            bb.option = OPT_EOC if context.eoc else 0
+            bb.wait = 'NO'
+            bb.receive_length = 0
+            bb.send(payload=reply)
+        except BrokerException as e:
+            # e.g. client ended the conversation: next request
+            self.errors += 1
+            self.server.error(self, e)
+
+    def utilization(self):
+        """Return share of time spent in the handler since start"""
+        elapsed = time.time() - self.started if self.started else 0
+        return self.busy / elapsed if elapsed > 0 else 0.
+
+
+class BrokerServer(object):
+    """Multi-threaded server for one Broker service
+
+    :param handler: function(request, context) returning reply bytes
+        or None
+    :param broker_id: Broker id
+    :param user_id: user id of the server
+    :param server_class: class of the service
+    :param server_name: server name of the service
+    :param service: service name
+    :param workers: number of worker threads
+    :param wait: receive wait time of the workers, stop() takes
+        effect after this time at most
+    :param drain: seconds to continue existing conversations after
+        deregistering with QUIESCE on stop()
+    :param password: password for logon
+    :param onerror: function(worker, exception) called for handler
+        and Broker errors, default prints the traceback
+    :param kw: further Broker parameters e.g. receive_length, transport,
+        raise_timeout is always False for the workers
+    """
+    def __init__(self, handler, broker_id='localhost', user_id='monty',
+                 server_class='', server_name='', service='', workers=4,
+                 wait='1S', drain=5., password=None, onerror=None, **kw):
+        self.handler = handler
+        self.broker_id = broker_id
+        self.user_id = user_id
+        self.server_class = server_class
+        self.server_name = server_name
+        self.service = service
+        self.nworkers = workers
+        self.wait = wait
+        self.drain = drain
+        self.password = password
+        self.onerror = onerror
+        self.kw = kw
+        self.workers = []
+        self.stopping = False
+        self.ready = threading.Semaphore(0)
+
+    def error(self, worker, e):
+        if self.onerror:
+            self.onerror(worker, e)
+        else:
+            traceback.print_exc()
+
+    def start(self):
+        """Start the worker threads and wait until they are registered"""
+        self.stopping = False
+        self.workers = [Worker(self, i) for i in range(self.nworkers)]
+        for w in self.workers:
+            w.start()
+        for w in self.workers:
+            self.ready.acquire()
+
+    def stop(self, timeout=None):
+        """Stop the workers: deregister with QUIESCE, finish existing
+        conversations within drain seconds and logoff"""
+        self.stopping = True
+        for w in self.workers:
+            w.join(timeout)
+
+    def serve_forever(self):
+        """Start the server and wait until interrupted"""
+        self.start()
+        try:
+            while any(w.is_alive() for w in self.workers):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        self.stop()
+
+    def stats(self):
+        """Return list of dict per worker with requests, errors, busy
+        seconds and utilization"""
+        return [dict(worker=w.name, requests=w.requests, errors=w.errors,
+                     busy=w.busy, utilization=w.utilization())
+                for w in self.workers]
+
+
+def _child(slot, handler, kw, threads, stop, counters):
+    """Main function of a PreforkServer child process"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)    # supervisor stops us
+    lock = threading.Lock()
+    base = slot * 3     # requests, errors, busy seconds
+
+    def counted(request, context):
+        t0 = time.time()
+        failed = 1
+        try:
+            reply = handler(request, context)
+            failed = 0
+            return reply
+        finally:
+            with lock:
+                counters[base] += 1
+                counters[base+1] += failed
+                counters[base+2] += time.time() - t0
+
+    srv = BrokerServer(counted, workers=threads, **kw)
+    srv.start()
+    while not stop.value:
+        if not any(w.is_alive() for w in srv.workers):
+            sys.exit(1)     # all workers failed: let supervisor restart
+        time.sleep(0.2)
+    srv.stop()
+
+
+class PreforkServer(object):
+    """Multi-process server for one Broker service
+
+    A supervisor starts processes child processes, each running a
+    BrokerServer with threads workers. The Broker stub is loaded by
+    each child with its first Broker call. Children that end while
+    the server is running are restarted. On stop() each child
+    deregisters with QUIESCE and finishes existing conversations.
+
+    Requests, errors and busy seconds of the children are counted
+    in shared memory per child slot, including the counts of earlier
+    children in the slot that were restarted, see stats().
+
+    With the multiprocessing spawn start method (Windows) the handler
+    must be a module level function.
+
+    :param handler: function(request, context) returning reply bytes
+        or None (see BrokerServer)
+    :param processes: number of child processes
+    :param threads: number of worker threads per child process
+    :param restart_delay: minimum seconds between starts of a child
+    :param kw: BrokerServer parameters e.g. broker_id, user_id,
+        server_class, server_name, service, wait, drain
+
+    :ivar restarts: number of restarted children
+    """
+    def __init__(self, handler, processes=4, threads=1, restart_delay=1., **kw):
+        self.handler = handler
+        self.nprocesses = processes
+        self.threads = threads
+        self.restart_delay = restart_delay
+        self.kw = kw
+        self.children = [None] * processes
+        self.started = [0.] * processes
+        self.restarts = 0
+        self.stopping = False
+        # shared flag instead of an Event that a killed child may block
+        self.stop_flag = multiprocessing.Value('b', 0, lock=False)
+        self.counters = multiprocessing.Array('d', 3 * processes, lock=False)
+
+    def spawn(self, slot):
+        p = multiprocessing.Process(target=_child,
+            name='%s-%d' % (self.kw.get('service', 'server'), slot),
+            args=(slot, self.handler, self.kw, self.threads,
+                  self.stop_flag, self.counters))
+        p.daemon = False
+        p.start()
+        self.children[slot] = p
+        self.started[slot] = time.time()
+
+    def start(self):
+        """Start the child processes"""
+        self.stopping = False
+        self.stop_flag.value = 0
+        for slot in range(self.nprocesses):
+            self.spawn(slot)
+
+    def supervise(self):
+        """Restart ended child processes, call periodically"""
+        for slot, p in enumerate(self.children):
+            if self.stopping or p.is_alive():
+                continue
+            if time.time() - self.started[slot] >= self.restart_delay:
+                p.join()
+                self.restarts += 1
+                self.spawn(slot)
+
+    def stop(self, timeout=None):
+        """Stop the children: deregister with QUIESCE, finish existing
+        conversations and logoff"""
+        self.stopping = True
+        self.stop_flag.value = 1
+        for p in self.children:
+            if p is not None:
+                p.join(timeout)
+
+    def serve_forever(self, interval=1.):
+        """Start the server and supervise the children until interrupted"""
+        self.start()
+        try:
+            while True:
+                time.sleep(interval)
+                self.supervise()
+        except KeyboardInterrupt:
+            pass
+        self.stop()
+
+    def stats(self):
+        """Return list of dict per child process with requests, errors
+        and busy seconds, followed by a dict with the totals"""
+        c = self.counters[:]
+        children = [dict(process=p.name if p else '', pid=p.pid if p else 0,
+                         alive=bool(p and p.is_alive()),
+                         requests=int(c[3*i]), errors=int(c[3*i+1]), busy=c[3*i+2])
+                    for i, p in enumerate(self.children)]
+        total = dict(process='total', restarts=self.restarts,
+                     requests=sum(d['requests'] for d in children),
+                     errors=sum(d['errors'] for d in children),
+                     busy=sum(d['busy'] for d in children))
+        return children + [total]
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
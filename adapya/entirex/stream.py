@@ -0,0 +1,183 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""stream.py sends and receives large data as messages of one UOW
+
+Data larger than the kernel MAX-MSG or the receive buffer of the
+partner cannot be sent as one message. send_stream() splits bytes-like
+data or a file-like object into chunks sent as the messages of one
+unit of work (UOW). receive_stream() returns a generator of the chunks
+as they are received, ending with the message of uowStatus RECV_LAST
+or RECV_ONLY. On both sides only one or two chunks are held in memory::
+
+    >>> from adapya.entirex.stream import send_stream, receive_stream
+    >>> with open('extract.dat', 'rb') as f:                    # client
+    ...     send_stream(bb, f, conv_id='NEW', chunk_size=65536)
+
+    >>> with open('copy.dat', 'wb') as f:                       # server
+    ...     for chunk in receive_stream(srv, conv_id='ANY', wait='60S'):
+    ...         f.write(chunk)
+
+The receiving Broker instance needs a receive buffer of chunk_size
+bytes or should be created with adaptive=True.
+"""
+from __future__ import print_function          # PY3
+
+from adapya.entirex.broker import BrokerException, BrokerTimeOut, \
+    TIMEDOUT, OPT_COMMIT, OPT_SYNC, RECV_FIRST, RECV_MIDDLE
+
+CHUNK_SIZE = 32768      # default if MAX-MSG of the kernel is not known
+
+
+def _chunks(source, size):
+    """Generator of (chunk, last) of bytes-like or file-like source
+
+    Chunks of bytes-like objects are memoryview slices without copying.
+    File-like objects are read alternately into two buffers so that
+    the end of data is known when a chunk is returned.
+    """
+    if hasattr(source, 'read'):
+        readinto = getattr(source, 'readinto', None)
+        if readinto is None:
+            def readinto(b):
+                data = source.read(len(b))
+                b[:len(data)] = data
+                return len(data)
+
+        def fill(buf):      # read until buffer full or end of data
+            m = memoryview(buf)
+            n = 0
+            while n < size:
+                k = readinto(m[n:])
+                if not k:
+                    break
+                n += k
+            return n
+
+        bufs = [bytearray(size), bytearray(size)]
+        n = fill(bufs[0])
+        i = 0
+        while True:
+            m = fill(bufs[1-i]) if n == size else 0
+            yield memoryview(bufs[i])[:n], m == 0
+            if m == 0:
+                return
+            i, n = 1-i, m
+    else:
+        data = memoryview(source)
+        if data.ndim != 1 or data.format != 'B':
+            data = data.cast('B')
+        total = len(data)
+        for i in range(0, max(total, 1), size):
+            yield data[i:i+size], i+size >= total
+
+
+def send_stream(bb, source, conv_id='', chunk_size=None):
+    """Send data as the messages of one UOW committed with the last one
+
+    :param bb: Broker instance with the service set
+    :param source: bytes-like object or file-like object with read()
+        or readinto() opened in binary mode
+    :param conv_id: conversation, e.g. 'NEW', '' keeps the current one
+    :param chunk_size: maximum message size, default MAX-MSG of the
+        kernel if known by Broker.kernelVersion() else CHUNK_SIZE
+    :returns: number of bytes sent, the UOW is backed out if sending
+        or reading the source fails
+    """
+    maxmsg = getattr(bb, 'maxmsg', 0)
+    if chunk_size is None:
+        chunk_size = maxmsg or CHUNK_SIZE
+    elif maxmsg:
+        chunk_size = min(chunk_size, maxmsg)
+    bb.wait = 'NO'
+    bb.receive_length = 0
+    total = 0
+    uowid = None        # UOW open after first message
+    try:
+        for chunk, last in _chunks(source, chunk_size):
+            bb.option = OPT_COMMIT if last else OPT_SYNC
+            bb.send(conv_id=conv_id, payload=chunk)
+            conv_id = bb.conv_id
+            uowid = None if last else bb.uowID
+            total += len(chunk)
+    except:
+        if uowid is not None:
+            bb.conv_id, bb.uowID = conv_id, uowid
+            try:
+                bb.backout()
+            except BrokerException:
+                pass
+        raise
+    return total
+
+
+def receive_stream(bb, conv_id='', wait='', commit=True):
+    """Generator of the messages of the next UOW as bytes
+
+    The first message is received with conv_id, the following ones on
+    its conversation. With commit the UOW is committed after the last
+    chunk has been processed and backed out if the iteration is ended
+    early e.g. by an exception.
+
+    :param bb: Broker instance, for servers with the service registered
+    :param conv_id: 'ANY', 'NEW', 'OLD' or conversation id
+    :param wait: wait time for each message
+    :returns: generator, which raises BrokerTimeOut or returns no
+        chunk on timeout of the first message if raise_timeout is False.
+        A timeout of a later message always raises BrokerTimeOut.
+    """
+    bb.receive_length = len(bb.receive_buffer)
+    bb.option = 0
+    if bb.receive(conv_id=conv_id, wait=wait) is TIMEDOUT:
+        return
+    conv_id, uowid = bb.conv_id, bb.uowID
+    done = False
+    try:
+        while True:
+            more = bb.uowStatus in (RECV_FIRST, RECV_MIDDLE)
+            yield bytes(bb.receive_buffer[0:bb.return_length])
+            if not more:
+                break
+            bb.receive_length = len(bb.receive_buffer)
+            bb.option = 0
+            if bb.receive(conv_id=conv_id, wait=wait) is TIMEDOUT:
+                raise BrokerTimeOut('Wait timeout within unit of work %s' %
+                                    uowid, bb)
+        done = True
+    finally:
+        if commit and uowid.strip():
+            bb.conv_id, bb.uowID = conv_id, uowid
+            if done:
+                bb.commit()
+            else:
+                bb.backout()
+
+
+def receive_file(bb, f, conv_id='', wait='', commit=True):
+    """Receive the messages of the next UOW and write them to the
+    file-like object f
+
+    :returns: number of bytes written
+    """
+    total = 0
+    for chunk in receive_stream(bb, conv_id=conv_id, wait=wait, commit=commit):
+        f.write(chunk)
+        total += len(chunk)
+    return total
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
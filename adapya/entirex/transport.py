@@ -0,0 +1,165 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""transport.py defines exchangeable transports for the Broker calls
+
+A transport is any object with the method of the EntireX Broker stub::
+
+    broker(etbcb, send_buffer, receive_buffer, errtext_buffer)
+
+returning the stub return code. Etbcb.call() uses the transport of its
+instance or, if none is set, the module stub (see broker.load_stub()).
+Transports can be selected per Broker or Cis instance::
+
+    >>> from adapya.entirex.broker import Broker
+    >>> from adapya.entirex.emulator import BrokerEmulator
+    >>> from adapya.entirex.transport import LatencyTransport
+    >>> emu = BrokerEmulator()
+    >>> bb = Broker(user_id='TEST', transport=LatencyTransport(emu, 0.002))
+
+Available transports:
+
+- StubTransport:      calls the broker() function of a loaded stub library
+- BrokerEmulator:     in-process emulation (adapya.entirex.emulator)
+- RecordingTransport: records all calls made through another transport
+- ReplayTransport:    replays calls recorded by a RecordingTransport
+- LatencyTransport:   delays all calls made through another transport
+"""
+from __future__ import print_function          # PY3
+
+import ctypes
+import pickle
+import random
+import time
+
+from adapya.entirex.broker import etbcb_codec, function_str, load_library
+
+_getters = etbcb_codec.getters
+
+
+class TransportError(Exception):
+    """Transport did not behave as expected e.g. replay out of sequence"""
+    pass
+
+
+class StubTransport(object):
+    """Transport calling the broker() function of the EntireX Broker stub
+
+    :param library: ctypes library handle of the Broker stub or
+                    path of the stub library to be loaded on first call
+    """
+    def __init__(self, library):
+        self.library = library
+
+    def broker(self, etbcb, send, receive, errtext):
+        if isinstance(self.library, str):
+            self.library = load_library(self.library)
+        return self.library.broker(etbcb, send, receive, errtext)
+
+
+class RecordingTransport(object):
+    """Transport recording the calls made through another transport
+
+    Each call is appended to the list records as tuple::
+
+        (etbcb_before, send_data, etbcb_after, receive_data, errtext, rc)
+
+    :param transport: transport performing the calls
+    """
+    def __init__(self, transport):
+        self.transport = transport
+        self.records = []
+
+    def broker(self, etbcb, send, receive, errtext):
+        before = etbcb[:]
+        slen = _getters['send_length'](etbcb)
+        sdata = bytes(send[:slen]) if send is not None and slen else b''
+
+        rc = self.transport.broker(etbcb, send, receive, errtext)
+
+        rlen = _getters['return_length'](etbcb)
+        if receive is not None:
+            rdata = bytes(receive[:min(rlen, len(receive))])
+        else:
+            rdata = b''
+        etext = errtext[:] if errtext is not None else b''
+        self.records.append((before, sdata, etbcb[:], rdata, etext, rc))
+        return rc
+
+    def save(self, filename):
+        """Write the records to file"""
+        with open(filename, 'wb') as f:
+            pickle.dump(self.records, f, protocol=2)
+
+
+class ReplayTransport(object):
+    """Transport replaying the calls recorded by a RecordingTransport
+
+    The Broker control block, receive and error text buffers are set
+    from the recorded call. A TransportError is raised if the
+    function called differs from the recorded one.
+
+    :param records: list of records or name of file written by
+                    RecordingTransport.save()
+    """
+    def __init__(self, records):
+        if not isinstance(records, list):
+            with open(records, 'rb') as f:
+                records = pickle.load(f)
+        self.records = records
+        self.pos = 0
+
+    def broker(self, etbcb, send, receive, errtext):
+        if self.pos >= len(self.records):
+            raise TransportError('No more recorded Broker calls (%d)' % self.pos)
+        before, sdata, after, rdata, etext, rc = self.records[self.pos]
+        function = _getters['function']
+        if function(etbcb) != function(before):
+            raise TransportError('Broker call %d: function %s expected, got %s' % (
+                self.pos, function_str(function(before)),
+                function_str(function(etbcb))))
+        self.pos += 1
+        ctypes.memmove(etbcb, after, min(len(after), len(etbcb)))
+        if rdata and receive is not None:
+            ctypes.memmove(receive, rdata, min(len(rdata), len(receive)))
+        if etext and errtext is not None:
+            ctypes.memmove(errtext, etext, min(len(etext), len(errtext)))
+        return rc
+
+
+class LatencyTransport(object):
+    """Transport delaying each call made through another transport
+
+    :param transport: transport performing the calls
+    :param latency: delay in seconds added before each call
+    :param jitter: maximum random delay in seconds added to latency
+    """
+    def __init__(self, transport, latency=0.001, jitter=0.0):
+        self.transport = transport
+        self.latency = latency
+        self.jitter = jitter
+
+    def broker(self, etbcb, send, receive, errtext):
+        delay = self.latency
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        return self.transport.broker(etbcb, send, receive, errtext)
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,399 @@
+#! /usr/bin/env python
+# -*- coding: latin1 -*-
+
+"""uow.py provides producers and consumers of persistent units of work
+
+UowProducer collects messages into units of work (UOW) and commits a
+UOW when it reaches a number of messages or bytes or has been open
+for a linger time. The cost of the syncpoint is shared by all messages
+of the UOW. A UOW reaching a size limit is committed with its last
+message (send option COMMIT) without a separate SYNCPOINT call::
+
+    >>> from adapya.entirex.broker import Broker
+    >>> from adapya.entirex.uow import UowProducer
+    >>> bb = Broker('localhost:1971', 'LOADER')
+    >>> bb.logon()
+    >>> with UowProducer(bb, ('ACLASS', 'ASERVER', 'ASERVICE'),
+    ...                  max_messages=500, linger=0.5) as prod:
+    ...     for record in records:
+    ...         prod.send(record)
+    >>> prod.stats()['commit_avg']
+
+UowConsumer receives all messages of a UOW as one batch and commits or
+backs out the UOW after processing (at least once delivery). With two
+or more Broker instances the next UOW is received on another instance
+while the current one is processed::
+
+    >>> from adapya.entirex.uow import UowConsumer
+    >>> brokers = [Broker('localhost:1971', 'CONSUMER', token='T%d' % i)
+    ...            for i in range(2)]
+    >>> for bb in brokers: bb.logon()
+    >>> cons = UowConsumer(brokers, ('ACLASS', 'ASERVER', 'ASERVICE'))
+    >>> for batch in cons.batches(until_idle=True):
+    ...     store(batch.messages)       # committed when the next is requested
+"""
+from __future__ import print_function          # PY3
+
+import threading
+import time
+try:
+    import queue                # PY3
+except ImportError:
+    import Queue as queue
+
+from adapya.entirex.broker import BrokerConversationError, BrokerException, \
+    BrokerTimeOut, TIMEDOUT
+from adapya.entirex.scm import ScmProducer
+
+
+def _size(payload):
+    """Return size of payload in bytes"""
+    return len(payload) if isinstance(payload, bytes) \
+        else memoryview(payload).nbytes
+
+
+class UowProducer(ScmProducer):
+    """Client sending messages in units of work committed by thresholds
+
+    The UOWs are sent on one conversation (see ScmProducer). The linger
+    time is checked with each send() and with poll(), which should be
+    called periodically if messages arrive irregularly.
+
+    :param broker: logged on Broker instance used only by the producer
+    :param service: tuple (server_class, server_name, service)
+    :param max_messages: maximum number of messages in a UOW
+    :param max_bytes: maximum number of bytes in a UOW, a single
+        larger message is sent in its own UOW
+    :param linger: seconds after the first message of a UOW after
+        which the UOW is committed, None for no time limit
+    :param maxuowmsg: maximum number of messages in a UOW configured
+        for the service (MAX-MESSAGES-IN-UOW), None reads it from the
+        Broker information service (CIS), 0 for no limit
+    :param negotiate: if True use ACI version 10 (see ScmProducer)
+    """
+    def __init__(self, broker, service, max_messages=100, max_bytes=1048576,
+                 linger=1., maxuowmsg=None, negotiate=False):
+        ScmProducer.__init__(self, broker, service, negotiate=negotiate)
+        if maxuowmsg is None:
+            maxuowmsg = self.read_maxuowmsg()
+        if maxuowmsg:
+            max_messages = min(max_messages, maxuowmsg)
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.linger = linger
+        self.maxuowmsg = maxuowmsg
+        self.bytes = 0          # bytes in current UOW
+        self.started = 0.       # time of first message in current UOW
+        self.totalbytes = 0
+        self.commits = 0        # number of commit latencies measured
+        self.commit_sum = 0.
+        self.commit_max = 0.
+        self.commit_last = 0.
+
+    def read_maxuowmsg(self):
+        """Return maximum messages per UOW of the service from CIS
+        or 0 if the service is not found"""
+        from adapya.entirex.cmdinfo import Cis
+        bb = self.broker
+        cis = Cis(broker=bb.broker_id, user=bb.user_id, transport=bb.transport)
+        info = cis.iservice(*self.service)
+        return info.maxuowmsg if info is not None else 0
+
+    def _latency(self, t0):
+        t = time.time() - t0
+        self.commits += 1
+        self.commit_sum += t
+        self.commit_last = t
+        self.commit_max = max(self.commit_max, t)
+
+    def _committed(self):
+        ScmProducer._committed(self)
+        self.totalbytes += self.bytes
+        self.bytes = 0
+
+    def send(self, payload, commit=False):
+        """Add message to the current UOW and commit the UOW if
+        a threshold is reached
+
+        :param payload: message, bytes or buffer object
+        :param commit: if True commit the UOW with this message
+        """
+        size = _size(payload)
+        if self.pending and self.bytes + size > self.max_bytes:
+            self.commit()       # message does not fit into current UOW
+        if not self.pending:
+            self.started = time.time()
+        last = commit or self.pending + 1 >= self.max_messages or \
+            self.bytes + size >= self.max_bytes
+        self.bytes += size
+        t0 = time.time()
+        ScmProducer.send(self, payload, commit=last)
+        if last:
+            self._latency(t0)
+        else:
+            self.poll()
+
+    def commit(self):
+        """Commit the current UOW (flush)"""
+        if not self.pending:
+            return
+        t0 = time.time()
+        ScmProducer.commit(self)
+        self._latency(t0)
+
+    flush = commit
+
+    def backout(self):
+        ScmProducer.backout(self)
+        self.bytes = 0
+
+    def poll(self):
+        """Commit the current UOW if its linger time has passed"""
+        if self.pending and self.linger is not None and \
+                time.time() - self.started >= self.linger:
+            self.commit()
+
+    def close(self):
+        """Commit the current UOW and end the conversation"""
+        self.commit()
+        ScmProducer.close(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        if type is None:
+            self.close()
+        else:
+            ScmProducer.close(self)     # backout
+
+    def stats(self):
+        """Return dict with the numbers of UOWs, messages and bytes
+        committed and the average, maximum and last commit latency
+        in seconds"""
+        return dict(uows=self.uows, messages=self.messages,
+                    bytes=self.totalbytes, pending=self.pending,
+                    commit_avg=self.commit_sum / self.commits if self.commits else 0.,
+                    commit_max=self.commit_max, commit_last=self.commit_last)
+
+
+class UowBatch(object):
+    """Messages of a UOW received by a UowConsumer
+
+    :ivar messages: list of messages as bytes
+    :ivar conv_id: conversation of the UOW
+    :ivar uowID: id of the UOW
+    :ivar handle: number of the Broker instance that received the UOW
+    :ivar done: True after commit() or backout()
+    """
+    def __init__(self, consumer, handle, conv_id, uowID, messages):
+        self.consumer = consumer
+        self.handle = handle
+        self.conv_id = conv_id
+        self.uowID = uowID
+        self.messages = messages
+        self.done = False
+
+    def _syncpoint(self, commit):
+        if self.done:
+            return
+        bb = self.consumer.brokers[self.handle]
+        bb.conv_id = self.conv_id
+        bb.uowID = self.uowID
+        try:
+            if commit:
+                bb.commit()
+            else:
+                bb.backout()
+        finally:
+            self.done = True
+            self.consumer.next(self, commit)
+
+    def commit(self):
+        """Commit the UOW as processed"""
+        self._syncpoint(True)
+
+    def backout(self):
+        """Backout the UOW to have it delivered again"""
+        self._syncpoint(False)
+
+
+class UowConsumer(object):
+    """Server receiving units of work in batches of all their messages
+
+    Each Broker instance receives in its own thread: it receives a UOW,
+    passes it to the iterating thread and waits until the UOW has been
+    committed or backed out before it receives the next one. With
+    several instances the UOWs are not processed in strict order.
+
+    :param brokers: list of logged on Broker instances used only by
+        the consumer
+    :param service: tuple (server_class, server_name, service)
+    :param wait: receive wait time, stop() takes effect after this time
+    :param register: if True register the service with all instances
+        and deregister it on stop()
+    """
+    def __init__(self, brokers, service, wait='1S', register=True):
+        self.brokers = brokers
+        self.service = service
+        self.wait = wait
+        self.register = register
+        self.queue = queue.Queue()
+        self.go = [threading.Event() for bb in brokers]
+        self.threads = []
+        self.stopping = False
+        self.until_idle = False
+        self.uows = 0
+        self.messages = 0
+        self.backouts = 0
+
+    def next(self, batch, committed):
+        """Count the processed batch and let its instance receive again"""
+        if committed:
+            self.uows += 1
+            self.messages += len(batch.messages)
+        else:
+            self.backouts += 1
+        self.go[batch.handle].set()
+
+    def _receiver(self, i):
+        bb, go = self.brokers[i], self.go[i]
+        while not self.stopping:
+            bb.option = 0
+            try:
+                messages = bb.receiveUow(conv_id='ANY', wait=self.wait)
+            except BrokerConversationError:
+                continue                # client ended conversation
+            except BrokerTimeOut:
+                messages = TIMEDOUT     # partial UOW backed out
+            except BrokerException as e:
+                self.queue.put((i, e))
+                return
+            if messages is TIMEDOUT:
+                if not self.until_idle:
+                    continue
+                item = TIMEDOUT
+            else:
+                item = UowBatch(self, i, bb.conv_id, bb.uowID, messages)
+            go.clear()
+            self.queue.put((i, item))
+            go.wait()
+
+    def start(self):
+        """Register the service and start the receiving threads"""
+        self.stopping = False
+        if self.register:
+            for bb in self.brokers:
+                bb.server_class, bb.server_name, bb.service = self.service
+                bb.register()
+        self.threads = [threading.Thread(target=self._receiver, args=(i,),
+                                         name='UowConsumer-%d' % i)
+                        for i in range(len(self.brokers))]
+        for t in self.threads:
+            t.daemon = True
+            t.start()
+
+    def stop(self):
+        """Stop the receiving threads, backout UOWs received but not
+        processed and deregister the service"""
+        self.stopping = True
+        for i, t in enumerate(self.threads):
+            while t.is_alive():
+                self.go[i].set()    # also if cleared after receive
+                t.join(0.1)
+        self.threads = []
+        while True:
+            try:
+                i, item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, UowBatch):
+                item.backout()
+        if self.register:
+            for bb in self.brokers:
+                bb.server_class, bb.server_name, bb.service = self.service
+                try:
+                    bb.deregister()
+                except BrokerException:
+                    pass
+
+    def batches(self, until_idle=False):
+        """Generator of UowBatch objects
+
+        A batch neither committed nor backed out by the caller is
+        committed when the next batch is requested and backed out
+        when the iteration is ended by break or an exception.
+
+        :param until_idle: if True end the iteration when all
+            instances had a receive timeout without receiving a UOW,
+            e.g. when a backlog is drained
+        """
+        self.until_idle = until_idle
+        self.start()
+        idle = set()
+        batch = None
+        try:
+            while True:
+                i, item = self.queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                if item is TIMEDOUT:
+                    idle.add(i)
+                    if len(idle) == len(self.brokers):
+                        return
+                    self.go[i].set()
+                    continue
+                idle.discard(i)
+                batch = item
+                yield batch
+                batch.commit()
+        finally:
+            if batch is not None and not batch.done:
+                batch.backout()
+            self.stop()
+
+    __iter__ = batches
+
+    def serve(self, handler, count=None, until_idle=False):
+        """Pass the messages of each UOW to handler
+
+        A UOW is committed when handler returns and backed out if
+        handler raises an exception, which ends serve().
+
+        :param handler: function(messages) with the list of messages
+        :param count: number of UOWs to process, None without limit
+        """
+        n = 0
+        batches = self.batches(until_idle=until_idle)
+        try:
+            for batch in batches:
+                handler(batch.messages)
+                batch.commit()
+                n += 1
+                if count is not None and n >= count:
+                    break
+        finally:
+            batches.close()     # backout on exception, stop
+
+    def stats(self):
+        """Return dict with numbers of UOWs and messages committed and
+        of UOWs backed out"""
+        return dict(uows=self.uows, messages=self.messages,
+                    backouts=self.backouts)
+
+
+__version__ = '1.3.0'
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,46 @@
+# -*- coding: latin1 -*-
+
+"""faults.py provides a transport injecting Broker errors into the
+calls of a BrokerEmulator for the tests"""
+from __future__ import print_function          # PY3
+
+from adapya.entirex.broker import etbcb_codec
+
+
+class FaultTransport(object):
+    """Transport passing the calls to transport, selected calls of a
+    function fail with an error code instead
+
+    :param transport: transport e.g. BrokerEmulator
+
+    :ivar calls: dict function: number of calls
+    """
+    def __init__(self, transport):
+        self.transport = transport
+        self.faults = {}        # (function, call number): error code
+        self.after = {}         # (function, call number): error code
+        self.calls = {}
+
+    def fail(self, function, n, code='00740074'):
+        """Let call n (counting from 1) of function fail with code
+        without passing it to the transport"""
+        self.faults[(function, self.calls.get(function, 0) + n)] = code
+
+    def fail_after(self, function, n, code='02150373'):
+        """Let call n of function return code after it was performed
+        by the transport"""
+        self.after[(function, self.calls.get(function, 0) + n)] = code
+
+    def broker(self, etbcb, send, receive, errtext):
+        start, size = etbcb_codec.fields['function']
+        function = bytearray(etbcb[start:start+1])[0]
+        n = self.calls[function] = self.calls.get(function, 0) + 1
+        code = self.faults.pop((function, n), None)
+        if code is None:
+            rc = self.transport.broker(etbcb, send, receive, errtext)
+            code = self.after.pop((function, n), None)
+            if code is None:
+                return rc
+        start, size = etbcb_codec.fields['error_code']
+        etbcb[start:start+size] = code.encode('latin_1')
+        return 0
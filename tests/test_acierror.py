@@ -0,0 +1,41 @@
+# -*- coding: latin1 -*-
+
+"""Tests of the error registry and flags of acierror"""
+from __future__ import print_function          # PY3
+
+import unittest
+
+from adapya.entirex import acierror
+
+
+class TestFlags(unittest.TestCase):
+
+    def test_class_flags(self):
+        self.assertTrue(acierror.lookup('02150148').retryable)
+        self.assertTrue(acierror.lookup('00080003').fatal)
+
+    def test_class_74(self):
+        # only the wait and UOW conditions of class 0074 are retryable
+        for code in ('00740009', '00740074', '00740300', '00740345'):
+            err = acierror.lookup(code)
+            self.assertTrue(err.transient and err.retryable, code)
+        err = acierror.lookup('00740001')
+        self.assertFalse(err.transient or err.retryable)
+
+
+class TestLookup(unittest.TestCase):
+
+    def test_known(self):
+        self.assertTrue(acierror.lookup('00740074') is
+                        acierror.lookup('00740074'))
+
+    def test_unknown_not_kept(self):
+        n = len(acierror.registry)
+        err = acierror.lookup('09999999')
+        self.assertEqual(err.errclass, 999)
+        self.assertEqual(len(acierror.registry), n)
+        self.assertTrue(acierror.geterror('09999999').startswith(' 09999999'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# -*- coding: latin1 -*-
+
+"""Tests of AsyncBroker against the BrokerEmulator (Python 3.6 or later)"""
+from __future__ import print_function          # PY3
+
+import asyncio
+import sys
+import unittest
+
+from adapya.entirex.aiobroker import AsyncBroker
+from adapya.entirex.emulator import BrokerEmulator
+from adapya.entirex.server import BrokerServer
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'asyncio.run() required')
+class TestAsyncBroker(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = BrokerEmulator()
+        self.servers = [BrokerServer(lambda request, context, s=s:
+                                     s.encode('latin_1') + request,
+                        user_id='SERVER', server_class='TEST',
+                        server_name='ASYNC', service=s, workers=1,
+                        drain=0., transport=self.emu)
+                        for s in ('A', 'B')]
+        for srv in self.servers:
+            srv.start()
+
+    def tearDown(self):
+        for srv in self.servers:
+            srv.stop()
+
+    def test_request(self):
+        async def main():
+            async with AsyncBroker(user_id='CLIENT', transport=self.emu,
+                                   handles=3) as ab:
+                return await asyncio.gather(*[
+                    ab.request(('TEST', 'ASYNC', 'A'), b'%d' % i, wait='5S')
+                    for i in range(10)])
+        self.assertEqual(asyncio.run(main()),
+                         [b'A%d' % i for i in range(10)])
+
+    def test_conversation_handle(self):
+        # requests on other services must not change the service or
+        # the conversations of the conversation handle
+        async def main():
+            async with AsyncBroker(user_id='CLIENT', transport=self.emu,
+                                   handles=2) as ab:
+                m = await ab.send(b'x', service=('TEST', 'ASYNC', 'A'),
+                                  wait='5S')
+                r = await ab.request(('TEST', 'ASYNC', 'B'), b'y', wait='5S')
+                m2 = await ab.send(b'z', conv_id=m.conv_id, wait='5S')
+                m3 = await ab.send(b'w', wait='5S')
+                await ab.endConversation(m.conv_id)
+                await ab.endConversation(m3.conv_id)
+                return m.data, r, m2.data, m2.conv_id == m.conv_id, m3.data
+        self.assertEqual(asyncio.run(main()),
+                         (b'Ax', b'By', b'Az', True, b'Aw'))
+
+    def test_request_handles(self):
+        async def main():
+            async with AsyncBroker(user_id='CLIENT', transport=self.emu,
+                                   handles=2) as ab:
+                free = sorted(ab.free.get_nowait()
+                              for i in range(ab.free.qsize()))
+                return free, ab.conv_logon
+        self.assertEqual(asyncio.run(main()), ([1, 2], False))
+
+
+if __name__ == '__main__':
+    unittest.main()
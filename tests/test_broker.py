@@ -0,0 +1,114 @@
+# -*- coding: latin1 -*-
+
+"""Tests of Broker calls against the BrokerEmulator"""
+from __future__ import print_function          # PY3
+
+import ctypes
+import unittest
+
+from adapya.entirex.broker import Broker, BrokerTimeOut, TIMEDOUT, \
+    FCT_RECEIVE, OPT_COMMIT, OPT_SYNC, _sendbuf
+from adapya.entirex.emulator import BrokerEmulator
+
+from faults import FaultTransport
+
+SERVICE = ('TEST', 'BROKER', 'CALLS')
+
+
+def logon(transport, user_id, **kw):
+    bb = Broker(user_id=user_id, transport=transport, **kw)
+    bb.logon()
+    bb.server_class, bb.server_name, bb.service = SERVICE
+    return bb
+
+
+class TestAdaptive(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = BrokerEmulator(maxmsg=100000)
+        self.srv = logon(self.emu, 'SERVER', receive_length=100, adaptive=True)
+        self.srv.register()
+        self.cl = logon(self.emu, 'CLIENT')
+        self.cl.wait = 'NO'
+
+    def test_grow(self):
+        self.cl.send(conv_id='NEW', payload=b'x' * 3000)
+        self.srv.receive(conv_id='ANY', wait='1S')
+        self.assertEqual(self.srv.return_length, 3000)
+        self.assertTrue(len(self.srv.receive_buffer) >= 3000)
+
+    def test_receive_into_kept(self):
+        # the buffer of receive_into() must not be replaced by adapting
+        buf = bytearray(4096)
+        self.cl.send(conv_id='NEW', payload=b'x' * 3000)
+        m = self.srv.receive_into(buf, conv_id='ANY', wait='1S')
+        self.assertEqual(len(m), 3000)
+        self.assertEqual(bytes(buf[0:3000]), b'x' * 3000)
+        self.assertEqual(len(self.srv.receive_buffer), 100)
+
+
+class TestTimeout(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = BrokerEmulator()
+        self.srv = logon(self.emu, 'SERVER')
+        self.srv.register()
+
+    def test_send_returns_timedout(self):
+        cl = logon(self.emu, 'CLIENT', raise_timeout=False)
+        cl.wait = '1S'
+        self.assertTrue(cl.send(conv_id='NEW', payload=b'x') is TIMEDOUT)
+
+    def test_send_raises(self):
+        cl = logon(self.emu, 'CLIENT')
+        cl.wait = '1S'
+        self.assertRaises(BrokerTimeOut, cl.send, conv_id='NEW', payload=b'x')
+
+
+class TestReceiveUow(unittest.TestCase):
+
+    def setUp(self):
+        emu = BrokerEmulator()
+        self.faults = FaultTransport(emu)
+        self.srv = logon(self.faults, 'SERVER')
+        self.srv.register()
+        cl = logon(emu, 'CLIENT')
+        cl.wait = 'NO'
+        for i, option in enumerate((OPT_SYNC, OPT_SYNC, OPT_COMMIT)):
+            cl.send(conv_id=cl.conv_id if i else 'NEW', option=option,
+                    payload=b'm%d' % i)
+
+    def test_uow(self):
+        self.assertEqual(self.srv.receiveUow(conv_id='ANY', wait='1S'),
+                         [b'm0', b'm1', b'm2'])
+
+    def test_timeout_within_uow(self):
+        # the partial UOW is backed out and delivered again as a whole
+        for raise_timeout in (True, False):
+            self.srv.__dict__['raise_timeout'] = raise_timeout
+            self.faults.fail(FCT_RECEIVE, 2)
+            self.assertRaises(BrokerTimeOut, self.srv.receiveUow,
+                              conv_id='ANY', wait='1S')
+        self.assertEqual(self.srv.receiveUow(conv_id='ANY', wait='1S'),
+                         [b'm0', b'm1', b'm2'])
+
+
+class TestSendbuf(unittest.TestCase):
+
+    def test_readonly_not_copied(self):
+        data = b'0123456789' * 10
+        buf, length = _sendbuf(memoryview(data)[5:15])
+        self.assertEqual(length, 10)
+        self.assertEqual(buf[0:length], b'5678901234')
+        base = ctypes.cast(ctypes.c_char_p(data), ctypes.c_void_p).value
+        self.assertEqual(ctypes.addressof(buf), base + 5)
+
+    def test_writable_not_copied(self):
+        data = bytearray(b'abc')
+        buf, length = _sendbuf(data)
+        data[0:1] = b'x'
+        self.assertEqual(buf[0:length], b'xbc')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: latin1 -*-
+
+"""Tests of the BrokerEmulator with request/reply and conversations"""
+from __future__ import print_function          # PY3
+
+import gc
+import unittest
+
+from adapya.entirex.broker import Broker, BrokerServiceError, TIMEDOUT
+from adapya.entirex.emulator import BrokerEmulator
+from adapya.entirex.server import BrokerServer
+
+SERVICE = ('TEST', 'EMULATOR', 'ECHO')
+
+
+def logon(emu, user_id, **kw):
+    bb = Broker(user_id=user_id, transport=emu, **kw)
+    bb.logon()
+    bb.server_class, bb.server_name, bb.service = SERVICE
+    return bb
+
+
+class TestRequestReply(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = BrokerEmulator()
+        self.srv = BrokerServer(lambda request, context: request.upper(),
+                                user_id='SERVER', server_class='TEST',
+                                server_name='EMULATOR', service='ECHO',
+                                workers=2, drain=0., transport=self.emu)
+        self.srv.start()
+
+    def tearDown(self):
+        self.srv.stop()
+
+    def test_conv_none(self):
+        bb = logon(self.emu, 'CLIENT')
+        bb.wait = '5S'
+        bb.send(conv_id='NONE', payload=b'hello')
+        self.assertEqual(bytes(bb.receive_buffer[0:bb.return_length]),
+                         b'HELLO')
+
+    def test_conversation(self):
+        bb = logon(self.emu, 'CLIENT')
+        bb.wait = '5S'
+        bb.send(conv_id='NEW', payload=b'one')
+        conv_id = bb.conv_id
+        self.assertEqual(bytes(bb.receive_buffer[0:bb.return_length]), b'ONE')
+        bb.send(conv_id=conv_id, payload=b'two')
+        self.assertEqual(bb.conv_id, conv_id)
+        self.assertEqual(bytes(bb.receive_buffer[0:bb.return_length]), b'TWO')
+        bb.endConversation()
+        self.assertEqual(sum(s['requests'] for s in self.srv.stats()), 2)
+
+
+class TestEmulator(unittest.TestCase):
+
+    def test_service_not_registered(self):
+        bb = logon(BrokerEmulator(), 'CLIENT')
+        self.assertRaises(BrokerServiceError, bb.send, conv_id='NONE',
+                          payload=b'x')
+
+    def test_receive_timeout(self):
+        emu = BrokerEmulator()
+        bb = logon(emu, 'SERVER', raise_timeout=False)
+        bb.register()
+        self.assertTrue(bb.receive(conv_id='ANY', wait='1S') is TIMEDOUT)
+
+    def test_freed_control_block(self):
+        # a new control block at the address of a freed one must not
+        # inherit its participant
+        emu = BrokerEmulator()
+        bb = logon(emu, 'OLD')
+        bb.register()
+        svc = emu.services[SERVICE]
+        self.assertEqual(len(svc.servers), 1)
+        del bb
+        gc.collect()
+        new = [logon(emu, 'NEW') for i in range(3)]
+        self.assertEqual(sorted(p.user_id for p in emu.participants.values()),
+                         ['NEW', 'NEW', 'NEW'])
+        self.assertEqual(svc.servers, [])
+        for bb in new:
+            bb.logoff()
+        self.assertEqual(emu.participants, {})
+        self.assertEqual(emu.cbrefs, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+# -*- coding: latin1 -*-
+
+"""Tests of send_file and FileReceiver against the BrokerEmulator"""
+from __future__ import print_function          # PY3
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zlib
+
+from adapya.entirex import filetransfer
+from adapya.entirex.broker import Broker, BrokerException, FCT_SEND
+from adapya.entirex.emulator import BrokerEmulator
+from adapya.entirex.filetransfer import FileReceiver, RECEIVE_LENGTH, \
+    send_file, send_range, _ranges
+
+from faults import FaultTransport
+
+SERVICE = ('TEST', 'FILES', 'TRANSFER')
+
+
+class TestRanges(unittest.TestCase):
+
+    def test_ranges(self):
+        self.assertEqual(_ranges(100, 4, 10),
+                         [(0, 20), (20, 30), (50, 20), (70, 30)])
+        self.assertEqual(_ranges(5, 4, 10), [(0, 5)])
+        self.assertEqual(_ranges(95, 3, 10), [(0, 30), (30, 30), (60, 35)])
+
+
+class TestFileTransfer(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.indir = os.path.join(self.dir, 'in')
+        os.mkdir(self.indir)
+        self.emu = BrokerEmulator(maxmsg=5000)
+        self.faults = FaultTransport(self.emu)
+        self.receivers = [self.logon('RECEIVER', 'R%d' % i, self.faults,
+                                     receive_length=RECEIVE_LENGTH)
+                          for i in range(3)]
+        self.senders = [self.logon('SENDER', 'S%d' % i, self.emu)
+                        for i in range(3)]
+        for bb in self.receivers:
+            bb.server_class, bb.server_name, bb.service = SERVICE
+            bb.register()
+        self.fr = FileReceiver(self.receivers, SERVICE, directory=self.indir,
+                               wait='1S', register=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def logon(self, user_id, token, transport, **kw):
+        bb = Broker(user_id=user_id, token=token, transport=transport, **kw)
+        bb.logon()
+        bb.kernelVersion()
+        return bb
+
+    def serve(self, count):
+        t = threading.Thread(target=self.fr.serve, args=(count,))
+        t.start()
+        return t
+
+    def source(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def received(self, name):
+        with open(os.path.join(self.indir, name), 'rb') as f:
+            return f.read()
+
+    def test_send_file(self):
+        data = os.urandom(123457)
+        path = self.source('data.dat', data)
+        empty = self.source('empty.dat', b'')
+        t = self.serve(3)
+        self.assertEqual(send_file(self.senders, SERVICE, path), len(data))
+        self.assertEqual(send_file(self.senders[0], SERVICE, path,
+                                   name='../one.dat', chunk_size=7000),
+                         len(data))
+        self.assertEqual(send_file(self.senders, SERVICE, empty), 0)
+        t.join()
+        self.assertEqual(self.fr.failed, [])
+        self.assertEqual(len(self.fr.received), 3)
+        self.assertEqual(self.received('data.dat'), data)
+        self.assertEqual(self.received('one.dat'), data)
+        self.assertEqual(self.received('empty.dat'), b'')
+
+    def test_adaptive_receivers(self):
+        for bb in self.receivers:
+            bb.__dict__['adaptive'] = True
+        data = os.urandom(20000)
+        t = self.serve(1)
+        send_file(self.senders, SERVICE, self.source('data.dat', data))
+        t.join()
+        self.assertEqual(self.received('data.dat'), data)
+
+    def test_checksum_mismatch(self):
+        data = bytearray(b'x' * 12000)
+        t = self.serve(1)
+        header = filetransfer._HEADER.pack(filetransfer.MAGIC, len(data), 0,
+            len(data), zlib.crc32(b'other') & 0xffffffff) + b'bad.dat'
+        bb = self.senders[0]
+        bb.server_class, bb.server_name, bb.service = SERVICE
+        bb.option = 0
+        bb.wait = 'NO'
+        bb.receive_length = 0
+        bb.send(conv_id='NEW', payload=header)
+        for i in range(0, len(data), 5000):
+            if i + 5000 >= len(data):
+                bb.wait = '5S'
+                bb.receive_length = len(bb.receive_buffer)
+            bb.send(payload=data[i:i+5000])
+        self.assertEqual(bytes(bb.receive_buffer[0:bb.return_length]),
+                         b'ERROR checksum mismatch')
+        bb.endConversation()
+        t.join()
+        self.assertEqual(self.fr.received, [])
+        self.assertEqual(self.fr.failed, [os.path.join(self.indir, 'bad.dat')])
+
+    def test_invalid_header(self):
+        # the rest of a rejected range is not taken for headers
+        bb = self.senders[0]
+        bb.server_class, bb.server_name, bb.service = SERVICE
+        bb.option = 0
+        bb.wait = 'NO'
+        bb.receive_length = 0
+        bb.send(conv_id='NEW', payload=b'invalid header')
+        for i in range(5):
+            bb.send(payload=b'data %d' % i)
+        t = self.serve(1)
+        send_range(bb, SERVICE, 'ok.dat', bytearray(b'y' * 9000), 9000, 0,
+                   9000)
+        t.join()
+        self.assertEqual(self.fr.received, [os.path.join(self.indir,
+                                                         'ok.dat')])
+        self.assertEqual(self.faults.calls[FCT_SEND], 2)   # ERROR, OK
+
+    def test_name_too_long(self):
+        self.assertRaises(ValueError, send_range, self.senders[0], SERVICE,
+                          'n' * RECEIVE_LENGTH, b'x', 1, 0, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: latin1 -*-
+
+"""Tests of Pipeline against the BrokerEmulator"""
+from __future__ import print_function          # PY3
+
+import threading
+import unittest
+
+from adapya.entirex.broker import Broker, BrokerConversationError, \
+    BrokerTimeOut, TIMEDOUT
+from adapya.entirex.emulator import BrokerEmulator
+from adapya.entirex.pipeline import Pipeline
+
+SERVICE = ('TEST', 'PIPELINE', 'UPPER')
+
+
+class TestPipeline(unittest.TestCase):
+    """The server replies with the request in upper case, ends the
+    conversation after the reply to b'end' and does not reply to
+    b'silent'"""
+
+    def setUp(self):
+        self.emu = BrokerEmulator()
+        self.srv = self.logon('SERVER', raise_timeout=False)
+        self.srv.register()
+        self.stopping = False
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.start()
+
+    def tearDown(self):
+        self.stopping = True
+        self.thread.join()
+
+    def logon(self, user_id, **kw):
+        bb = Broker(user_id=user_id, transport=self.emu, **kw)
+        bb.logon()
+        bb.server_class, bb.server_name, bb.service = SERVICE
+        return bb
+
+    def serve(self):
+        bb = self.srv
+        while not self.stopping:
+            bb.option = 0
+            bb.receive_length = len(bb.receive_buffer)
+            try:
+                if bb.receive(conv_id='ANY', wait='1S') is TIMEDOUT:
+                    continue
+            except BrokerConversationError:
+                continue            # client ended conversation
+            conv_id = bb.conv_id
+            request = bytes(bb.receive_buffer[0:bb.return_length])
+            if request == b'silent':
+                continue
+            bb.wait = 'NO'
+            bb.receive_length = 0
+            bb.send(conv_id=conv_id, payload=request.upper())
+            if request == b'end':
+                bb.conv_id = conv_id
+                bb.endConversation()
+
+    def test_map(self):
+        pl = Pipeline(self.logon('CLIENT'), SERVICE, conversations=4,
+                      wait='5S')
+        payloads = [b'r%d' % i for i in range(20)]
+        self.assertEqual(list(pl.map(payloads)),
+                         [p.upper() for p in payloads])
+        self.assertEqual(len(pl.idle), 4)
+        pl.close()
+
+    def test_idle_conversation_ended(self):
+        # the end of an idle conversation does not fail other replies
+        pl = Pipeline(self.logon('CLIENT'), SERVICE, conversations=3,
+                      wait='5S')
+        replies = [pl.submit(p) for p in (b'a', b'end', b'b')]
+        self.assertEqual([r.result() for r in replies], [b'A', b'END', b'B'])
+        self.assertEqual(pl.submit(b'c').result(), b'C')
+        self.assertEqual(list(pl.map([b'x%d' % i for i in range(6)])),
+                         [b'X%d' % i for i in range(6)])
+        pl.drain()
+        self.assertFalse(replies[1].conv_id in pl.idle)
+        pl.close()
+
+    def test_submit_timeout(self):
+        pl = Pipeline(self.logon('CLIENT', raise_timeout=False), SERVICE,
+                      conversations=1, wait='1S')
+        reply = pl.submit(b'silent')
+        self.assertRaises(BrokerTimeOut, pl.submit, b'x')
+        self.assertTrue(reply.result() is TIMEDOUT)
+        pl.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: latin1 -*-
+
+"""Tests of BrokerPool and ConversationPool against the BrokerEmulator"""
+from __future__ import print_function          # PY3
+
+import unittest
+
+from adapya.entirex.broker import BrokerTimeOut, TIMEDOUT, FCT_VERSION
+from adapya.entirex.emulator import BrokerEmulator
+from adapya.entirex.pool import BrokerPool, ConversationPool
+from adapya.entirex.server import BrokerServer
+
+from faults import FaultTransport
+
+
+class TestBrokerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.faults = FaultTransport(BrokerEmulator())
+
+    def test_reuse(self):
+        pool = BrokerPool(user_id='CLIENT', transport=self.faults, size=2)
+        with pool.broker() as bb:
+            first = bb
+        with pool.broker() as bb:
+            self.assertTrue(bb is first)
+        self.assertEqual(pool.stats()['created'], 1)
+
+    def test_evict_transport_timeout(self):
+        for raise_timeout in (True, False):
+            pool = BrokerPool(user_id='CLIENT', transport=self.faults,
+                              raise_timeout=raise_timeout)
+            try:
+                with pool.broker() as bb:
+                    self.faults.fail_after(FCT_VERSION, 1)
+                    bb.version()
+            except BrokerTimeOut:
+                self.assertTrue(raise_timeout)
+            self.assertEqual(pool.stats()['evicted'], 1)
+            with pool.broker() as bb2:
+                self.assertFalse(bb2 is bb)
+            self.assertEqual(pool.stats()['idle'], 1)
+            pool.close()
+
+
+class TestConversationPool(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = BrokerEmulator()
+        self.srv = BrokerServer(self.handle, user_id='SERVER',
+                                server_class='TEST', server_name='POOL',
+                                service='ECHO', workers=2, drain=0.,
+                                transport=self.emu)
+        self.srv.start()
+
+    def tearDown(self):
+        self.srv.stop()
+
+    def handle(self, request, context):
+        if request != b'silent':
+            return request.upper()
+
+    def test_request(self):
+        pool = BrokerPool(user_id='CLIENT', transport=self.emu)
+        convs = ConversationPool(pool, ('TEST', 'POOL', 'ECHO'), wait='5S',
+                                 conv_nonact=0)
+        self.assertEqual([convs.request(b'r%d' % i) for i in range(3)],
+                         [b'R0', b'R1', b'R2'])
+        stats = convs.stats()
+        self.assertEqual((stats['opened'], stats['reused'], stats['idle']),
+                         (1, 2, 1))
+        convs.close()
+
+    def test_timeout(self):
+        pool = BrokerPool(user_id='CLIENT', transport=self.emu,
+                          raise_timeout=False)
+        convs = ConversationPool(pool, ('TEST', 'POOL', 'ECHO'), wait='1S',
+                                 conv_nonact=0)
+        self.assertTrue(convs.request(b'silent') is TIMEDOUT)
+        self.assertEqual(convs.stats()['idle'], 0)
+        self.assertEqual(convs.request(b'x'), b'X')
+        convs.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
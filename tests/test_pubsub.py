@@ -0,0 +1,70 @@
+# -*- coding: latin1 -*-
+
+"""Tests of Publisher and Subscriber against the BrokerEmulator"""
+from __future__ import print_function          # PY3
+
+import unittest
+
+from adapya.entirex.broker import Broker, BrokerTimeOut, TIMEDOUT, \
+    FCT_RECVPUBLICATION
+from adapya.entirex.emulator import BrokerEmulator
+from adapya.entirex.pubsub import Publisher, Subscriber
+
+from faults import FaultTransport
+
+
+class TestPubSub(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = BrokerEmulator()
+        self.faults = FaultTransport(self.emu)
+        bb = Broker(user_id='SUBSCRIBER', transport=self.faults)
+        bb.logon()
+        self.sub = Subscriber(bb, 'NEWS', wait='0')
+        self.sub.subscribe()
+        self.pub = Broker(user_id='PUBLISHER', transport=self.emu)
+        self.pub.logon()
+
+    def publish(self, messages, max_messages=1):
+        with Publisher(self.pub, max_messages=max_messages) as pub:
+            for m in messages:
+                pub.publish('NEWS', m)
+
+    def test_publications(self):
+        self.publish([b'm%d' % i for i in range(7)], max_messages=3)
+        got = [p.messages for p in self.sub.publications(until_idle=True)]
+        self.assertEqual(got, [[b'm0', b'm1', b'm2'], [b'm3', b'm4', b'm5'],
+                               [b'm6']])
+        self.assertEqual(self.sub.acked, 3)
+
+    def test_ack_and_backout(self):
+        # each publicationID is acknowledged or backed out by itself
+        self.publish([b'x0', b'x1', b'x2'])
+        a = self.sub.receive()
+        b = self.sub.receive()
+        self.sub.processed(a)
+        self.sub.backout(b)
+        self.sub.ack()
+        self.assertEqual(len(self.sub.inflight), 0)
+        self.assertEqual(self.sub.unacked, 0)
+        c = self.sub.receive()
+        d = self.sub.receive()
+        self.assertEqual((c.messages, d.messages), ([b'x1'], [b'x2']))
+        self.sub.backout()
+        got = [p.messages for p in self.sub.publications(until_idle=True)]
+        self.assertEqual(got, [[b'x1'], [b'x2']])
+        self.assertTrue(self.sub.receive() is TIMEDOUT)
+
+    def test_timeout_within_publication(self):
+        # a partially received publication is backed out
+        self.publish([b'p0', b'p1', b'p2'], max_messages=3)
+        for raise_timeout in (True, False):
+            self.sub.broker.__dict__['raise_timeout'] = raise_timeout
+            self.faults.fail(FCT_RECVPUBLICATION, 2)
+            self.assertRaises(BrokerTimeOut, self.sub.receive)
+            self.assertEqual(len(self.sub.inflight), 0)
+        self.assertEqual(self.sub.receive().messages, [b'p0', b'p1', b'p2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
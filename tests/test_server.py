@@ -0,0 +1,59 @@
+# -*- coding: latin1 -*-
+
+"""Tests of BrokerServer against the BrokerEmulator"""
+from __future__ import print_function          # PY3
+
+import time
+import unittest
+
+from adapya.entirex.broker import Broker
+from adapya.entirex.emulator import BrokerEmulator
+from adapya.entirex.server import BrokerServer
+
+
+class TestBrokerServer(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = BrokerEmulator()
+        self.errors = []
+        self.srv = BrokerServer(self.handle, user_id='SERVER',
+            server_class='TEST', server_name='SERVER', service='SLOW',
+            workers=1, drain=0., transport=self.emu, raise_timeout=True,
+            onerror=lambda worker, e: self.errors.append(e))
+        self.srv.start()
+        self.cl = Broker(user_id='CLIENT', transport=self.emu)
+        self.cl.logon()
+        self.cl.server_class, self.cl.server_name, self.cl.service = \
+            'TEST', 'SERVER', 'SLOW'
+
+    def tearDown(self):
+        self.srv.stop()
+
+    def handle(self, request, context):
+        if request == b'slow':
+            time.sleep(0.3)
+        return request.upper()
+
+    def test_reply(self):
+        self.cl.wait = '5S'
+        self.cl.send(conv_id='NONE', payload=b'abc')
+        self.assertEqual(
+            bytes(self.cl.receive_buffer[0:self.cl.return_length]), b'ABC')
+
+    def test_reply_fails(self):
+        # the client ends the conversation before the reply: the worker
+        # reports the error and serves the next request
+        self.cl.wait = 'NO'
+        self.cl.send(conv_id='NEW', payload=b'slow')
+        self.cl.endConversation()
+        time.sleep(0.5)
+        self.cl.wait = '5S'
+        self.cl.send(conv_id='NONE', payload=b'def')
+        self.assertEqual(
+            bytes(self.cl.receive_buffer[0:self.cl.return_length]), b'DEF')
+        self.assertEqual(len(self.errors), 1)
+        self.assertEqual(self.srv.stats()[0]['errors'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# -*- coding: latin1 -*-
+
+"""Tests of send_stream and receive_stream against the BrokerEmulator"""
+from __future__ import print_function          # PY3
+
+import io
+import unittest
+
+from adapya.entirex.broker import Broker, BrokerTimeOut, FCT_RECEIVE
+from adapya.entirex.emulator import BrokerEmulator
+from adapya.entirex.stream import receive_file, receive_stream, send_stream
+
+from faults import FaultTransport
+
+SERVICE = ('TEST', 'STREAM', 'DATA')
+
+
+class FailingReader(io.RawIOBase):
+    """File failing with IOError after 3 reads of 10 bytes"""
+    reads = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        self.reads += 1
+        if self.reads > 3:
+            raise IOError('read error')
+        b[0:10] = b'x' * 10
+        return 10
+
+
+class TestStream(unittest.TestCase):
+
+    def setUp(self):
+        emu = BrokerEmulator(maxmsg=5000)
+        self.faults = FaultTransport(emu)
+        self.srv = Broker(user_id='SERVER', transport=self.faults,
+                          receive_length=5000, raise_timeout=False)
+        self.srv.logon()
+        self.srv.server_class, self.srv.server_name, self.srv.service = \
+            SERVICE
+        self.srv.register()
+        self.cl = Broker(user_id='CLIENT', transport=emu, send_length=0)
+        self.cl.logon()
+        self.cl.server_class, self.cl.server_name, self.cl.service = SERVICE
+
+    def test_bytes(self):
+        data = bytes(bytearray(range(256))) * 100
+        self.assertEqual(send_stream(self.cl, data, conv_id='NEW',
+                                     chunk_size=4000), len(data))
+        f = io.BytesIO()
+        self.assertEqual(receive_file(self.srv, f, conv_id='ANY', wait='1S'),
+                         len(data))
+        self.assertEqual(f.getvalue(), data)
+
+    def test_file(self):
+        data = b'abc' * 5000
+        send_stream(self.cl, io.BytesIO(data), conv_id='NEW', chunk_size=3000)
+        chunks = list(receive_stream(self.srv, conv_id='ANY', wait='1S'))
+        self.assertEqual([len(c) for c in chunks], [3000] * 5)
+        self.assertEqual(b''.join(chunks), data)
+
+    def test_send_error_backs_out(self):
+        self.assertRaises(IOError, send_stream, self.cl, FailingReader(),
+                          conv_id='NEW', chunk_size=10)
+        self.assertEqual(list(receive_stream(self.srv, conv_id='ANY',
+                                             wait='1S')), [])
+
+    def test_timeout_within_uow(self):
+        # raised also with raise_timeout False, the UOW is backed out
+        send_stream(self.cl, b'y' * 30, conv_id='NEW', chunk_size=10)
+        self.faults.fail(FCT_RECEIVE, 2)
+        self.assertRaises(BrokerTimeOut, list,
+                          receive_stream(self.srv, conv_id='ANY', wait='1S'))
+        self.assertEqual([len(c) for c in receive_stream(self.srv,
+                          conv_id='ANY', wait='1S')], [10, 10, 10])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# -*- coding: latin1 -*-
+
+"""Tests of UowProducer and UowConsumer against the BrokerEmulator"""
+from __future__ import print_function          # PY3
+
+import unittest
+
+from adapya.entirex.broker import Broker, FCT_RECEIVE
+from adapya.entirex.emulator import BrokerEmulator
+from adapya.entirex.uow import UowConsumer, UowProducer, _size
+
+from faults import FaultTransport
+
+SERVICE = ('TEST', 'UOW', 'RECORDS')
+
+
+class TestUow(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = BrokerEmulator()
+        self.faults = FaultTransport(self.emu)
+        self.brokers = [Broker(user_id='CONSUMER', transport=self.faults)
+                        for i in range(2)]
+        for bb in self.brokers:
+            bb.logon()
+            bb.server_class, bb.server_name, bb.service = SERVICE
+            bb.register()
+        self.consumer = UowConsumer(self.brokers, SERVICE, register=False)
+        self.producer = Broker(user_id='PRODUCER', transport=self.emu)
+        self.producer.logon()
+
+    def produce(self, n, max_messages=3):
+        with UowProducer(self.producer, SERVICE, max_messages=max_messages,
+                         maxuowmsg=0) as prod:
+            for i in range(n):
+                prod.send(b'm%03d' % i)
+        return prod
+
+    def test_batches(self):
+        prod = self.produce(9)
+        self.assertEqual(prod.stats()['uows'], 3)
+        batches = [b.messages for b in
+                   self.consumer.batches(until_idle=True)]
+        self.assertEqual(sorted(m for b in batches for m in b),
+                         [b'm%03d' % i for i in range(9)])
+        self.assertTrue(all(len(b) == 3 for b in batches))
+        self.assertEqual(self.consumer.stats(),
+                         dict(uows=3, messages=9, backouts=0))
+
+    def test_backout(self):
+        self.produce(3)
+        seen = []
+        for batch in self.consumer.batches(until_idle=True):
+            seen.append(batch.messages)
+            if len(seen) == 1:
+                batch.backout()
+        self.assertEqual(seen, [[b'm000', b'm001', b'm002']] * 2)
+        self.assertEqual(self.consumer.stats()['backouts'], 1)
+
+    def test_timeout_within_uow(self):
+        # a UOW partially received is delivered again as a whole
+        consumer = UowConsumer(self.brokers[0:1], SERVICE, register=False)
+        self.produce(3)
+        self.faults.fail(FCT_RECEIVE, 2)
+        self.assertEqual(list(consumer.batches(until_idle=True)), [])
+        seen = [b.messages for b in consumer.batches(until_idle=True)]
+        self.assertEqual(seen, [[b'm000', b'm001', b'm002']])
+
+    def test_size(self):
+        self.assertEqual(_size(b'abc'), 3)
+        self.assertEqual(_size(memoryview(bytearray(12)).cast('I')), 12)
+
+
+if __name__ == '__main__':
+    unittest.main()